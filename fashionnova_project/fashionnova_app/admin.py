@@ -13,4 +13,8 @@ admin.site.register(Cart)
 admin.site.register(Order)
 admin.site.register(OrderItem)
 admin.site.register(MpesaTransaction)
+admin.site.register(SearchQueryLog)
+admin.site.register(MediaJob)
+admin.site.register(MediaBlob)
+admin.site.register(ProductEvent)
 # Register your models here.
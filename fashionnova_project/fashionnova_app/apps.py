@@ -2,4 +2,8 @@ from django.apps import AppConfig
 
 
 class FashionnovaAppConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
     name = 'fashionnova_app'
+
+    def ready(self):
+        from . import signals  # noqa: F401
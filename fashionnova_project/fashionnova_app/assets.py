@@ -0,0 +1,108 @@
+# fashionnova_app/assets.py
+import base64
+import hashlib
+from functools import lru_cache
+
+from django.contrib.staticfiles import finders
+from django.templatetags.static import static
+
+VENDOR_DIR = 'vendor'
+
+# Pinned front-end libraries, fetched into static/vendor by `manage.py vendor_assets`.
+# Each entry lists the files to download as (path inside the package, static path);
+# the first one is what templates link to. `integrity` holds the digest each file
+# must have, in the Subresource Integrity form upstream publishes; a library with
+# an unpinned file is not vendored and keeps loading from its CDN.
+# No vendored files are committed yet, so every library below still loads from
+# its CDN; `vendor_assets --check` lists what is left.
+VENDOR_ASSETS = {
+    'bootstrap_css': {
+        'base_url': 'https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/',
+        'files': [('css/bootstrap.min.css', 'bootstrap/5.1.3/css/bootstrap.min.css')],
+        'integrity': {
+            'css/bootstrap.min.css': 'sha384-1BmE4kWBq78iYhFldvKuhfTAU6auU8tT94WrHftjDbrCEXSU1oBoqyl2QvZ6jIW3',
+        },
+    },
+    'bootstrap_js': {
+        'base_url': 'https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/',
+        'files': [('js/bootstrap.bundle.min.js', 'bootstrap/5.1.3/js/bootstrap.bundle.min.js')],
+        'integrity': {
+            'js/bootstrap.bundle.min.js': 'sha384-ka7Sk0Gln4gmtz2MlQnikT1wXgYsOg+OMhuP+IlRH9sENBO0LRn5q+8nbTov4+1p',
+        },
+    },
+    'fontawesome_css': {
+        'base_url': 'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/',
+        # all.min.css loads its fonts from ../webfonts/, so they keep that layout
+        'files': [('css/all.min.css', 'fontawesome/6.0.0/css/all.min.css')] + [
+            (f'webfonts/{font}.{extension}', f'fontawesome/6.0.0/webfonts/{font}.{extension}')
+            for font in ('fa-solid-900', 'fa-regular-400', 'fa-brands-400', 'fa-v4compatibility')
+            for extension in ('woff2', 'ttf')
+        ],
+        # The webfonts still need their digests pinned, from a checked release archive
+        'integrity': {
+            'css/all.min.css': (
+                'sha512-9usAa10IRO0HhonpyAIVpjrylPvoDwiPUiKdWk5t3PyolY1cOd4DSE0Ga+ri4AuTroPR5aQvXU9xC6qOPnzFeg=='
+            ),
+        },
+    },
+    'jquery': {
+        'base_url': 'https://code.jquery.com/',
+        'files': [('jquery-3.6.0.min.js', 'jquery/3.6.0/jquery.min.js')],
+        'integrity': {
+            'jquery-3.6.0.min.js': 'sha256-/xUj+3OJU5yExlq6GSYGSHk7tPXikynS7ogEvDej/m4=',
+        },
+    },
+}
+
+# Stylesheets and fonts every page needs before first paint, sent as
+# Link: rel=preload headers by PreloadMiddleware: (asset or static path, as)
+CRITICAL_ASSETS = (
+    ('bootstrap_css', 'style'),
+    ('fontawesome_css', 'style'),
+    (f'{VENDOR_DIR}/fontawesome/6.0.0/webfonts/fa-solid-900.woff2', 'font'),
+)
+
+
+def vendor_path(static_path):
+    return f'{VENDOR_DIR}/{static_path}'
+
+
+def integrity_of(content, algorithm='sha384'):
+    """Subresource Integrity value of content, e.g. 'sha384-<base64 digest>'"""
+    digest = hashlib.new(algorithm, content).digest()
+    return f'{algorithm}-{base64.b64encode(digest).decode()}'
+
+
+@lru_cache(maxsize=None)
+def is_vendored(static_path):
+    """True when a vendored file is present in the static sources (checked once)"""
+    return finders.find(static_path) is not None
+
+
+def vendor_url(name):
+    """URL of a pinned library: the vendored, fingerprinted copy when it has been
+    fetched, otherwise the upstream CDN file it was pinned from"""
+    asset = VENDOR_ASSETS[name]
+    source, static_path = asset['files'][0]
+    static_path = vendor_path(static_path)
+    if is_vendored(static_path):
+        return static(static_path)
+    return asset['base_url'] + source
+
+
+def critical_asset_links():
+    """Link header value preloading CRITICAL_ASSETS that are served locally"""
+    links = []
+    for asset, kind in CRITICAL_ASSETS:
+        if asset in VENDOR_ASSETS:
+            static_path = vendor_path(VENDOR_ASSETS[asset]['files'][0][1])
+        else:
+            static_path = asset
+        # Preloading a third-party file would not save its DNS/TLS round trips
+        if not is_vendored(static_path):
+            continue
+        link = f'<{static(static_path)}>; rel=preload; as={kind}'
+        if kind == 'font':
+            link += '; type=font/woff2; crossorigin'
+        links.append(link)
+    return ', '.join(links)
@@ -0,0 +1,279 @@
+# fashionnova_app/autocomplete.py
+import heapq
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+
+from django.core.cache import cache
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+from django.urls import reverse
+
+from .models import Brand, Category, Product
+
+SUGGEST_VERSION_KEY = 'suggest:version'
+# Each version bump logs the (kind, id) items it changed under this key plus the version
+SUGGEST_CHANGE_KEY = 'suggest:change'
+# Further behind than this, a process rebuilds instead of replaying the log
+MAX_REPLAY = 200
+SUGGEST_LIMIT = 8
+# Popularity (units sold) drifts slowly, so a full rebuild is only forced this often
+REBUILD_INTERVAL = 3600  # seconds
+# Short prefixes match a large slice of the index; their results are memoized
+MEMO_PREFIX_LENGTH = 2
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def normalize(text):
+    """Lowercase, strip accents and collapse punctuation/whitespace to single spaces"""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(WORD_RE.findall(text.lower()))
+
+
+def _keys(label):
+    # Every word start is a key, so "dre" and "black dre" both find "Black Dress"
+    words = normalize(label).split()
+    return [' '.join(words[i:]) for i in range(len(words))]
+
+
+class SuggestionIndex:
+    """Sorted-array prefix index over product, brand and category names.
+
+    Lookups bisect into a sorted list of (key, kind, id) tuples and never touch
+    the database. The index is built lazily and patched in place by the catalog
+    signals. Other processes' changes are replayed from the shared change log;
+    the index is only rebuilt when that log has a gap.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = []
+        self._items = {}
+        self._memo = {}
+        self.version = None
+        self.built_at = 0
+
+    # Building
+
+    def _product_item(self, product_id, name, slug, weight):
+        return {
+            'kind': 'product',
+            'id': product_id,
+            'label': name,
+            'url': reverse('product_detail', args=[slug]),
+            'weight': weight,
+        }
+
+    def _label_item(self, kind, item_id, name, slug, weight):
+        if kind == 'brand':
+            url = reverse('brand_products', args=[slug])
+        else:
+            url = f"{reverse('products')}?category={item_id}"
+        return {'kind': kind, 'id': item_id, 'label': name, 'url': url, 'weight': weight}
+
+    def build(self):
+        """Load every active product, brand and category with its popularity"""
+        products = Product.objects.filter(is_active=True).annotate(
+            sold=Coalesce(Sum('orderitem__quantity'), 0)
+        ).values_list('id', 'name', 'slug', 'brand_id', 'category_id', 'sold', 'review_count')
+
+        items = {}
+        brand_weights = {}
+        category_weights = {}
+        for product_id, name, slug, brand_id, category_id, sold, review_count in products:
+            weight = 1 + sold + review_count
+            items[('product', product_id)] = self._product_item(product_id, name, slug, weight)
+            if brand_id:
+                brand_weights[brand_id] = brand_weights.get(brand_id, 0) + weight
+            if category_id:
+                category_weights[category_id] = category_weights.get(category_id, 0) + weight
+
+        for brand_id, name, slug in Brand.objects.filter(is_active=True).values_list('id', 'name', 'slug'):
+            items[('brand', brand_id)] = self._label_item(
+                'brand', brand_id, name, slug, brand_weights.get(brand_id, 0)
+            )
+        for category_id, name, slug in Category.objects.values_list('id', 'name', 'slug'):
+            items[('category', category_id)] = self._label_item(
+                'category', category_id, name, slug, category_weights.get(category_id, 0)
+            )
+
+        keys = sorted(
+            (key, kind, item_id)
+            for (kind, item_id), item in items.items()
+            for key in _keys(item['label'])
+        )
+        with self._lock:
+            self._items = items
+            self._keys = keys
+            self._memo = {}
+            self.built_at = time.monotonic()
+
+    def ensure_fresh(self):
+        version = get_suggest_version()
+        expired = time.monotonic() - self.built_at > REBUILD_INTERVAL
+        if version == self.version and not expired:
+            return
+        changes = None if expired else logged_changes(self.version, version)
+        if changes is None:
+            self.build()
+        else:
+            self.reload(changes)
+        self.version = version
+
+    # Incremental updates
+
+    def _remove(self, kind, item_id):
+        item = self._items.pop((kind, item_id), None)
+        if item is None:
+            return None
+        for key in _keys(item['label']):
+            position = bisect_left(self._keys, (key, kind, item_id))
+            if position < len(self._keys) and self._keys[position] == (key, kind, item_id):
+                del self._keys[position]
+        return item
+
+    def _add(self, item):
+        self._items[(item['kind'], item['id'])] = item
+        for key in _keys(item['label']):
+            insort(self._keys, (key, item['kind'], item['id']))
+
+    def update_product(self, product, deleted=False):
+        if not self.built_at:
+            return
+        with self._lock:
+            previous = self._remove('product', product.pk)
+            if not deleted and product.is_active:
+                weight = previous['weight'] if previous else 1 + product.review_count
+                self._add(self._product_item(product.pk, product.name, product.slug, weight))
+            self._memo = {}
+
+    def update_label(self, kind, instance, deleted=False):
+        """Re-key a brand or category after a rename, activation change or delete"""
+        if not self.built_at:
+            return
+        with self._lock:
+            previous = self._remove(kind, instance.pk)
+            if not deleted and getattr(instance, 'is_active', True):
+                weight = previous['weight'] if previous else 0
+                self._add(self._label_item(kind, instance.pk, instance.name, instance.slug, weight))
+            self._memo = {}
+
+    def reload(self, changes):
+        """Re-read the given (kind, id) items from the database and patch them in"""
+        if not self.built_at or not changes:
+            return
+        ids = {'product': set(), 'brand': set(), 'category': set()}
+        for kind, item_id in changes:
+            ids[kind].add(item_id)
+        # Items that are gone or inactive come back missing and are only removed
+        products = {
+            row[0]: row for row in Product.objects.filter(id__in=ids['product'], is_active=True).values_list(
+                'id', 'name', 'slug', 'review_count'
+            )
+        }
+        labels = {
+            ('brand', row[0]): row
+            for row in Brand.objects.filter(id__in=ids['brand'], is_active=True).values_list('id', 'name', 'slug')
+        }
+        labels.update(
+            (('category', row[0]), row)
+            for row in Category.objects.filter(id__in=ids['category']).values_list('id', 'name', 'slug')
+        )
+
+        with self._lock:
+            for product_id in ids['product']:
+                previous = self._remove('product', product_id)
+                if product_id in products:
+                    _, name, slug, review_count = products[product_id]
+                    weight = previous['weight'] if previous else 1 + review_count
+                    self._add(self._product_item(product_id, name, slug, weight))
+            for kind in ('brand', 'category'):
+                for item_id in ids[kind]:
+                    previous = self._remove(kind, item_id)
+                    if (kind, item_id) in labels:
+                        _, name, slug = labels[(kind, item_id)]
+                        self._add(self._label_item(kind, item_id, name, slug, previous['weight'] if previous else 0))
+            self._memo = {}
+
+    # Lookups
+
+    def lookup(self, query, limit=SUGGEST_LIMIT):
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        memo_key = (prefix, limit)
+        with self._lock:
+            if memo_key in self._memo:
+                return self._memo[memo_key]
+
+            matches = {}
+            position = bisect_left(self._keys, (prefix,))
+            while position < len(self._keys):
+                key, kind, item_id = self._keys[position]
+                if not key.startswith(prefix):
+                    break
+                matches[(kind, item_id)] = self._items[(kind, item_id)]
+                position += 1
+
+            results = heapq.nlargest(limit, matches.values(), key=lambda item: item['weight'])
+            if len(prefix) <= MEMO_PREFIX_LENGTH:
+                self._memo[memo_key] = results
+            return results
+
+
+suggestion_index = SuggestionIndex()
+
+
+def get_suggest_version():
+    version = cache.get(SUGGEST_VERSION_KEY)
+    if version is None:
+        cache.add(SUGGEST_VERSION_KEY, int(time.time() * 1000), None)
+        version = cache.get(SUGGEST_VERSION_KEY)
+    return version
+
+
+def invalidate_suggestions():
+    """Force every process, this one included, to rebuild its index; returns the new version"""
+    try:
+        return cache.incr(SUGGEST_VERSION_KEY)
+    except ValueError:
+        version = int(time.time() * 1000)
+        cache.set(SUGGEST_VERSION_KEY, version, None)
+        return version
+
+
+def logged_changes(since, version):
+    """The (kind, id) items changed after version since up to version, or None
+    when part of that range is no longer (or not yet) in the log"""
+    if since is None or not 0 < version - since <= MAX_REPLAY:
+        return None
+    keys = [f'{SUGGEST_CHANGE_KEY}:{number}' for number in range(since + 1, version + 1)]
+    logged = cache.get_many(keys)
+    if len(logged) != len(keys):
+        return None
+    return {tuple(change) for changes in logged.values() for change in changes}
+
+
+def catalog_changed(apply, changes):
+    """Patch this process's index in place, then bump the shared version and
+    log changes, a list of (kind, id), for other processes to replay.
+
+    Call through transaction.on_commit so rolled back writes never reach the index.
+    """
+    before = get_suggest_version()
+    apply()
+    version = invalidate_suggestions()
+    cache.set(f'{SUGGEST_CHANGE_KEY}:{version}', list(changes), REBUILD_INTERVAL)
+    if suggestion_index.version == before and version == before + 1:
+        # Our own change is already applied and nobody else's came in between
+        suggestion_index.version = version
+
+
+def suggest(query, limit=SUGGEST_LIMIT):
+    """Top suggestions for a typed prefix, most popular first"""
+    suggestion_index.ensure_fresh()
+    return suggestion_index.lookup(query, limit)
@@ -0,0 +1,339 @@
+# fashionnova_app/cart.py
+import json
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum, Window
+from django.db.models.functions import Least
+from django.utils import timezone
+
+from .models import Cart, Product
+
+CART_CACHE_TIMEOUT = 3600  # seconds
+EMPTY_SUMMARY = {'count': 0, 'quantity': 0, 'subtotal': Decimal('0')}
+
+# Anonymous shoppers' carts live in a signed cookie, so browsing writes nothing
+GUEST_CART_COOKIE = 'guest_cart'
+GUEST_CART_SALT = 'fashionnova_app.cart'
+GUEST_CART_MAX_AGE = 60 * 60 * 24 * 30  # seconds
+GUEST_CART_MAX_LINES = 50  # keeps the cookie well under the 4 KB browsers allow
+# Largest value an integer column holds; cookie ids and quantities beyond it are dropped
+MAX_INTEGER = 2 ** 31 - 1
+
+# Databases with INSERT ... ON CONFLICT DO UPDATE, used for single-statement adds
+UPSERT_VENDORS = ('sqlite', 'postgresql')
+BATCH_OPERATIONS = ('set', 'increment', 'remove')
+MAX_BATCH_OPERATIONS = 100
+
+LINE_TOTAL = ExpressionWrapper(
+    F('product__final_price') * F('quantity'),
+    output_field=DecimalField(max_digits=12, decimal_places=2),
+)
+
+
+def cart_cache_key(user_id):
+    return f'cart:summary:{user_id}'
+
+
+def _summary(count, quantity, subtotal):
+    return {'count': count, 'quantity': quantity or 0, 'subtotal': subtotal or Decimal('0')}
+
+
+def get_cart(user):
+    """Cart lines with their products, and the cart summary, from one query.
+
+    Each line carries `line_total`; the subtotal and unit count come from
+    window sums over the same rows, so no per-line or aggregate query follows.
+    The summary is written back to the cache for the header badge.
+    """
+    items = list(
+        Cart.objects.filter(user=user)
+        .select_related('product__category')
+        .annotate(
+            line_total=LINE_TOTAL,
+            cart_subtotal=Window(Sum(LINE_TOTAL)),
+            cart_quantity=Window(Sum('quantity')),
+        )
+        .order_by('added_at', 'id')
+    )
+    if items:
+        summary = _summary(len(items), items[0].cart_quantity, items[0].cart_subtotal)
+    else:
+        summary = dict(EMPTY_SUMMARY)
+    cache.set(cart_cache_key(user.pk), summary, CART_CACHE_TIMEOUT)
+    return items, summary
+
+
+def cart_summary(user):
+    """{'count', 'quantity', 'subtotal'} of a user's cart, cached until it changes"""
+    key = cart_cache_key(user.pk)
+    summary = cache.get(key)
+    if summary is None:
+        totals = Cart.objects.filter(user=user).aggregate(
+            line_count=Count('id'),
+            cart_quantity=Sum('quantity'),
+            cart_subtotal=Sum(LINE_TOTAL),
+        )
+        summary = _summary(totals['line_count'], totals['cart_quantity'], totals['cart_subtotal'])
+        cache.set(key, summary, CART_CACHE_TIMEOUT)
+    return summary
+
+
+def invalidate_cart(user_id):
+    """Drop a cached summary; called on every cart mutation"""
+    cache.delete(cart_cache_key(user_id))
+    # Again after commit, so a read racing the write cannot re-cache old totals
+    transaction.on_commit(lambda: cache.delete(cart_cache_key(user_id)))
+
+
+def _upsert(user_id, quantities, cap_to_stock):
+    table = connection.ops.quote_name(Cart._meta.db_table)
+    total = f'{table}.quantity + excluded.quantity'
+    if cap_to_stock:
+        stock = f'(SELECT stock FROM {connection.ops.quote_name(Product._meta.db_table)} WHERE id = excluded.product_id)'
+        total = f'CASE WHEN {total} > {stock} THEN {stock} ELSE {total} END'
+    added_at = connection.ops.adapt_datetimefield_value(timezone.now())
+    params = []
+    for product_id, quantity in quantities.items():
+        params += [user_id, product_id, quantity, added_at]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (user_id, product_id, quantity, added_at) '
+            f'VALUES {", ".join(["(%s, %s, %s, %s)"] * len(quantities))} '
+            f'ON CONFLICT (user_id, product_id) DO UPDATE SET quantity = {total}',
+            params,
+        )
+
+
+def _increment(user_id, quantities, cap_to_stock):
+    with transaction.atomic():
+        existing = set(
+            Cart.objects.select_for_update().filter(user_id=user_id, product_id__in=quantities)
+            .values_list('product_id', flat=True)
+        )
+        for product_id in existing:
+            quantity = F('quantity') + quantities[product_id]
+            if cap_to_stock:
+                quantity = Least(quantity, Product.objects.filter(id=product_id).values('stock'))
+            Cart.objects.filter(user_id=user_id, product_id=product_id).update(quantity=quantity)
+        Cart.objects.bulk_create([
+            Cart(user_id=user_id, product_id=product_id, quantity=quantity)
+            for product_id, quantity in quantities.items() if product_id not in existing
+        ])
+
+
+def add_items(user, quantities, cap_to_stock=False):
+    """Add {product_id: quantity} to a user's cart in one statement.
+
+    The increment happens in the database (quantity = quantity + n), so two
+    concurrent adds of the same product, such as a double-tapped button, both
+    count. With cap_to_stock, lines already in the cart stop at the product's
+    stock; new lines take the quantity given, which callers cap themselves.
+    """
+    quantities = {product_id: quantity for product_id, quantity in quantities.items() if quantity > 0}
+    if not quantities:
+        return
+    if connection.vendor in UPSERT_VENDORS:
+        _upsert(user.pk, quantities, cap_to_stock)
+    else:
+        _increment(user.pk, quantities, cap_to_stock)
+    # Neither path sends post_save, so the cached summary is dropped here
+    invalidate_cart(user.pk)
+
+
+def add_item(user, product_id, quantity=1):
+    add_items(user, {product_id: quantity})
+
+
+def plan_operations(operations):
+    """Fold a list of cart operations into final per-product changes.
+
+    Each operation is {'op': 'set'|'increment'|'remove', 'product_id': id,
+    'quantity': n}; later ones build on earlier ones for the same product.
+    Returns ({product_id: quantity to set, 0 to remove}, {product_id:
+    quantity to add}). Raises ValueError for a malformed operation.
+    """
+    if not isinstance(operations, list) or len(operations) > MAX_BATCH_OPERATIONS:
+        raise ValueError(f'Send a list of at most {MAX_BATCH_OPERATIONS} operations')
+    absolute, increments = {}, {}
+    for operation in operations:
+        try:
+            op = operation['op']
+            product_id = int(operation['product_id'])
+            quantity = int(operation.get('quantity', 1)) if op != 'remove' else 0
+        except (KeyError, TypeError, ValueError, AttributeError):
+            raise ValueError(f'Invalid operation: {operation!r}')
+        if op not in BATCH_OPERATIONS or quantity < 0:
+            raise ValueError(f'Invalid operation: {operation!r}')
+        if op == 'increment' and product_id in absolute:
+            absolute[product_id] += quantity
+        elif op == 'increment':
+            increments[product_id] = increments.get(product_id, 0) + quantity
+        else:
+            absolute[product_id] = quantity
+            increments.pop(product_id, None)
+    return absolute, increments
+
+
+def _stock_check(absolute, increments, user=None, lines=None):
+    """Stock of every touched, active product, from one query; caps `absolute`.
+
+    Increments are checked against what is already in the cart: the user's
+    Cart rows, read in the same query, or a guest's lines.
+    """
+    products = Product.objects.filter(id__in=[*absolute, *increments], is_active=True)
+    if user is not None:
+        rows = products.annotate(
+            in_cart=Subquery(Cart.objects.filter(user=user, product=OuterRef('pk')).values('quantity'))
+        ).values_list('id', 'stock', 'in_cart')
+    else:
+        rows = [
+            (product_id, stock, (lines or {}).get(product_id))
+            for product_id, stock in products.values_list('id', 'stock')
+        ]
+    stock, in_cart = {}, {}
+    for product_id, available, quantity in rows:
+        stock[product_id] = available
+        in_cart[product_id] = quantity or 0
+    errors = [
+        f'Product {product_id} is not available'
+        for product_id in [*absolute, *increments] if product_id not in stock
+    ]
+    for product_id, quantity in absolute.items():
+        if product_id in stock and quantity > stock[product_id]:
+            errors.append(f'Only {stock[product_id]} units available for product {product_id}')
+            absolute[product_id] = stock[product_id]
+    for product_id, quantity in increments.items():
+        if product_id in stock and in_cart[product_id] + quantity > stock[product_id]:
+            errors.append(f'Only {stock[product_id]} units available for product {product_id}')
+    return stock, errors
+
+
+def apply_operations(user, operations):
+    """Apply a batch of cart operations in one transaction; returns error messages.
+
+    Stock is read once for every product touched. Removals are one DELETE,
+    quantities to set are one upsert, and increments go through add_items(),
+    capped at stock. Quantities cut down to stock are reported as errors.
+    """
+    absolute, increments = plan_operations(operations)
+    stock, errors = _stock_check(absolute, increments, user=user)
+    removed = [product_id for product_id, quantity in absolute.items() if quantity == 0]
+    quantities = [
+        Cart(user=user, product_id=product_id, quantity=quantity)
+        for product_id, quantity in absolute.items() if quantity and product_id in stock
+    ]
+    with transaction.atomic():
+        if removed:
+            Cart.objects.filter(user=user, product_id__in=removed).delete()
+        if quantities:
+            Cart.objects.bulk_create(
+                quantities, update_conflicts=True, unique_fields=['user', 'product'], update_fields=['quantity'],
+            )
+        add_items(
+            user,
+            {product_id: min(quantity, stock[product_id]) for product_id, quantity in increments.items() if product_id in stock},
+            cap_to_stock=True,
+        )
+        invalidate_cart(user.pk)
+    return errors
+
+
+def apply_guest_operations(request, operations):
+    """apply_operations() for a guest cart; save_guest_cart() stores the result"""
+    absolute, increments = plan_operations(operations)
+    lines = guest_cart(request)
+    stock, errors = _stock_check(absolute, increments, lines=lines)
+    for product_id, quantity in absolute.items():
+        if quantity and product_id in stock:
+            lines[product_id] = quantity
+        else:
+            lines.pop(product_id, None)
+    for product_id, quantity in increments.items():
+        if product_id in stock and not add_guest_line(request, product_id, quantity, stock[product_id]):
+            errors.append('Your cart is full. Sign in to add more items.')
+    return errors
+
+
+def guest_cart(request):
+    """{product_id: quantity} of an anonymous shopper, read once per request"""
+    if not hasattr(request, '_guest_cart'):
+        raw = request.get_signed_cookie(
+            GUEST_CART_COOKIE, default='', salt=GUEST_CART_SALT, max_age=GUEST_CART_MAX_AGE,
+        )
+        try:
+            lines = {int(product_id): int(quantity) for product_id, quantity in json.loads(raw).items()}
+        except (AttributeError, TypeError, ValueError):
+            lines = {}
+        request._guest_cart = {
+            product_id: quantity for product_id, quantity in lines.items()
+            if 0 < product_id <= MAX_INTEGER and 0 < quantity <= MAX_INTEGER
+        }
+    return request._guest_cart
+
+
+def save_guest_cart(request, response):
+    """Write the request's guest cart back to its cookie, or drop an empty one"""
+    lines = guest_cart(request)
+    if lines:
+        response.set_signed_cookie(
+            GUEST_CART_COOKIE, json.dumps(lines, separators=(',', ':')), salt=GUEST_CART_SALT,
+            max_age=GUEST_CART_MAX_AGE, httponly=True, samesite='Lax',
+        )
+    elif GUEST_CART_COOKIE in request.COOKIES:
+        response.delete_cookie(GUEST_CART_COOKIE, samesite='Lax')
+    return response
+
+
+def add_guest_line(request, product_id, quantity=1, stock=None):
+    """Add to a guest cart, up to stock when given; False when it is full and the product is not in it yet"""
+    lines = guest_cart(request)
+    if product_id not in lines and len(lines) >= GUEST_CART_MAX_LINES:
+        return False
+    quantity = lines.get(product_id, 0) + quantity
+    if stock is not None:
+        quantity = min(quantity, stock)
+    if quantity > 0:
+        lines[product_id] = quantity
+    else:
+        lines.pop(product_id, None)
+    return True
+
+
+def get_guest_cart(request):
+    """The guest cart as unsaved Cart lines, and its summary, from one product query.
+
+    A guest line has no row, so its id is the product id the cookie keys it
+    by; remove_from_cart and update_cart_quantity take that id for guests.
+    """
+    lines = guest_cart(request)
+    products = Product.objects.filter(id__in=lines, is_active=True).select_related('category').in_bulk()
+    items = []
+    for product_id, quantity in lines.items():
+        if product_id in products:
+            item = Cart(id=product_id, product=products[product_id], quantity=quantity)
+            item.line_total = item.get_total_price()
+            items.append(item)
+    summary = _summary(
+        len(items), sum(item.quantity for item in items), sum(item.line_total for item in items),
+    )
+    return items, summary
+
+
+def merge_guest_cart(request, user):
+    """Fold the guest cart into user's Cart rows with one upsert.
+
+    Quantities add to lines the user already had, capped at stock; products
+    that have gone away or sold out are dropped. The guest cart is emptied,
+    so save_guest_cart() on the response clears the cookie. Returns the
+    number of lines merged.
+    """
+    lines = guest_cart(request)
+    if not lines:
+        return 0
+    stock = Product.objects.filter(id__in=lines, is_active=True, stock__gt=0).values_list('id', 'stock')
+    merged = {product_id: min(lines[product_id], available) for product_id, available in stock}
+    add_items(user, merged, cap_to_stock=True)
+    lines.clear()
+    return len(merged)
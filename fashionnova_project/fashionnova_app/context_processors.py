@@ -1,20 +1,28 @@
 # fashionnova_app/context_processors.py
-from .models import Cart, Wishlist
-from django.contrib.auth import get_user_model
+from django.utils.functional import SimpleLazyObject
 
-User = get_user_model()
+from .cart import cart_summary, guest_cart
+from .wishlist import wishlist_count
 
-def cart_count(request):
-    """Add cart and wishlist count to all templates"""
+
+def _cart_count(request):
     if request.user.is_authenticated:
-        try:
-            cart_count = Cart.objects.filter(user=request.user).count()
-            wishlist_count = Wishlist.objects.filter(user=request.user).count()
-            return {
-                'cart_count': cart_count,
-                'wishlist_count': wishlist_count
-            }
-        except:
-            # Handle case when models aren't migrated yet
-            return {'cart_count': 0, 'wishlist_count': 0}
-    return {'cart_count': 0, 'wishlist_count': 0}
\ No newline at end of file
+        return cart_summary(request.user)['count']
+    # Guests' carts are in a cookie, so counting them needs no query
+    return len(guest_cart(request))
+
+
+def _wishlist_count(request):
+    return wishlist_count(request.user) if request.user.is_authenticated else 0
+
+
+def cart_count(request):
+    """Add cart and wishlist count to all templates.
+
+    Both are lazy, so a template that never shows them costs nothing, and both
+    read per-user cache entries that cart and wishlist changes keep current.
+    """
+    return {
+        'cart_count': SimpleLazyObject(lambda: _cart_count(request)),
+        'wishlist_count': SimpleLazyObject(lambda: _wishlist_count(request)),
+    }
@@ -0,0 +1,168 @@
+# fashionnova_app/facets.py
+import hashlib
+import json
+import time
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.core.cache import cache
+from django.db.models import BooleanField, Case, Count, IntegerField, Value, When
+
+from .models import Product
+
+FACET_CACHE_TIMEOUT = 600  # seconds
+FACET_VERSION_KEY = 'facets:version'
+
+# (slug, label, lower bound inclusive, upper bound exclusive) in Ksh
+PRICE_BUCKETS = (
+    ('under-1000', 'Under Ksh 1,000', None, Decimal('1000')),
+    ('1000-2500', 'Ksh 1,000 - 2,500', Decimal('1000'), Decimal('2500')),
+    ('2500-5000', 'Ksh 2,500 - 5,000', Decimal('2500'), Decimal('5000')),
+    ('5000-10000', 'Ksh 5,000 - 10,000', Decimal('5000'), Decimal('10000')),
+    ('over-10000', 'Over Ksh 10,000', Decimal('10000'), None),
+)
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_decimal(value):
+    if value in (None, ''):
+        return None
+    try:
+        return Decimal(str(value))
+    except (InvalidOperation, ValueError):
+        return None
+
+
+def normalize_filters(params):
+    """Pull the facetable filters out of request.GET into a canonical dict"""
+    return {
+        'category': _to_int(params.get('category')),
+        'brand': _to_int(params.get('brand')),
+        'gender': params.get('gender') or None,
+        'discount_only': bool(params.get('discount_only')),
+        'min_price': _to_decimal(params.get('min_price')),
+        'max_price': _to_decimal(params.get('max_price')),
+    }
+
+
+def get_facet_version():
+    version = cache.get(FACET_VERSION_KEY)
+    if version is None:
+        # Seed from the clock so a restarted cache never reuses an old version
+        cache.add(FACET_VERSION_KEY, int(time.time() * 1000), None)
+        version = cache.get(FACET_VERSION_KEY)
+    return version
+
+
+def invalidate_facets():
+    """Drop every cached facet count; called whenever Product rows change"""
+    try:
+        cache.incr(FACET_VERSION_KEY)
+    except ValueError:
+        cache.set(FACET_VERSION_KEY, int(time.time() * 1000), None)
+
+
+def _price_bucket_case():
+    whens = []
+    for index, (_, _, low, high) in enumerate(PRICE_BUCKETS):
+        bounds = {}
+        if low is not None:
+            bounds['final_price__gte'] = low
+        if high is not None:
+            bounds['final_price__lt'] = high
+        whens.append(When(then=Value(index), **bounds))
+    return Case(*whens, output_field=IntegerField())
+
+
+def _matches(row, filters, skip):
+    if skip != 'category' and filters['category'] and row['category_id'] != filters['category']:
+        return False
+    if skip != 'brand' and filters['brand'] and row['brand_id'] != filters['brand']:
+        return False
+    if skip != 'gender' and filters['gender'] and row['gender'] != filters['gender']:
+        return False
+    if skip != 'discount_only' and filters['discount_only'] and not row['discounted']:
+        return False
+    return True
+
+
+def compute_facet_counts(filters):
+    """Facet counts for the active catalog in a single grouped query.
+
+    Rows are grouped on every facet dimension at once and rolled up here, so
+    each dimension is counted with all the *other* filters applied. The price
+    range filter is applied in SQL and the price buckets reflect it.
+    """
+    queryset = Product.objects.filter(is_active=True)
+    if filters['min_price'] is not None:
+        queryset = queryset.filter(final_price__gte=filters['min_price'])
+    if filters['max_price'] is not None:
+        queryset = queryset.filter(final_price__lte=filters['max_price'])
+
+    rows = queryset.annotate(
+        discounted=Case(
+            When(discount_percentage__gt=0, then=Value(True)),
+            default=Value(False),
+            output_field=BooleanField(),
+        ),
+        price_bucket=_price_bucket_case(),
+    ).values(
+        'category_id', 'brand_id', 'gender', 'discounted', 'price_bucket'
+    ).annotate(total=Count('id')).order_by()
+
+    category_counts = defaultdict(int)
+    brand_counts = defaultdict(int)
+    gender_counts = defaultdict(int)
+    price_counts = defaultdict(int)
+    discount_count = 0
+    total = 0
+
+    for row in rows:
+        count = row['total']
+        if row['category_id'] is not None and _matches(row, filters, 'category'):
+            category_counts[row['category_id']] += count
+        if row['brand_id'] is not None and _matches(row, filters, 'brand'):
+            brand_counts[row['brand_id']] += count
+        if _matches(row, filters, 'gender'):
+            gender_counts[row['gender']] += count
+        if row['discounted'] and _matches(row, filters, 'discount_only'):
+            discount_count += count
+        if _matches(row, filters, None):
+            total += count
+            if row['price_bucket'] is not None:
+                price_counts[row['price_bucket']] += count
+
+    return {
+        'total': total,
+        'category': dict(category_counts),
+        'brand': dict(brand_counts),
+        'gender': dict(gender_counts),
+        'discount': discount_count,
+        'price': [
+            {
+                'slug': slug,
+                'label': label,
+                'min_price': low,
+                'max_price': high,
+                'count': price_counts.get(index, 0),
+            }
+            for index, (slug, label, low, high) in enumerate(PRICE_BUCKETS)
+        ],
+    }
+
+
+def facet_counts(filters):
+    """Cached facet counts for a normalized filter dict"""
+    digest = hashlib.md5(json.dumps(filters, sort_keys=True, default=str).encode()).hexdigest()
+    key = f'facets:{get_facet_version()}:{digest}'
+    counts = cache.get(key)
+    if counts is None:
+        counts = compute_facet_counts(filters)
+        cache.set(key, counts, FACET_CACHE_TIMEOUT)
+    return counts
@@ -0,0 +1,170 @@
+# fashionnova_app/fuzzy.py
+import math
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+
+from .autocomplete import normalize
+from .models import Brand, Category, Product, SearchTerm, SearchTrigram
+from .search import SEARCH_CACHE_TIMEOUT, cacheable, search_cache_key, search_products
+
+# Jaccard similarity of trigram sets a correction must reach (pg_trgm's default)
+SIMILARITY_THRESHOLD = 0.3
+# Below this many exact hits the fuzzy tier looks for a better spelling
+FUZZY_MIN_HITS = 3
+MIN_TERM_LENGTH = 3
+TRIGRAM_BATCH_SIZE = 1000
+
+
+def trigrams(word):
+    """pg_trgm style trigrams: two spaces of padding in front, one behind"""
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def extract_terms(text):
+    """Words worth correcting towards: at least three letters, not numbers"""
+    return [
+        word for word in normalize(text).split()
+        if len(word) >= MIN_TERM_LENGTH and not word.isdigit() and len(word) <= 64
+    ]
+
+
+def _create_terms(frequencies):
+    terms = SearchTerm.objects.bulk_create(
+        [
+            SearchTerm(term=term, frequency=frequency, trigram_count=len(trigrams(term)))
+            for term, frequency in frequencies.items()
+        ],
+        batch_size=TRIGRAM_BATCH_SIZE,
+    )
+    if not all(term.pk for term in terms):
+        # Backends that don't return ids from bulk inserts
+        terms = SearchTerm.objects.filter(term__in=list(frequencies))
+    SearchTrigram.objects.bulk_create(
+        [SearchTrigram(trigram=trigram, term=term) for term in terms for trigram in trigrams(term.term)],
+        batch_size=TRIGRAM_BATCH_SIZE,
+    )
+
+
+def add_terms(texts):
+    """Add any words of the given names that aren't in the vocabulary yet.
+
+    Terms are only ever added here; frequencies and terms that no longer occur
+    are refreshed by rebuild_terms().
+    """
+    words = {word for text in texts if text for word in extract_terms(text)}
+    if not words:
+        return
+    known = set(SearchTerm.objects.filter(term__in=words).values_list('term', flat=True))
+    new_words = words - known
+    if not new_words:
+        return
+    with transaction.atomic():
+        # Another save may add the same word between the read above and this
+        # insert; its row wins and the unique term is not violated
+        SearchTerm.objects.bulk_create(
+            [SearchTerm(term=word, trigram_count=len(trigrams(word))) for word in new_words],
+            ignore_conflicts=True,
+        )
+        terms = SearchTerm.objects.filter(term__in=new_words, trigrams__isnull=True)
+        SearchTrigram.objects.bulk_create(
+            [SearchTrigram(trigram=trigram, term=term) for term in terms for trigram in trigrams(term.term)],
+            batch_size=TRIGRAM_BATCH_SIZE,
+        )
+
+
+def rebuild_terms():
+    """Recompute the vocabulary and its trigram table from the active catalog"""
+    frequencies = Counter()
+    names = Product.objects.filter(is_active=True).values_list('name', flat=True).iterator()
+    for name in names:
+        frequencies.update(extract_terms(name))
+    for name in Brand.objects.filter(is_active=True).values_list('name', flat=True):
+        frequencies.update(extract_terms(name))
+    for name in Category.objects.values_list('name', flat=True):
+        frequencies.update(extract_terms(name))
+
+    with transaction.atomic():
+        SearchTrigram.objects.all().delete()
+        SearchTerm.objects.all().delete()
+        _create_terms(frequencies)
+    return len(frequencies)
+
+
+def similar_terms(word, limit=3, threshold=SIMILARITY_THRESHOLD):
+    """Vocabulary terms closest to word, as (term, similarity), best first.
+
+    Only the posting lists of word's own trigrams are read, and a term must
+    share at least ceil(threshold * |trigrams(word)|) of them to be scored, so
+    the cost follows the query rather than the size of the catalog.
+    """
+    word_trigrams = trigrams(word)
+    min_shared = max(1, math.ceil(threshold * len(word_trigrams)))
+    candidates = SearchTrigram.objects.filter(trigram__in=word_trigrams).values(
+        'term__term', 'term__trigram_count', 'term__frequency'
+    ).annotate(shared=Count('id')).filter(shared__gte=min_shared).order_by()
+
+    scored = []
+    for row in candidates:
+        union = len(word_trigrams) + row['term__trigram_count'] - row['shared']
+        similarity = row['shared'] / union
+        if similarity >= threshold:
+            scored.append((similarity, row['term__frequency'], row['term__term']))
+    scored.sort(reverse=True)
+    return [(term, similarity) for similarity, _, term in scored[:limit]]
+
+
+def _is_known(word):
+    # Full-text search matches terms as prefixes, so "dres" is not a typo. A
+    # range rather than LIKE keeps this on the unique index of term.
+    return SearchTerm.objects.filter(term__gte=word, term__lt=word + '\U0010ffff').exists()
+
+
+def did_you_mean(query):
+    """A respelling of query that finds products, or None"""
+    words = normalize(query).split()
+    corrected = []
+    changed = False
+    for word in words:
+        if len(word) < MIN_TERM_LENGTH or word.isdigit() or _is_known(word):
+            corrected.append(word)
+            continue
+        matches = similar_terms(word, limit=1)
+        if matches:
+            corrected.append(matches[0][0])
+            changed = True
+        else:
+            corrected.append(word)
+
+    if not changed:
+        return None
+    suggestion = ' '.join(corrected)
+    if not search_products(suggestion).count():
+        return None
+    return suggestion
+
+
+def search_with_suggestions(query, fuzzy=True):
+    """Full-text results with a fuzzy tier when they come up short.
+
+    Returns (results, suggestion, corrected): with no exact hits the results
+    are those of the suggested spelling and corrected is True; with a few
+    hits the exact results stand and the suggestion is offered as a link.
+    """
+    results = search_products(query)
+    if not fuzzy or not results.terms or results.count() >= FUZZY_MIN_HITS:
+        return results, None, False
+
+    key = search_cache_key('suggestion', results.terms)
+    suggestion = cache.get(key)
+    if suggestion is None:
+        suggestion = did_you_mean(query) or ''
+        if cacheable():
+            cache.set(key, suggestion, SEARCH_CACHE_TIMEOUT)
+    suggestion = suggestion or None
+    if suggestion and not results.count():
+        return search_products(suggestion), suggestion, True
+    return results, suggestion, False
@@ -0,0 +1,142 @@
+# fashionnova_app/images.py
+import base64
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+# Target widths of the derivatives made for every product image
+DERIVATIVE_WIDTHS = {
+    'thumb': 160,
+    'card': 400,
+    'detail': 800,
+    'zoom': 1600,
+}
+# (format, extension, Pillow save options); WebP first so <picture> prefers it
+DERIVATIVE_FORMATS = (
+    ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+)
+DERIVATIVE_ROOT = 'derivatives'
+# Bumped when records gain fields, so build_image_derivatives redoes older ones
+VARIANTS_VERSION = 2
+# Width of the blurred preview inlined into pages while the real image loads
+PLACEHOLDER_WIDTH = 16
+EXIF_ORIENTATION = 0x0112
+
+
+def derivative_name(source_name, label, extension):
+    """Storage path of one derivative; derived from the source so no lookup is needed"""
+    root, _ = os.path.splitext(source_name)
+    return f'{DERIVATIVE_ROOT}/{root}/{label}.{extension}'
+
+
+def _save(storage, name, content):
+    if storage.exists(name):
+        if getattr(storage, 'content_addressed', False):
+            # Same source bytes, so the derivative already written is identical
+            return
+        storage.delete(name)
+    storage.save(name, ContentFile(content))
+
+
+def placeholder_data_uri(image):
+    """A few hundred bytes of tiny JPEG, which browsers blur when stretched"""
+    preview = image.copy()
+    preview.thumbnail((PLACEHOLDER_WIDTH, PLACEHOLDER_WIDTH))
+    buffer = BytesIO()
+    preview.save(buffer, 'JPEG', quality=40)
+    return 'data:image/jpeg;base64,' + base64.b64encode(buffer.getvalue()).decode()
+
+
+def generate_derivatives(source_name, storage=None):
+    """Write every size and format of one stored image; returns its variants record.
+
+    Sizes wider than the original are not upscaled: they are dropped, and the
+    original width is kept as the largest one instead. The record maps each
+    generated label to its real width, holds the upright intrinsic size and a
+    placeholder, and names the source it was made from, so a replaced image is
+    recognised as stale.
+    """
+    if storage is None:
+        from .storage import product_image_storage
+        storage = product_image_storage()
+    largest = max(DERIVATIVE_WIDTHS.values())
+    with storage.open(source_name, 'rb') as source:
+        image = Image.open(source)
+        width, height = image.size
+        if image.getexif().get(EXIF_ORIENTATION) in (5, 6, 7, 8):
+            width, height = height, width
+        # JPEGs decode straight at 1/2, 1/4 or 1/8 scale when that still covers
+        # the largest derivative, which makes phone photos far cheaper to read
+        image.draft('RGB', (largest, largest))
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    elif image.mode == 'L':
+        image = image.convert('RGB')
+
+    widths = {}
+    for label, target in DERIVATIVE_WIDTHS.items():
+        target = min(target, image.width)
+        if target in widths.values():
+            continue
+        size = (target, max(round(image.height * target / image.width), 1))
+        resized = image if target == image.width else image.resize(size, Image.Resampling.LANCZOS)
+        for image_format, extension, options in DERIVATIVE_FORMATS:
+            buffer = BytesIO()
+            resized.save(buffer, image_format, **options)
+            _save(storage, derivative_name(source_name, label, extension), buffer.getvalue())
+        widths[label] = target
+    return {
+        'version': VARIANTS_VERSION,
+        'source': source_name,
+        'widths': widths,
+        'width': width,
+        'height': height,
+        'placeholder': placeholder_data_uri(image),
+    }
+
+
+def has_current_variants(instance):
+    """True when instance.image has derivatives made from the file it holds now"""
+    variants = instance.image_variants
+    return (
+        bool(instance.image)
+        and variants.get('source') == instance.image.name
+        and variants.get('version') == VARIANTS_VERSION
+    )
+
+
+def variant_url(instance, label, extension='jpg'):
+    """URL of one derivative, or of the original when none has been made yet"""
+    if not has_current_variants(instance):
+        return instance.image.url
+    widths = instance.image_variants['widths']
+    if label not in widths:
+        # Small originals only have the labels up to their own width
+        label = max(widths, key=widths.get)
+    return instance.image.storage.url(derivative_name(instance.image.name, label, extension))
+
+
+def display_size(instance, label):
+    """(width, height) attributes for one derivative, keeping the intrinsic aspect ratio"""
+    variants = instance.image_variants
+    widths = variants['widths']
+    width = widths.get(label) or max(widths.values())
+    return width, max(round(width * variants['height'] / variants['width']), 1)
+
+
+def srcset(instance, extension):
+    """srcset value listing every generated width of one format"""
+    widths = instance.image_variants['widths']
+    storage = instance.image.storage
+    return ', '.join(
+        f'{storage.url(derivative_name(instance.image.name, label, extension))} {width}w'
+        for label, width in sorted(widths.items(), key=lambda item: item[1])
+    )
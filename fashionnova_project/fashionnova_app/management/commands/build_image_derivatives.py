@@ -0,0 +1,55 @@
+# fashionnova_app/management/commands/build_image_derivatives.py
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from fashionnova_app.images import VARIANTS_VERSION, generate_derivatives
+from fashionnova_app.models import Product, ProductImage
+
+
+class Command(BaseCommand):
+    help = 'Generate resized WebP/JPEG derivatives for existing product and gallery images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Image processing worker processes')
+        parser.add_argument('--force', action='store_true',
+                            help='Regenerate images whose derivatives are already current')
+
+    def handle(self, *args, **options):
+        jobs = {}
+        for model in (Product, ProductImage):
+            for pk, name, variants in model.objects.exclude(image='').exclude(image__isnull=True).values_list(
+                'pk', 'image', 'image_variants'
+            ):
+                variants = variants or {}
+                current = variants.get('source') == name and variants.get('version') == VARIANTS_VERSION
+                if options['force'] or not current:
+                    jobs[(model, pk)] = name
+        if not jobs:
+            self.stdout.write(self.style.SUCCESS('All product images already have derivatives'))
+            return
+
+        done = failed = 0
+        # Workers only touch files; the database is written from this process
+        with ProcessPoolExecutor(max_workers=max(options['workers'], 1), initializer=django.setup) as pool:
+            futures = {pool.submit(generate_derivatives, name): key for key, name in jobs.items()}
+            for future in as_completed(futures):
+                model, pk = futures[future]
+                try:
+                    variants = future.result()
+                except (OSError, Image.DecompressionBombError) as error:
+                    failed += 1
+                    self.stderr.write(f'  {jobs[model, pk]}: {error}')
+                    continue
+                model.objects.filter(pk=pk, image=variants['source']).update(image_variants=variants)
+                done += 1
+                if options['verbosity'] > 1:
+                    self.stdout.write(f'  {variants["source"]}')
+
+        self.stdout.write(self.style.SUCCESS(f'Derivatives built for {done} images'))
+        if failed:
+            self.stdout.write(self.style.WARNING(f'{failed} images could not be read'))
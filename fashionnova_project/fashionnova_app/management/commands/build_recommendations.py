@@ -0,0 +1,17 @@
+# fashionnova_app/management/commands/build_recommendations.py
+from django.core.management.base import BaseCommand
+
+from fashionnova_app.recommendations import build_recommendations
+
+
+class Command(BaseCommand):
+    help = 'Update the "customers also bought" lists from orders placed since the last run'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Recompute every list from the whole order history')
+
+    def handle(self, *args, **options):
+        updated = build_recommendations(full=options['full'])
+        kind = 'Full' if options['full'] else 'Incremental'
+        self.stdout.write(self.style.SUCCESS(f'{kind} build updated recommendations for {updated} products'))
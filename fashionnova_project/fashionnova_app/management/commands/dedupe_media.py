@@ -0,0 +1,95 @@
+# fashionnova_app/management/commands/dedupe_media.py
+import os
+import shutil
+
+from django.apps import apps
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import FileField
+
+from fashionnova_app.images import DERIVATIVE_ROOT
+from fashionnova_app.media_queue import enqueue_image
+from fashionnova_app.models import Product, ProductImage
+from fashionnova_app.storage import BLOB_ROOT, blob_name, file_digest, product_image_storage
+
+
+class Command(BaseCommand):
+    help = 'Move existing media files into the content-addressed store, keeping one copy of each'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report what would be merged without touching files or rows')
+
+    def handle(self, *args, **options):
+        storage = product_image_storage()
+        if not getattr(storage, 'content_addressed', False):
+            raise CommandError('The product_images storage is not ContentAddressedStorage')
+
+        # Only fields stored here release their blobs; files of other fields stay put
+        file_fields = [
+            (model, field.name)
+            for model in apps.get_models()
+            for field in model._meta.get_fields()
+            if isinstance(field, FileField) and field.concrete and field.storage is storage
+        ]
+        dry_run = options['dry_run']
+        seen = set()
+        moved = duplicates = orphans = saved_bytes = 0
+
+        for path in self.legacy_files(storage.location):
+            name = os.path.relpath(path, storage.location).replace(os.sep, '/')
+            references = {
+                (model, field): model.objects.filter(**{field: name}).count()
+                for model, field in file_fields
+            }
+            total = sum(references.values())
+            if not total:
+                # Nothing content-addressed points at it; leave it for a human to look at
+                orphans += 1
+                continue
+
+            with open(path, 'rb') as handle:
+                digest, size = file_digest(File(handle))
+            blob = blob_name(digest, name)
+            duplicate = digest in seen or storage.exists(blob)
+            seen.add(digest)
+            if duplicate:
+                duplicates += 1
+                saved_bytes += size
+            moved += 1
+            self.stdout.write(f'  {name} -> {blob}{" (duplicate)" if duplicate else ""}')
+            if dry_run:
+                continue
+
+            # Copy, repoint, then remove: a failure part way never leaves a row
+            # naming a file that is not there
+            if not storage.exists(blob):
+                os.makedirs(os.path.dirname(storage.path(blob)), exist_ok=True)
+                shutil.copy2(path, storage.path(blob))
+            with transaction.atomic():
+                for (model, field), count in references.items():
+                    if count:
+                        model.objects.filter(**{field: name}).update(**{field: blob})
+                storage.add_references(blob, digest, size, total)
+            os.remove(path)
+            storage.delete_derivatives(name)
+            for model in (Product, ProductImage):
+                for instance in model.objects.filter(image=blob):
+                    enqueue_image(instance)
+
+        verb = 'Would move' if dry_run else 'Moved'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {moved} files; {duplicates} were duplicates ({saved_bytes / 1024:.1f} KiB saved)'
+        ))
+        if orphans:
+            self.stdout.write(self.style.WARNING(
+                f'{orphans} files are not referenced by any product image and were left alone'
+            ))
+
+    def legacy_files(self, root):
+        for directory, subdirectories, files in os.walk(root):
+            if directory == root:
+                subdirectories[:] = [d for d in subdirectories if d not in (BLOB_ROOT, DERIVATIVE_ROOT)]
+            for file_name in sorted(files):
+                yield os.path.join(directory, file_name)
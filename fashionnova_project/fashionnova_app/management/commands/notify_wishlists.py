@@ -0,0 +1,39 @@
+# fashionnova_app/management/commands/notify_wishlists.py
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from fashionnova_app.notifications import EVENT_BATCH, get_notifier, send_pending_digests
+
+
+class Command(BaseCommand):
+    help = 'Run the wishlist notifier: send price-drop and back-in-stock digests from the product outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backend',
+                            help='Dotted path of the notifier to use instead of WISHLIST_NOTIFIER_BACKEND')
+        parser.add_argument('--batch-size', type=int, default=EVENT_BATCH,
+                            help='Outbox events turned into digests per transaction')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit when the outbox is empty instead of polling')
+        parser.add_argument('--poll-interval', type=float, default=30.0,
+                            help='Seconds to wait between polls of an empty outbox')
+
+    def handle(self, *args, **options):
+        notifier = get_notifier(options['backend'])
+        consumed = sent = 0
+        try:
+            while True:
+                close_old_connections()
+                events, digests = send_pending_digests(notifier, max(options['batch_size'], 1))
+                consumed += events
+                sent += digests
+                if events and options['verbosity'] > 1:
+                    self.stdout.write(f'  {consumed} events, {sent} digests sent')
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f'Wishlist notifier stopped after {consumed} events and {sent} digests'))
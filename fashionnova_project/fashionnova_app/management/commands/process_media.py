@@ -0,0 +1,43 @@
+# fashionnova_app/management/commands/process_media.py
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from fashionnova_app.media_queue import CLAIM_BATCH, claim_jobs, process_jobs
+
+
+class Command(BaseCommand):
+    help = 'Run the media worker: generate image derivatives for queued uploads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Image processing worker processes')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit when the queue is empty instead of polling')
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help='Seconds to wait between polls of an empty queue')
+
+    def handle(self, *args, **options):
+        workers = max(options['workers'], 1)
+        completed = 0
+        with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+            try:
+                while True:
+                    close_old_connections()
+                    # Claim enough to keep every process busy
+                    jobs = claim_jobs(max(CLAIM_BATCH, workers * 2))
+                    if jobs:
+                        completed += process_jobs(jobs, pool)
+                        if options['verbosity'] > 1:
+                            self.stdout.write(f'  {completed} images processed')
+                    elif options['once']:
+                        break
+                    else:
+                        time.sleep(options['poll_interval'])
+            except KeyboardInterrupt:
+                pass
+        self.stdout.write(self.style.SUCCESS(f'Media worker stopped after processing {completed} images'))
@@ -0,0 +1,12 @@
+# fashionnova_app/management/commands/rebuild_ratings.py
+from django.core.management.base import BaseCommand
+
+from fashionnova_app.ratings import rebuild_ratings
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored rating aggregates of products, brands and sellers from reviews'
+
+    def handle(self, *args, **options):
+        rebuild_ratings()
+        self.stdout.write(self.style.SUCCESS('Rating aggregates rebuilt'))
@@ -0,0 +1,37 @@
+# fashionnova_app/management/commands/rebuild_search_index.py
+from django.core.management.base import BaseCommand
+
+from fashionnova_app.fuzzy import rebuild_terms
+from fashionnova_app.search import INDEX_BATCH_SIZE, get_backend, rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the product full-text search index and the fuzzy-match trigram table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=INDEX_BATCH_SIZE,
+                            help='Products indexed per batch')
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Parallel indexing threads (backends that allow concurrent writers only)')
+
+    def handle(self, *args, **options):
+        terms = rebuild_terms()
+        self.stdout.write(self.style.SUCCESS(f'Trigram table rebuilt with {terms} terms'))
+
+        backend = get_backend()
+        if backend is None:
+            self.stdout.write(self.style.WARNING('No full-text backend for this database; nothing to index'))
+            return
+
+        if options['workers'] > 1 and not backend.supports_parallel:
+            self.stdout.write(f'{type(backend).__name__} has a single writer; indexing batches sequentially')
+
+        def progress(indexed, total):
+            self.stdout.write(f'  {indexed}/{total} products indexed')
+
+        indexed = rebuild_index(
+            batch_size=options['batch_size'],
+            workers=options['workers'],
+            progress=progress if options['verbosity'] > 1 else None,
+        )
+        self.stdout.write(self.style.SUCCESS(f'Search index rebuilt with {indexed} products'))
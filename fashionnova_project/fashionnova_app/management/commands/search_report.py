@@ -0,0 +1,63 @@
+# fashionnova_app/management/commands/search_report.py
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Avg, Count, Max, OuterRef, Subquery
+from django.utils import timezone
+
+from fashionnova_app.models import SearchQueryLog
+
+
+class Command(BaseCommand):
+    help = 'Report top, zero-result and slow search queries from the search log'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7, help='How far back to look')
+        parser.add_argument('--limit', type=int, default=20, help='Rows per section')
+        parser.add_argument('--slow-ms', type=float, default=200.0,
+                            help='Average latency above which a query counts as slow')
+
+    def handle(self, *args, **options):
+        # Entries still buffered in the web processes are not in the report yet
+        since = timezone.now() - timedelta(days=options['days'])
+        limit = options['limit']
+        queries = SearchQueryLog.objects.filter(created_at__gte=since).values('normalized_query')
+
+        total = SearchQueryLog.objects.filter(created_at__gte=since).count()
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"Search report for the last {options['days']} day(s): {total} searches"
+        ))
+
+        top = queries.annotate(
+            searches=Count('id'), avg_hits=Avg('hits'), avg_ms=Avg('latency_ms')
+        ).order_by('-searches', 'normalized_query')[:limit]
+        self.section('Top queries', top, lambda row: (
+            f"{row['searches']:>6}  {row['avg_hits']:>8.1f} hits  {row['avg_ms']:>7.1f} ms  {row['normalized_query']}"
+        ))
+
+        latest_correction = SearchQueryLog.objects.filter(
+            normalized_query=OuterRef('normalized_query'), hits=0, created_at__gte=since,
+        ).exclude(corrected_to='').order_by('-created_at', '-id').values('corrected_to')[:1]
+        zero = queries.filter(hits=0).annotate(
+            searches=Count('id'), last_corrected=Subquery(latest_correction)
+        ).order_by('-searches', 'normalized_query')[:limit]
+        self.section('Zero-result queries', zero, lambda row: (
+            f"{row['searches']:>6}  {row['normalized_query']}"
+            + (f"  (shown: {row['last_corrected']})" if row['last_corrected'] else '')
+        ))
+
+        slow = queries.annotate(
+            searches=Count('id'), avg_ms=Avg('latency_ms'), max_ms=Max('latency_ms')
+        ).filter(avg_ms__gte=options['slow_ms']).order_by('-avg_ms')[:limit]
+        self.section(f"Slow queries (average >= {options['slow_ms']:g} ms)", slow, lambda row: (
+            f"{row['searches']:>6}  {row['avg_ms']:>7.1f} ms avg  {row['max_ms']:>7.1f} ms max  {row['normalized_query']}"
+        ))
+
+    def section(self, title, rows, format_row):
+        self.stdout.write('')
+        self.stdout.write(self.style.MIGRATE_LABEL(title))
+        rows = list(rows)
+        if not rows:
+            self.stdout.write('  (none)')
+        for row in rows:
+            self.stdout.write(f'  {format_row(row)}')
@@ -0,0 +1,79 @@
+# fashionnova_app/management/commands/vendor_assets.py
+import os
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+from fashionnova_app.assets import VENDOR_ASSETS, integrity_of, vendor_path
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'static')
+
+
+class Command(BaseCommand):
+    help = 'Download the pinned front-end libraries into fashionnova_app/static/vendor'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Download files that are already present')
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Download nothing; fail if any library is not vendored and still loads from its CDN',
+        )
+
+    def handle(self, *args, **options):
+        if options['check']:
+            return self.check()
+        fetched = 0
+        for name, asset in VENDOR_ASSETS.items():
+            unpinned = [source for source, _ in asset['files'] if source not in asset.get('integrity', {})]
+            if unpinned:
+                self.stdout.write(self.style.WARNING(
+                    f'  {name}: no pinned digest for {", ".join(unpinned)}; still served from the CDN'
+                ))
+                continue
+            # Every file of a library is checked before any is written, so a
+            # bad download never leaves a half-vendored library behind
+            downloads = []
+            for source, static_path in asset['files']:
+                target = os.path.join(STATIC_DIR, vendor_path(static_path))
+                if os.path.exists(target) and not options['force']:
+                    continue
+                downloads.append((target, self.download(asset, source)))
+            for target, content in downloads:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                with open(target, 'wb') as handle:
+                    handle.write(content)
+                self.stdout.write(f'  {os.path.relpath(target, STATIC_DIR)}')
+            fetched += len(downloads)
+        self.stdout.write(self.style.SUCCESS(
+            f'{fetched} vendored files downloaded; commit static/vendor and run collectstatic'
+        ))
+
+    def check(self):
+        """Report each library's vendored state, for deploys that must not use a CDN"""
+        missing = []
+        for name, asset in VENDOR_ASSETS.items():
+            absent = [
+                static_path for _, static_path in asset['files']
+                if not os.path.exists(os.path.join(STATIC_DIR, vendor_path(static_path)))
+            ]
+            if absent:
+                missing.append(name)
+                self.stdout.write(f'  {name}: served from {asset["base_url"]} ({len(absent)} files not vendored)')
+            else:
+                self.stdout.write(f'  {name}: vendored')
+        if missing:
+            raise CommandError(f'Not vendored: {", ".join(missing)}')
+
+    def download(self, asset, source):
+        """The file's bytes, once they match its pinned digest"""
+        url = asset['base_url'] + source
+        try:
+            response = requests.get(url, timeout=30)
+            response.raise_for_status()
+        except requests.RequestException as error:
+            raise CommandError(f'Could not download {url}: {error}')
+        expected = asset['integrity'][source]
+        actual = integrity_of(response.content, expected.split('-', 1)[0])
+        if actual != expected:
+            raise CommandError(f'{url} does not match its pinned digest: expected {expected}, got {actual}')
+        return response.content
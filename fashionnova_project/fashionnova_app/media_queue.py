@@ -0,0 +1,126 @@
+# fashionnova_app/media_queue.py
+import logging
+from datetime import timedelta
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models import F, Q
+from django.db.models.functions import Now
+from django.utils import timezone
+from PIL import Image
+
+from .images import generate_derivatives, has_current_variants
+from .models import MediaJob, Product
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 3
+CLAIM_BATCH = 20
+# A job this long in processing belonged to a worker that died; hand it out again
+STALE_AFTER = timedelta(minutes=10)
+
+
+def is_pending(instance):
+    """True while instance.image is queued and its derivatives are not ready"""
+    return bool(instance.image) and instance.image_variants.get('pending') == instance.image.name
+
+
+def enqueue_image(instance):
+    """Queue derivative generation for a Product or ProductImage's new image.
+
+    The row is marked pending straight away so pages show a placeholder
+    rather than the full-size upload until a worker has processed it.
+    """
+    if not instance.image or has_current_variants(instance) or is_pending(instance):
+        return None
+    instance.image_variants = {'pending': instance.image.name}
+    type(instance).objects.filter(pk=instance.pk).update(image_variants=instance.image_variants)
+    return MediaJob.objects.create(
+        model=instance._meta.label_lower, object_id=instance.pk, source=instance.image.name,
+    )
+
+
+def claim_jobs(limit=CLAIM_BATCH):
+    """Mark up to limit queued jobs as processing and return them.
+
+    Concurrent workers skip each other's locked rows where the database has
+    row locks; on SQLite the write lock serializes claims instead.
+    """
+    claimable = Q(status='pending') | Q(status='processing', updated_at__lt=timezone.now() - STALE_AFTER)
+    with transaction.atomic():
+        jobs = list(
+            MediaJob.objects.select_for_update(skip_locked=True).filter(claimable).order_by('id')[:limit]
+        )
+        MediaJob.objects.filter(id__in=[job.id for job in jobs]).update(
+            status='processing', attempts=F('attempts') + 1, updated_at=Now(),
+        )
+    for job in jobs:
+        job.attempts += 1
+    return jobs
+
+
+def complete_job(job, variants):
+    """Record a job's derivatives, unless the image was replaced while it ran"""
+    model = apps.get_model(job.model)
+    updates = {'image_variants': variants}
+    if model is Product:
+        # Cached product pages are keyed on updated_at
+        updates['updated_at'] = Now()
+    model.objects.filter(pk=job.object_id, image=job.source).update(**updates)
+    MediaJob.objects.filter(id=job.id).update(status='done', error='')
+
+
+def fail_job(job, error):
+    """Put a job back in the queue, or give up on it after MAX_ATTEMPTS.
+
+    A job given up on clears its image's pending mark, so pages show the
+    original upload instead of the placeholder.
+    """
+    status = 'failed' if job.attempts >= MAX_ATTEMPTS else 'pending'
+    if status == 'failed':
+        model = apps.get_model(job.model)
+        updates = {'image_variants': {}}
+        if model is Product:
+            updates['updated_at'] = Now()
+        model.objects.filter(pk=job.object_id, image=job.source, image_variants__pending=job.source).update(**updates)
+    MediaJob.objects.filter(id=job.id).update(status=status, error=str(error)[:1000])
+    logger.warning('Media job %s for %s failed (attempt %s): %s', job.id, job.source, job.attempts, error)
+
+
+def process_jobs(jobs, pool=None):
+    """Generate the derivatives of claimed jobs, in pool's processes when given.
+
+    Workers only decode and write files; every database write happens here.
+    Returns the number of jobs completed.
+    """
+    if pool is None:
+        results = [(job, _run(generate_derivatives, job.source)) for job in jobs]
+    else:
+        futures = [(job, pool.submit(generate_derivatives, job.source)) for job in jobs]
+        results = [(job, _run(future.result)) for job, future in futures]
+
+    completed = 0
+    for job, (variants, error) in results:
+        if error is None:
+            complete_job(job, variants)
+            completed += 1
+        else:
+            fail_job(job, error)
+    return completed
+
+
+def _run(function, *args):
+    try:
+        return function(*args), None
+    except (OSError, Image.DecompressionBombError) as error:
+        return None, error
+
+
+def process_pending_media(pool=None):
+    """Drain the queue in the current process; returns the number of jobs completed"""
+    completed = 0
+    while True:
+        jobs = claim_jobs()
+        if not jobs:
+            return completed
+        completed += process_jobs(jobs, pool)
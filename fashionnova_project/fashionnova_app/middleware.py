@@ -0,0 +1,17 @@
+# fashionnova_app/middleware.py
+from .assets import critical_asset_links
+
+
+class PreloadMiddleware:
+    """Adds Link: rel=preload headers for critical static assets to HTML pages"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if response.get('Content-Type', '').startswith('text/html') and 'Link' not in response:
+            links = critical_asset_links()
+            if links:
+                response['Link'] = links
+        return response
@@ -0,0 +1,58 @@
+# Generated by Django 5.0.2 on 2026-10-18 07:02
+
+from django.db import migrations, models
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Cast, Coalesce, NullIf, Round
+
+
+def populate_pricing(apps, schema_editor):
+    Product = apps.get_model('fashionnova_app', 'Product')
+    Product.objects.update(
+        final_price=Coalesce(
+            NullIf(F('discount_price'), Value(0)), F('price'),
+            output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        ),
+        discount_percentage=Case(
+            When(
+                discount_price__gt=0, price__gt=0,
+                then=Round(Cast(F('price') - F('discount_price'), models.FloatField()) * Value(100.0)
+                           / Cast(F('price'), models.FloatField()), 2),
+            ),
+            default=Value(0),
+            output_field=models.DecimalField(max_digits=6, decimal_places=2),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fashionnova_app', '0007_catalog_and_order_indexes'),
+        ('users', '0002_alter_customuser_address_alter_customuser_phone_and_more'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_active_price_idx',
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='discount_percentage',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=6),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='final_price',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10),
+        ),
+        migrations.RunPython(populate_pricing, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['final_price', 'id'], name='product_active_final_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['discount_percentage', 'id'], name='product_active_discount_idx'),
+        ),
+    ]
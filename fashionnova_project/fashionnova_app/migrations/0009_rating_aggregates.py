@@ -0,0 +1,78 @@
+# Generated by Django 5.0.2 on 2026-10-18 07:05
+
+from django.db import migrations, models
+from django.db.models import Count, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+
+def _average(total, count):
+    return Coalesce(Cast(F(total), models.FloatField()) / NullIf(F(count), Value(0)), Value(0.0))
+
+
+def populate_ratings(apps, schema_editor):
+    Review = apps.get_model('fashionnova_app', 'Review')
+    Product = apps.get_model('fashionnova_app', 'Product')
+    Brand = apps.get_model('fashionnova_app', 'Brand')
+    SellerProfile = apps.get_model('users', 'SellerProfile')
+
+    reviews = Review.objects.filter(product=OuterRef('pk')).order_by().values('product')
+    Product.objects.update(
+        review_count=Coalesce(Subquery(reviews.annotate(count=Count('id')).values('count')), 0),
+        rating_total=Coalesce(Subquery(reviews.annotate(total=Sum('rating')).values('total')), 0),
+    )
+    Product.objects.update(average_rating=_average('rating_total', 'review_count'))
+
+    for model, average_field, foreign_key in ((Brand, 'average_rating', 'brand'),
+                                              (SellerProfile, 'rating', 'seller')):
+        products = Product.objects.filter(**{foreign_key: OuterRef('pk')}).order_by().values(foreign_key)
+        model.objects.update(
+            review_count=Coalesce(Subquery(products.annotate(count=Sum('review_count')).values('count')), 0),
+            rating_total=Coalesce(Subquery(products.annotate(total=Sum('rating_total')).values('total')), 0),
+        )
+        model.objects.update(**{average_field: _average('rating_total', 'review_count')})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fashionnova_app', '0008_product_final_price'),
+        ('users', '0003_seller_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='brand',
+            name='average_rating',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='brand',
+            name='rating_total',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='brand',
+            name='review_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='average_rating',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_total',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='review_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_ratings, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['average_rating', 'id'], name='product_active_rating_idx'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.0.2 on 2026-10-18 07:40
+
+from django.db import migrations
+
+SEARCH_TABLE = 'fashionnova_app_product_search'
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5('
+            "name, brand, category, description, tokenize='porter unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            f'INSERT INTO {SEARCH_TABLE} (rowid, name, brand, category, description) '
+            "SELECT p.id, p.name, COALESCE(b.name, ''), COALESCE(c.name, ''), p.description "
+            'FROM fashionnova_app_product p '
+            'LEFT JOIN fashionnova_app_brand b ON b.id = p.brand_id '
+            'LEFT JOIN fashionnova_app_category c ON c.id = p.category_id '
+            'WHERE p.is_active'
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            f'CREATE TABLE {SEARCH_TABLE} ('
+            'product_id bigint PRIMARY KEY REFERENCES fashionnova_app_product (id) '
+            'ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+            'document tsvector NOT NULL)'
+        )
+        schema_editor.execute(
+            f'CREATE INDEX {SEARCH_TABLE}_document_idx ON {SEARCH_TABLE} USING GIN (document)'
+        )
+        schema_editor.execute(
+            f'INSERT INTO {SEARCH_TABLE} (product_id, document) '
+            "SELECT p.id, "
+            "setweight(to_tsvector('english', COALESCE(p.name, '')), 'A') || "
+            "setweight(to_tsvector('english', COALESCE(b.name, '') || ' ' || COALESCE(c.name, '')), 'B') || "
+            "setweight(to_tsvector('english', COALESCE(p.description, '')), 'C') "
+            'FROM fashionnova_app_product p '
+            'LEFT JOIN fashionnova_app_brand b ON b.id = p.brand_id '
+            'LEFT JOIN fashionnova_app_category c ON c.id = p.category_id '
+            'WHERE p.is_active'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fashionnova_app', '0009_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 5.0.2 on 2026-10-18 07:12
+
+import re
+import unicodedata
+from collections import Counter
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def _words(text):
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return [
+        word for word in re.findall(r'\w+', text.lower())
+        if 3 <= len(word) <= 64 and not word.isdigit()
+    ]
+
+
+def _trigrams(word):
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def populate_terms(apps, schema_editor):
+    Product = apps.get_model('fashionnova_app', 'Product')
+    Brand = apps.get_model('fashionnova_app', 'Brand')
+    Category = apps.get_model('fashionnova_app', 'Category')
+    SearchTerm = apps.get_model('fashionnova_app', 'SearchTerm')
+    SearchTrigram = apps.get_model('fashionnova_app', 'SearchTrigram')
+
+    frequencies = Counter()
+    names = list(Product.objects.filter(is_active=True).values_list('name', flat=True))
+    names += list(Brand.objects.filter(is_active=True).values_list('name', flat=True))
+    names += list(Category.objects.values_list('name', flat=True))
+    for name in names:
+        frequencies.update(_words(name))
+
+    SearchTerm.objects.bulk_create([
+        SearchTerm(term=term, frequency=frequency, trigram_count=len(_trigrams(term)))
+        for term, frequency in frequencies.items()
+    ], batch_size=1000)
+    SearchTrigram.objects.bulk_create([
+        SearchTrigram(trigram=trigram, term=term)
+        for term in SearchTerm.objects.all()
+        for trigram in _trigrams(term.term)
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fashionnova_app', '0010_product_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64, unique=True)),
+                ('frequency', models.PositiveIntegerField(default=1)),
+                ('trigram_count', models.PositiveSmallIntegerField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SearchTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigram', models.CharField(max_length=3)),
+                ('term', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trigrams', to='fashionnova_app.searchterm')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['trigram', 'term'], name='search_trigram_idx')],
+            },
+        ),
+        migrations.RunPython(populate_terms, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.0.2 on 2026-10-18 07:14
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fashionnova_app', '0011_search_trigrams'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchQueryLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('query', models.CharField(max_length=200)),
+                ('normalized_query', models.CharField(max_length=200)),
+                ('hits', models.PositiveIntegerField()),
+                ('latency_ms', models.FloatField()),
+                ('corrected_to', models.CharField(blank=True, max_length=200)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created_at'], name='search_log_created_idx')],
+            },
+        ),
+    ]
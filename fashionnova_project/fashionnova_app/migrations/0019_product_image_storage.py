@@ -0,0 +1,24 @@
+# Generated by Django 5.0.2 on 2026-10-18 08:25
+
+import fashionnova_app.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fashionnova_app', '0018_product_event'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=fashionnova_app.storage.product_image_storage, upload_to='products/'),
+        ),
+        migrations.AlterField(
+            model_name='productimage',
+            name='image',
+            field=models.ImageField(storage=fashionnova_app.storage.product_image_storage, upload_to='products/gallery/'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# fashionnova_app/model_mixins.py
+
+
+class MaintainedFieldsMixin:
+    """Leave columns that are written in place out of ordinary saves.
+
+    maintained_fields are only ever changed with queryset updates, such as
+    F() increments in ratings.py or the media worker's results. A full save()
+    of an instance loaded before one of those would write the old values
+    back, so saving an existing row without update_fields writes every other
+    loaded field instead.
+    """
+    maintained_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (kwargs.get('update_fields') is None and not kwargs.get('force_insert')
+                and not self._state.adding and self.pk is not None):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in deferred
+                and field.name not in self.maintained_fields
+            ]
+        super().save(*args, **kwargs)
@@ -1,10 +1,16 @@
 # fashionnova_app/models.py
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Cast, Coalesce, Now, NullIf, Round
+from django.db.models.lookups import GreaterThan
 from django.contrib.auth import get_user_model
 from decimal import Decimal
 import time
 from users.models import SellerProfile  # Import SellerProfile from users app
+from .model_mixins import MaintainedFieldsMixin
+from .storage import product_image_storage
 from django.utils.text import slugify
+from django.utils import timezone
 
 User = get_user_model()
 
@@ -37,16 +43,23 @@ class Category(models.Model):
         verbose_name_plural = "Categories"
         ordering = ['name']
 
-class Brand(models.Model):
+class Brand(MaintainedFieldsMixin, models.Model):
     name = models.CharField(max_length=100, unique=True)
     slug = models.SlugField(max_length=100, unique=True, blank=True)
     description = models.TextField(blank=True)
     logo = models.ImageField(upload_to='brands/', blank=True, null=True)
     website = models.URLField(blank=True)
     is_active = models.BooleanField(default=True)
+    # Rolled up from the brand's products' reviews (see ratings.py)
+    average_rating = models.FloatField(default=0, editable=False)
+    review_count = models.IntegerField(default=0, editable=False)
+    rating_total = models.IntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Only ratings.py writes these, with F() expressions
+    maintained_fields = ('average_rating', 'review_count', 'rating_total')
+    
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
@@ -56,7 +69,90 @@ class Brand(models.Model):
         return self.name
 
 
-class Product(models.Model):
+PRICING_FIELDS = ('final_price', 'discount_percentage')
+
+
+def _price_expression(value):
+    if hasattr(value, 'resolve_expression'):
+        return value
+    return Value(value, output_field=models.DecimalField(max_digits=10, decimal_places=2))
+
+
+def final_price_expression(price=F('price'), discount_price=F('discount_price')):
+    """SQL for the price a customer pays, mirroring Product.get_final_price()"""
+    return Coalesce(NullIf(discount_price, Value(0)), price,
+                    output_field=models.DecimalField(max_digits=10, decimal_places=2))
+
+
+def discount_percentage_expression(price=F('price'), discount_price=F('discount_price')):
+    """SQL for the percentage off, mirroring Product.get_discount_percentage()"""
+    return Case(
+        When(
+            GreaterThan(discount_price, Value(0)) & GreaterThan(price, Value(0)),
+            # Divide as floats: SQLite would otherwise truncate integral prices
+            then=Round(Cast(price - discount_price, models.FloatField()) * Value(100.0)
+                       / Cast(price, models.FloatField()), 2),
+        ),
+        default=Value(0),
+        output_field=models.DecimalField(max_digits=6, decimal_places=2),
+    )
+
+
+# Columns whose changes are queued for wishlist digests (notifications.py)
+NOTIFIED_FIELDS = {'price', 'discount_price', 'final_price', 'stock'}
+
+
+class ProductQuerySet(models.QuerySet):
+    """Keeps the stored pricing columns and the wishlist outbox in step on bulk writes"""
+
+    def update(self, **kwargs):
+        if 'price' in kwargs or 'discount_price' in kwargs:
+            # UPDATE right-hand sides all see the old row, so derive the
+            # stored columns from the new values' expressions directly.
+            price = _price_expression(kwargs.get('price', F('price')))
+            discount_price = _price_expression(kwargs.get('discount_price', F('discount_price')))
+            kwargs.setdefault('final_price', final_price_expression(price, discount_price))
+            kwargs.setdefault('discount_percentage', discount_percentage_expression(price, discount_price))
+            # auto_now only applies on save(); cached fragments are keyed on it
+            kwargs.setdefault('updated_at', Now())
+        if not NOTIFIED_FIELDS.intersection(kwargs):
+            return super().update(**kwargs)
+        # Price drops and restocks reach wishlists the same way a save's do
+        from .notifications import record_bulk_changes
+        with transaction.atomic(using=self.db):
+            rows = self.select_for_update().order_by().values_list('id', 'final_price', 'stock')
+            loaded = {product_id: (final_price, stock) for product_id, final_price, stock in rows}
+            updated = super().update(**kwargs)
+            record_bulk_changes(loaded)
+        return updated
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.update_pricing()
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        fields = list(fields)
+        if 'price' in fields or 'discount_price' in fields:
+            objs = list(objs)
+            now = timezone.now()
+            for obj in objs:
+                obj.update_pricing()
+                obj.updated_at = now
+            fields += [field for field in (*PRICING_FIELDS, 'updated_at') if field not in fields]
+        # Each batch is written through update(), which records the outbox rows
+        return super().bulk_update(objs, fields, *args, **kwargs)
+
+    def refresh_pricing(self):
+        """Recompute final_price/discount_percentage for every row in one UPDATE"""
+        return super().update(
+            final_price=final_price_expression(),
+            discount_percentage=discount_percentage_expression(),
+        )
+
+
+class Product(MaintainedFieldsMixin, models.Model):
     GENDER_CHOICES = (
         ('M', 'Men'),
         ('F', 'Women'),
@@ -70,15 +166,39 @@ class Product(models.Model):
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     discount_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    # Maintained from price/discount_price so filters and sorts run in SQL
+    final_price = models.DecimalField(max_digits=10, decimal_places=2, default=0, editable=False)
+    discount_percentage = models.DecimalField(max_digits=6, decimal_places=2, default=0, editable=False)
+    # Maintained incrementally from Review writes (see ratings.py)
+    average_rating = models.FloatField(default=0, editable=False)
+    review_count = models.IntegerField(default=0, editable=False)
+    rating_total = models.IntegerField(default=0, editable=False)
+    # Review counts per star, for the histogram on the product page
+    rating_1_count = models.IntegerField(default=0, editable=False)
+    rating_2_count = models.IntegerField(default=0, editable=False)
+    rating_3_count = models.IntegerField(default=0, editable=False)
+    rating_4_count = models.IntegerField(default=0, editable=False)
+    rating_5_count = models.IntegerField(default=0, editable=False)
     category = models.ForeignKey('Category', on_delete=models.SET_NULL, null=True, related_name='products')
     brand = models.ForeignKey('Brand', on_delete=models.SET_NULL, null=True, blank=True, related_name='products')
     gender = models.CharField(max_length=1, choices=GENDER_CHOICES, default='U')
     stock = models.IntegerField(default=0)
-    image = models.ImageField(upload_to='products/', blank=True, null=True)
+    image = models.ImageField(upload_to='products/', storage=product_image_storage, blank=True, null=True)
+    # Resized copies of image, written by the media queue (see media_queue.py)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
     
+    objects = ProductQuerySet.as_manager()
+    
+    # Only ratings.py writes these, with F() expressions, and the media queue image_variants
+    maintained_fields = (
+        'average_rating', 'review_count', 'rating_total',
+        'rating_1_count', 'rating_2_count', 'rating_3_count', 'rating_4_count', 'rating_5_count',
+        'image_variants',
+    )
+    
     def get_discount_percentage(self):
         if self.discount_price and self.price > 0:
             return round(((self.price - self.discount_price) / self.price) * 100, 2)
@@ -87,22 +207,65 @@ class Product(models.Model):
     def get_final_price(self):
         return self.discount_price if self.discount_price else self.price
     
+    @property
+    def rating_histogram(self):
+        """(stars, count, percent of reviews) from 5 stars down to 1"""
+        histogram = []
+        for stars in range(5, 0, -1):
+            count = getattr(self, f'rating_{stars}_count')
+            percent = round(count * 100 / self.review_count) if self.review_count else 0
+            histogram.append((stars, count, percent))
+        return histogram
+    
+    def update_pricing(self):
+        """Recompute the stored final_price and discount_percentage"""
+        self.price = self._meta.get_field('price').to_python(self.price)
+        self.discount_price = self._meta.get_field('discount_price').to_python(self.discount_price)
+        self.final_price = self.get_final_price()
+        self.discount_percentage = Decimal(self.get_discount_percentage())
+    
     def save(self, *args, **kwargs):
         if not self.slug:
             import uuid
             self.slug = f"{slugify(self.name)}-{uuid.uuid4().hex[:8]}"
+        self.update_pricing()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'price', 'discount_price'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | set(PRICING_FIELDS)
         super().save(*args, **kwargs)
     
     def __str__(self):
         return self.name
     
+    class Meta:
+        # Listing filters/orderings used by home, products_view and
+        # brand_products_view. is_active=True is rendered as a bare boolean
+        # predicate, so it lives in the index condition rather than the key.
+        indexes = [
+            models.Index(fields=['created_at', 'id'], condition=models.Q(is_active=True),
+                         name='product_active_created_idx'),
+            models.Index(fields=['category', 'created_at', 'id'], condition=models.Q(is_active=True),
+                         name='product_active_cat_idx'),
+            models.Index(fields=['brand', 'created_at', 'id'], condition=models.Q(is_active=True),
+                         name='product_active_brand_idx'),
+            models.Index(fields=['final_price', 'id'], condition=models.Q(is_active=True),
+                         name='product_active_final_price_idx'),
+            models.Index(fields=['discount_percentage', 'id'], condition=models.Q(is_active=True),
+                         name='product_active_discount_idx'),
+            models.Index(fields=['average_rating', 'id'], condition=models.Q(is_active=True),
+                         name='product_active_rating_idx'),
+        ]
 
 
-class ProductImage(models.Model):
+class ProductImage(MaintainedFieldsMixin, models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='images')
-    image = models.ImageField(upload_to='products/gallery/')
+    image = models.ImageField(upload_to='products/gallery/', storage=product_image_storage)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     is_default = models.BooleanField(default=False)
     
+    # Written by the media queue (see media_queue.py)
+    maintained_fields = ('image_variants',)
+    
     def __str__(self):
         return f"Image for {self.product.name}"
 
@@ -116,6 +279,10 @@ class Review(models.Model):
     
     class Meta:
         unique_together = ['product', 'user']
+        indexes = [
+            # Newest-first review pages of one product (see product_reviews)
+            models.Index(fields=['product', 'created_at', 'id'], name='review_product_created_idx'),
+        ]
     
     def __str__(self):
         return f"Review by {self.user.username} for {self.product.name}"
@@ -141,7 +308,7 @@ class Cart(models.Model):
         unique_together = ['user', 'product']
     
     def get_total_price(self):
-        return self.product.get_final_price() * self.quantity
+        return self.product.final_price * self.quantity
     
     def __str__(self):
         return f"{self.user.username}'s cart - {self.product.name}"
@@ -182,6 +349,11 @@ class Order(models.Model):
     
     def __str__(self):
         return self.order_number
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'status', 'created_at'], name='order_user_status_idx'),
+        ]
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
@@ -197,7 +369,7 @@ class OrderItem(models.Model):
 
 class MpesaTransaction(models.Model):
     order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name='mpesa_transaction')
-    checkout_request_id = models.CharField(max_length=100)
+    checkout_request_id = models.CharField(max_length=100, db_index=True)
     merchant_request_id = models.CharField(max_length=100)
     phone_number = models.CharField(max_length=15)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
@@ -208,4 +380,122 @@ class MpesaTransaction(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
-        return f"MPesa Transaction for {self.order.order_number}"
\ No newline at end of file
+        return f"MPesa Transaction for {self.order.order_number}"
+
+class ProductRecommendation(models.Model):
+    """One of a product's top co-purchased neighbours (see recommendations.py)"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='recommendations')
+    recommended = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='recommended_by')
+    score = models.FloatField()
+    co_purchases = models.PositiveIntegerField()
+    
+    class Meta:
+        unique_together = ['product', 'recommended']
+    
+    def __str__(self):
+        return f"{self.product_id} -> {self.recommended_id} ({self.score:.3f})"
+
+class RecommendationBuild(models.Model):
+    """A recommendations run; the latest one's last_order_id is the incremental watermark"""
+    last_order_id = models.BigIntegerField(default=0)
+    full = models.BooleanField(default=False)
+    products_updated = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"Recommendations up to order {self.last_order_id}"
+
+class SearchTerm(models.Model):
+    """A word from the catalog's product, brand and category names (see fuzzy.py)"""
+    term = models.CharField(max_length=64, unique=True)
+    frequency = models.PositiveIntegerField(default=1)
+    trigram_count = models.PositiveSmallIntegerField()
+    
+    def __str__(self):
+        return self.term
+
+class SearchTrigram(models.Model):
+    """Posting list row: one trigram of one SearchTerm"""
+    trigram = models.CharField(max_length=3)
+    term = models.ForeignKey(SearchTerm, on_delete=models.CASCADE, related_name='trigrams')
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['trigram', 'term'], name='search_trigram_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.trigram} -> {self.term_id}"
+
+class SearchQueryLog(models.Model):
+    """One search request, written in batches by search_log.py"""
+    query = models.CharField(max_length=200)
+    normalized_query = models.CharField(max_length=200)
+    hits = models.PositiveIntegerField()
+    latency_ms = models.FloatField()
+    corrected_to = models.CharField(max_length=200, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='search_log_created_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.query} ({self.hits} hits)"
+
+class MediaJob(models.Model):
+    """An uploaded image waiting for its derivatives (see media_queue.py)"""
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+    
+    # app_label.model_name of the row holding the image, e.g. fashionnova_app.product
+    model = models.CharField(max_length=100)
+    object_id = models.BigIntegerField()
+    source = models.CharField(max_length=255)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id'], name='media_job_status_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.source} ({self.status})"
+
+class MediaBlob(models.Model):
+    """One stored upload in the content-addressed media store (see storage.py)"""
+    name = models.CharField(max_length=255, unique=True)
+    sha256 = models.CharField(max_length=64, db_index=True)
+    size = models.BigIntegerField()
+    # Number of saves still pointing at this blob; the file goes at zero
+    references = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.name} ({self.references} refs)"
+
+class ProductEvent(models.Model):
+    """A price drop or restock waiting to be sent to wishlists (see notifications.py)"""
+    KIND_CHOICES = (
+        ('price_drop', 'Price drop'),
+        ('back_in_stock', 'Back in stock'),
+    )
+    
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='events')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    # final_price before and after a drop; unset for restocks
+    old_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    new_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.product_id} {self.kind}"
@@ -0,0 +1,212 @@
+# fashionnova_app/notifications.py
+import abc
+import json
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.urls import reverse
+from django.utils.module_loading import import_string
+
+from .models import Product, ProductEvent, Wishlist
+
+User = get_user_model()
+
+EVENT_BATCH = 500
+# Products whose wishlist rows are read per query
+WISHLIST_CHUNK = 200
+DIGEST_MAX_ITEMS = 20
+DEFAULT_NOTIFIER = 'fashionnova_app.notifications.ConsoleNotifier'
+
+
+def product_events(product_id, old_price, new_price, old_stock, new_stock):
+    """Unsaved outbox rows for one product's price drop or restock"""
+    events = []
+    if old_price is not None and new_price < old_price:
+        events.append(ProductEvent(product_id=product_id, kind='price_drop', old_price=old_price, new_price=new_price))
+    if old_stock is not None and old_stock <= 0 < new_stock:
+        events.append(ProductEvent(product_id=product_id, kind='back_in_stock'))
+    return events
+
+
+def record_product_changes(product, old_price, old_stock):
+    """Add outbox rows for a saved product's price drop or restock.
+
+    Runs in the seller's save; it is one INSERT, and only when something
+    changed that shoppers are told about. Matching them against wishlists
+    is left to the worker (send_pending_digests).
+    """
+    events = product_events(product.pk, old_price, product.final_price, old_stock, product.stock)
+    if events:
+        ProductEvent.objects.bulk_create(events)
+    return events
+
+
+def record_bulk_changes(loaded):
+    """Add outbox rows for products written by a queryset update or bulk_update.
+
+    loaded is {id: (final_price, stock)} as read just before the write
+    (see ProductQuerySet); the rows are read again to compare.
+    """
+    events = []
+    ids = list(loaded)
+    for start in range(0, len(ids), EVENT_BATCH):
+        rows = Product.objects.filter(id__in=ids[start:start + EVENT_BATCH]).values_list('id', 'final_price', 'stock')
+        for product_id, final_price, stock in rows:
+            old_price, old_stock = loaded[product_id]
+            events += product_events(product_id, old_price, final_price, old_stock, stock)
+    if events:
+        ProductEvent.objects.bulk_create(events)
+    return events
+
+
+def _changes(events):
+    """{product_id: [change]} still true now, merged over a batch of events.
+
+    A product dropped twice is reported once, from its first old price;
+    a price that went back up, or stock that ran out again, is dropped.
+    """
+    first = {}
+    for event in events:
+        first.setdefault((event.product_id, event.kind), event)
+    products = Product.objects.filter(
+        id__in={product_id for product_id, _ in first}, is_active=True
+    ).only('id', 'name', 'slug', 'final_price', 'stock').in_bulk()
+
+    changes = defaultdict(list)
+    for (product_id, kind), event in first.items():
+        product = products.get(product_id)
+        if product is None:
+            continue
+        change = {'product_id': product_id, 'name': product.name, 'slug': product.slug, 'kind': kind}
+        if kind == 'price_drop' and product.final_price < event.old_price:
+            change.update(old_price=str(event.old_price), new_price=str(product.final_price))
+            changes[product_id].append(change)
+        elif kind == 'back_in_stock' and product.stock > 0:
+            changes[product_id].append(change)
+    return changes
+
+
+def build_digests(events):
+    """One digest per shopper with any changed product on their wishlist.
+
+    Wishlist rows are streamed WISHLIST_CHUNK products at a time, so a
+    popular product saved by thousands of shoppers is never loaded at once.
+    """
+    changes = _changes(events)
+    items = defaultdict(list)
+    product_ids = sorted(changes)
+    for start in range(0, len(product_ids), WISHLIST_CHUNK):
+        rows = Wishlist.objects.filter(
+            product_id__in=product_ids[start:start + WISHLIST_CHUNK]
+        ).values_list('user_id', 'product_id').order_by()
+        for user_id, product_id in rows.iterator(chunk_size=2000):
+            items[user_id].extend(changes[product_id])
+
+    users = User.objects.filter(id__in=items, is_active=True).only('id', 'username', 'email').in_bulk()
+    return [
+        {
+            'user_id': user_id,
+            'username': users[user_id].username,
+            'email': users[user_id].email,
+            'items': user_items[:DIGEST_MAX_ITEMS],
+            'more': max(len(user_items) - DIGEST_MAX_ITEMS, 0),
+        }
+        for user_id, user_items in sorted(items.items()) if user_id in users
+    ]
+
+
+def send_pending_digests(notifier=None, batch_size=EVENT_BATCH):
+    """Drain the outbox through a notifier; returns (events consumed, digests sent).
+
+    Each batch is locked, sent and deleted in one transaction, so a notifier
+    that raises leaves its events queued for the next run, and concurrent
+    workers skip each other's rows where the database has row locks.
+    """
+    notifier = notifier or get_notifier()
+    consumed = sent = 0
+    while True:
+        with transaction.atomic():
+            events = list(ProductEvent.objects.select_for_update(skip_locked=True).order_by('id')[:batch_size])
+            if not events:
+                return consumed, sent
+            sent += notifier.send_digests(build_digests(events))
+            ProductEvent.objects.filter(id__in=[event.id for event in events]).delete()
+        consumed += len(events)
+
+
+def format_digest(digest):
+    lines = [f"Hi {digest['username']}, some items on your wishlist have changed:", '']
+    for item in digest['items']:
+        url = reverse('product_detail', args=[item['slug']])
+        if item['kind'] == 'price_drop':
+            lines.append(f"- {item['name']} is now Ksh {item['new_price']} (was Ksh {item['old_price']}): {url}")
+        else:
+            lines.append(f"- {item['name']} is back in stock: {url}")
+    if digest['more']:
+        lines.append(f"...and {digest['more']} more.")
+    return '\n'.join(lines)
+
+
+class BaseNotifier(abc.ABC):
+    """Delivers wishlist digests; subclasses implement send() and may batch in send_digests()"""
+
+    def send_digests(self, digests):
+        for digest in digests:
+            self.send(digest)
+        return len(digests)
+
+    @abc.abstractmethod
+    def send(self, digest):
+        """Deliver one digest"""
+
+
+class ConsoleNotifier(BaseNotifier):
+    """Writes digests to stdout, for development"""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def send(self, digest):
+        self.stream.write(f"To: {digest['email'] or digest['username']}\n{format_digest(digest)}\n{'-' * 60}\n")
+
+
+class FileNotifier(BaseNotifier):
+    """Appends one JSON line per digest to WISHLIST_NOTIFIER_FILE_PATH"""
+
+    def __init__(self, file_path=None):
+        self.file_path = file_path or settings.WISHLIST_NOTIFIER_FILE_PATH
+
+    def send(self, digest):
+        self.send_digests([digest])
+
+    def send_digests(self, digests):
+        with open(self.file_path, 'a') as handle:
+            for digest in digests:
+                handle.write(json.dumps(digest) + '\n')
+        return len(digests)
+
+
+class EmailNotifier(BaseNotifier):
+    """Emails each digest, over one connection per batch"""
+
+    subject = 'Good news about your FashionNova wishlist'
+
+    def send(self, digest):
+        self.send_digests([digest])
+
+    def send_digests(self, digests):
+        messages = [
+            EmailMessage(self.subject, format_digest(digest), to=[digest['email']])
+            for digest in digests if digest['email']
+        ]
+        return get_connection().send_messages(messages) or 0
+
+
+def get_notifier(backend=None, **kwargs):
+    """An instance of WISHLIST_NOTIFIER_BACKEND, or of backend when given"""
+    backend = backend or getattr(settings, 'WISHLIST_NOTIFIER_BACKEND', DEFAULT_NOTIFIER)
+    return import_string(backend)(**kwargs)
@@ -0,0 +1,163 @@
+# fashionnova_app/pagination.py
+import base64
+import datetime
+import hashlib
+import json
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Q
+
+LISTING_COUNT_TIMEOUT = 300  # seconds a cached listing count is reused
+
+
+def _serialize_value(value):
+    """Turn a sort key value into something JSON can carry without losing precision"""
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def encode_cursor(values, position, reverse=False):
+    """Build an opaque, URL-safe token for a keyset position"""
+    payload = {
+        'v': [_serialize_value(value) for value in values],
+        'o': position,
+        'r': reverse,
+    }
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token, model, ordering):
+    """Decode a cursor token, returning None when it is missing or malformed"""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        payload = json.loads(raw)
+        raw_values = payload['v']
+        if len(raw_values) != len(ordering):
+            return None
+        values = [
+            model._meta.get_field(field.lstrip('-')).to_python(value)
+            for field, value in zip(ordering, raw_values)
+        ]
+        return {
+            'values': values,
+            'position': max(int(payload.get('o', 0)), 0),
+            'reverse': bool(payload.get('r', False)),
+        }
+    except Exception:
+        return None
+
+
+def keyset_filter(ordering, values, reverse=False):
+    """Q object selecting the rows that come after `values` in `ordering`.
+
+    With reverse=True it selects the rows that come before them instead.
+    """
+    condition = Q()
+    for i, field in enumerate(ordering):
+        name = field.lstrip('-')
+        descending = field.startswith('-') != reverse
+        clause = Q(**{f'{name}__{"lt" if descending else "gt"}': values[i]})
+        for previous_field, previous_value in zip(ordering[:i], values[:i]):
+            clause &= Q(**{previous_field.lstrip('-'): previous_value})
+        condition |= clause
+    return condition
+
+
+def _reverse_ordering(ordering):
+    return [field[1:] if field.startswith('-') else f'-{field}' for field in ordering]
+
+
+def cached_count(queryset, timeout=LISTING_COUNT_TIMEOUT):
+    """Exact row count for a listing, cached per query so deep pages never re-count.
+
+    It can lag behind writes by up to timeout seconds.
+    """
+    sql, params = queryset.order_by().query.sql_with_params()
+    key = 'listing_count:' + hashlib.md5(f'{sql}|{params}'.encode()).hexdigest()
+    count = cache.get(key)
+    if count is None:
+        count = queryset.order_by().count()
+        cache.set(key, count, timeout)
+    return count
+
+
+class CursorPage:
+    """One page of a keyset-paginated listing"""
+
+    def __init__(self, object_list, ordering, position, per_page, has_next, has_previous, count=None):
+        self.object_list = object_list
+        self.per_page = per_page
+        self.ordering = ordering
+        self.position = position
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.count = count
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def start_index(self):
+        return self.position + 1 if self.object_list else 0
+
+    def end_index(self):
+        return self.position + len(self.object_list)
+
+    def _key(self, obj):
+        return [getattr(obj, field.lstrip('-')) for field in self.ordering]
+
+    @property
+    def next_cursor(self):
+        if not self.has_next:
+            return None
+        return encode_cursor(self._key(self.object_list[-1]), self.end_index())
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous:
+            return None
+        position = max(self.position - self.per_page, 0)
+        return encode_cursor(self._key(self.object_list[0]), position, reverse=True)
+
+
+def cursor_paginate(queryset, ordering, cursor=None, per_page=12, with_count=True):
+    """Keyset-paginate `queryset` on `ordering` (which must end in a unique field).
+
+    Each page is a single indexed range scan of per_page + 1 rows, no matter how
+    deep it is. The total is a cached count (see cached_count); it is skipped,
+    leaving page.count None, when with_count is False.
+    """
+    ordering = list(ordering)
+    state = decode_cursor(cursor, queryset.model, ordering)
+    count = cached_count(queryset) if with_count else None
+
+    if state is None:
+        rows = list(queryset.order_by(*ordering)[:per_page + 1])
+        return CursorPage(rows[:per_page], ordering, 0, per_page, len(rows) > per_page, False, count)
+
+    reverse = state['reverse']
+    filtered = queryset.filter(keyset_filter(ordering, state['values'], reverse=reverse))
+    if reverse:
+        rows = list(filtered.order_by(*_reverse_ordering(ordering))[:per_page + 1])
+        has_previous = len(rows) > per_page
+        rows = rows[:per_page][::-1]
+        position = state['position'] if has_previous else 0
+        return CursorPage(rows, ordering, position, per_page, True, has_previous, count)
+
+    rows = list(filtered.order_by(*ordering)[:per_page + 1])
+    return CursorPage(rows[:per_page], ordering, state['position'], per_page, len(rows) > per_page, True, count)
@@ -0,0 +1,107 @@
+# fashionnova_app/ratings.py
+from django.db import transaction
+from django.db.models import Count, F, FloatField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce, Now, NullIf
+
+from users.models import SellerProfile
+from .models import Brand, Product, Review
+
+RATING_STARS = range(1, 6)
+
+
+def average_expression(total, count):
+    """SQL average of a rating total over a review count, 0 when there are none"""
+    return Coalesce(Cast(total, FloatField()) / NullIf(count, Value(0)), Value(0.0))
+
+
+def _shift(queryset, average_field, count_delta, total_delta, **extra):
+    count = F('review_count') + count_delta
+    total = F('rating_total') + total_delta
+    queryset.update(
+        review_count=count,
+        rating_total=total,
+        **{average_field: average_expression(total, count)},
+        **extra,
+    )
+
+
+def star_field(rating):
+    """Product column holding the number of reviews with this many stars"""
+    return f'rating_{rating}_count'
+
+
+def apply_review_delta(product_id, count_delta, total_delta, star_deltas=None):
+    """Shift the stored rating aggregates of a product, its brand and its seller.
+
+    star_deltas maps a star rating to the change in its histogram count. The
+    product's updated_at is touched on every review write, even a comment edit
+    with no delta, since cached product pages are keyed on it.
+    """
+    if not product_id:
+        return
+    histogram = {
+        star_field(rating): F(star_field(rating)) + delta
+        for rating, delta in (star_deltas or {}).items() if delta and rating in RATING_STARS
+    }
+    with transaction.atomic():
+        if not count_delta and not total_delta:
+            Product.objects.filter(id=product_id).update(updated_at=Now(), **histogram)
+            return
+        _shift(Product.objects.filter(id=product_id), 'average_rating', count_delta, total_delta,
+               updated_at=Now(), **histogram)
+        _shift(Brand.objects.filter(products__id=product_id), 'average_rating', count_delta, total_delta)
+        _shift(SellerProfile.objects.filter(products__id=product_id), 'rating', count_delta, total_delta)
+
+
+def move_product_ratings(product, old_brand_id, old_seller_id):
+    """Carry a saved product's rating totals from its old brand or seller to the new one"""
+    moves = [
+        (model, average_field, old_id, new_id)
+        for model, average_field, old_id, new_id in ((Brand, 'average_rating', old_brand_id, product.brand_id),
+                                                     (SellerProfile, 'rating', old_seller_id, product.seller_id))
+        if old_id != new_id
+    ]
+    if not moves:
+        return
+    with transaction.atomic():
+        # The stored totals, since the instance's may predate its latest reviews
+        count, total = Product.objects.filter(pk=product.pk).values_list('review_count', 'rating_total').get()
+        if not count and not total:
+            return
+        for model, average_field, old_id, new_id in moves:
+            if old_id:
+                _shift(model.objects.filter(id=old_id), average_field, -count, -total)
+            if new_id:
+                _shift(model.objects.filter(id=new_id), average_field, count, total)
+
+
+def rebuild_ratings():
+    """Recompute every stored rating aggregate from the Review table"""
+    reviews = Review.objects.filter(product=OuterRef('pk')).order_by().values('product')
+    with transaction.atomic():
+        Product.objects.update(
+            review_count=Coalesce(Subquery(reviews.annotate(count=Count('id')).values('count')), 0),
+            rating_total=Coalesce(Subquery(reviews.annotate(total=Sum('rating')).values('total')), 0),
+            **{
+                star_field(rating): Coalesce(Subquery(
+                    reviews.annotate(count=Count('id', filter=Q(rating=rating))).values('count')
+                ), 0)
+                for rating in RATING_STARS
+            },
+        )
+        Product.objects.update(average_rating=average_expression(F('rating_total'), F('review_count')))
+
+        for model, average_field, foreign_key in ((Brand, 'average_rating', 'brand'),
+                                                  (SellerProfile, 'rating', 'seller')):
+            products = Product.objects.filter(**{foreign_key: OuterRef('pk')}).order_by().values(foreign_key)
+            model.objects.update(
+                review_count=Coalesce(
+                    Subquery(products.annotate(count=Sum('review_count')).values('count')), 0
+                ),
+                rating_total=Coalesce(
+                    Subquery(products.annotate(total=Sum('rating_total')).values('total')), 0
+                ),
+            )
+            model.objects.update(
+                **{average_field: average_expression(F('rating_total'), F('review_count'))}
+            )
@@ -0,0 +1,159 @@
+# fashionnova_app/recommendations.py
+import heapq
+import math
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+
+from .models import Order, OrderItem, Product, ProductRecommendation, RecommendationBuild
+
+NEIGHBOURS_PER_PRODUCT = 8
+# Very large orders (bulk buys) say little about taste and cost O(n^2) pairs
+MAX_BASKET_SIZE = 50
+EXCLUDED_STATUSES = ('cancelled', 'refunded')
+# Orders younger than this may still be getting their items written
+SETTLE_DELAY = timedelta(minutes=1)
+
+
+def _baskets(**filters):
+    """order id -> set of product ids, for the orders matching filters"""
+    rows = OrderItem.objects.filter(**filters).exclude(
+        order__status__in=EXCLUDED_STATUSES
+    ).values_list('order_id', 'product_id').order_by().iterator()
+    baskets = defaultdict(set)
+    for order_id, product_id in rows:
+        baskets[order_id].add(product_id)
+    return baskets
+
+
+def co_purchase_counts(baskets):
+    """Sparse item-item matrix: counts[a][b] is the number of orders holding both.
+
+    This is X^T X for the order-by-product incidence matrix X, accumulated one
+    basket (row of X) at a time so only non-zero cells are ever stored.
+    """
+    counts = defaultdict(Counter)
+    for products in baskets.values():
+        if len(products) < 2 or len(products) > MAX_BASKET_SIZE:
+            continue
+        for product_id in products:
+            row = counts[product_id]
+            row.update(products)
+            row[product_id] -= 1
+            if not row[product_id]:
+                del row[product_id]
+    return counts
+
+
+def order_frequencies(baskets):
+    """product id -> number of orders it appears in (the diagonal of X^T X)"""
+    frequencies = Counter()
+    for products in baskets.values():
+        frequencies.update(products)
+    return frequencies
+
+
+def top_neighbours(counts, frequencies, product_ids, limit=NEIGHBOURS_PER_PRODUCT):
+    """Recommendation rows for product_ids, scored by cosine similarity.
+
+    Dividing by sqrt(n_a * n_b) keeps best sellers from topping every list.
+    """
+    recommendations = []
+    for product_id in product_ids:
+        row = counts.get(product_id)
+        if not row:
+            continue
+        scored = heapq.nlargest(limit, (
+            (together / math.sqrt(frequencies[product_id] * frequencies[other]), together, other)
+            for other, together in row.items()
+        ))
+        recommendations.extend(
+            ProductRecommendation(
+                product_id=product_id, recommended_id=other, score=round(score, 6), co_purchases=together,
+            )
+            for score, together, other in scored
+        )
+    return recommendations
+
+
+def build_recommendations(full=False):
+    """Fold orders placed since the last run into the stored neighbour lists.
+
+    An incremental run re-scores only the products bought in new orders,
+    reading the full order history of just those products. Their neighbours'
+    own lists pick up the change on the next full run. Returns the number of
+    products whose lists were rewritten.
+    """
+    previous = RecommendationBuild.objects.order_by('-id').first()
+    settled = Order.objects.filter(created_at__lte=timezone.now() - SETTLE_DELAY)
+    last_order_id = settled.aggregate(last=Max('id'))['last'] or 0
+    full = full or previous is None
+
+    if full:
+        baskets = _baskets(order_id__lte=last_order_id)
+        counts = co_purchase_counts(baskets)
+        frequencies = order_frequencies(baskets)
+        affected = set(counts)
+    else:
+        affected = set(OrderItem.objects.filter(
+            order_id__gt=previous.last_order_id, order_id__lte=last_order_id
+        ).exclude(order__status__in=EXCLUDED_STATUSES).values_list('product_id', flat=True))
+        if not affected:
+            if last_order_id > previous.last_order_id:
+                RecommendationBuild.objects.create(last_order_id=last_order_id)
+            return 0
+        baskets = _baskets(
+            order_id__in=OrderItem.objects.filter(product_id__in=affected).values('order_id'),
+            order_id__lte=last_order_id,
+        )
+        counts = co_purchase_counts(baskets)
+        frequencies = order_frequencies(baskets)
+        # Neighbours also appear in orders without any affected product
+        neighbours = {other for product_id in affected for other in counts.get(product_id, ())} - affected
+        if neighbours:
+            for product_id, orders in OrderItem.objects.filter(
+                product_id__in=neighbours, order_id__lte=last_order_id
+            ).exclude(order__status__in=EXCLUDED_STATUSES).values('product_id').annotate(
+                orders=Count('order_id', distinct=True)
+            ).values_list('product_id', 'orders').order_by():
+                frequencies[product_id] = orders
+
+    rows = top_neighbours(counts, frequencies, affected)
+    with transaction.atomic():
+        if full:
+            ProductRecommendation.objects.all().delete()
+        else:
+            ProductRecommendation.objects.filter(product_id__in=affected).delete()
+        ProductRecommendation.objects.bulk_create(rows, batch_size=1000)
+        RecommendationBuild.objects.create(
+            last_order_id=last_order_id, full=full, products_updated=len(affected),
+        )
+    return len(affected)
+
+
+def recommended_products(product_ids, limit=4, exclude_ids=()):
+    """Active products most often bought with any of product_ids, best first"""
+    product_ids = list(product_ids)
+    if not product_ids:
+        return []
+    return list(
+        Product.objects.filter(
+            is_active=True, recommended_by__product_id__in=product_ids
+        ).exclude(
+            id__in=set(product_ids) | set(exclude_ids)
+        ).annotate(
+            recommendation_score=Sum('recommended_by__score')
+        ).select_related('category', 'brand').order_by('-recommendation_score', '-id')[:limit]
+    )
+
+
+def with_fallback(recommendations, fallback, limit):
+    """Top up a recommendation list from a fallback queryset, skipping repeats"""
+    if len(recommendations) >= limit:
+        return recommendations
+    seen = {product.id for product in recommendations}
+    extra = fallback.exclude(id__in=seen)[:limit - len(recommendations)]
+    return recommendations + list(extra)
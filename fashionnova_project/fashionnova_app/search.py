@@ -0,0 +1,353 @@
+# fashionnova_app/search.py
+import hashlib
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.cache import cache
+from django.db import connection, connections, transaction
+from django.db.models import Q
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Brand, Category, Product
+
+SEARCH_TABLE = 'fashionnova_app_product_search'
+INDEX_BATCH_SIZE = 500
+
+SEARCH_CACHE_TIMEOUT = 300  # seconds
+SEARCH_VERSION_KEY = 'search:version'
+# Ranked rows kept per cached query; deeper pages are always queried live
+CACHED_RESULTS = 48
+
+# Private-use characters wrap matched terms in highlights, so the text can be
+# escaped before they are turned into <mark> tags
+HIGHLIGHT_START = '\ue000'
+HIGHLIGHT_END = '\ue001'
+
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def parse_terms(query):
+    """Lowercased word terms of a free-text query; anything else is dropped"""
+    return TERM_RE.findall((query or '').lower())[:10]
+
+
+def highlight_html(text):
+    """Escape highlighted text and turn the match markers into <mark> tags"""
+    if not text:
+        return ''
+    return mark_safe(
+        escape(text).replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_END, '</mark>')
+    )
+
+
+def get_search_version():
+    version = cache.get(SEARCH_VERSION_KEY)
+    if version is None:
+        cache.add(SEARCH_VERSION_KEY, int(time.time() * 1000), None)
+        version = cache.get(SEARCH_VERSION_KEY)
+    return version
+
+
+def invalidate_search_cache():
+    """Drop every cached search result; called whenever the index changes"""
+    try:
+        cache.incr(SEARCH_VERSION_KEY)
+    except ValueError:
+        cache.set(SEARCH_VERSION_KEY, int(time.time() * 1000), None)
+
+
+def cacheable():
+    """Results read inside a transaction may see uncommitted index writes"""
+    return not connection.in_atomic_block
+
+
+def search_cache_key(prefix, terms):
+    """Cache key for a normalized query under the current index version"""
+    digest = hashlib.md5(' '.join(terms).encode()).hexdigest()
+    return f'search:{prefix}:{get_search_version()}:{digest}'
+
+
+def _chunks(ids, size):
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def _placeholders(values):
+    return ', '.join(['%s'] * len(values))
+
+
+def _tables():
+    return {
+        'index': SEARCH_TABLE,
+        'product': Product._meta.db_table,
+        'brand': Brand._meta.db_table,
+        'category': Category._meta.db_table,
+    }
+
+
+class SQLiteSearchBackend:
+    """FTS5 table keyed by product id, ranked with bm25()"""
+
+    supports_parallel = False
+    # bm25() column weights for name, brand, category, description
+    weights = (10.0, 4.0, 4.0, 1.0)
+
+    def index(self, cursor, ids):
+        tables = _tables()
+        cursor.execute(
+            f'DELETE FROM {tables["index"]} WHERE rowid IN ({_placeholders(ids)})', ids
+        )
+        cursor.execute(
+            f'INSERT INTO {tables["index"]} (rowid, name, brand, category, description) '
+            f'SELECT p.id, p.name, COALESCE(b.name, \'\'), COALESCE(c.name, \'\'), p.description '
+            f'FROM {tables["product"]} p '
+            f'LEFT JOIN {tables["brand"]} b ON b.id = p.brand_id '
+            f'LEFT JOIN {tables["category"]} c ON c.id = p.category_id '
+            f'WHERE p.is_active AND p.id IN ({_placeholders(ids)})',
+            ids,
+        )
+
+    def clear(self, cursor):
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+
+    def optimize(self, cursor):
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')")
+
+    def match(self, terms):
+        # Every term must match, each as a prefix of an indexed (stemmed) token
+        return ' '.join(f'"{term}"*' for term in terms)
+
+    def count(self, cursor, terms):
+        cursor.execute(f'SELECT COUNT(*) FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s', [self.match(terms)])
+        return cursor.fetchone()[0]
+
+    def search(self, cursor, terms, offset, limit):
+        weights = ', '.join(str(weight) for weight in self.weights)
+        cursor.execute(
+            f'SELECT rowid, bm25({SEARCH_TABLE}, {weights}) AS rank, '
+            f'highlight({SEARCH_TABLE}, 0, %s, %s), '
+            f'snippet({SEARCH_TABLE}, 3, %s, %s, \'…\', 16) '
+            f'FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s '
+            f'ORDER BY rank, rowid DESC LIMIT %s OFFSET %s',
+            [HIGHLIGHT_START, HIGHLIGHT_END, HIGHLIGHT_START, HIGHLIGHT_END,
+             self.match(terms), limit, offset],
+        )
+        return [(row[0], -row[1], row[2], row[3]) for row in cursor.fetchall()]
+
+
+class PostgresSearchBackend:
+    """Weighted tsvector table with a GIN index, ranked with ts_rank_cd()"""
+
+    supports_parallel = True
+    config = 'english'
+    headline_options = (
+        f'StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_END}, '
+        'MaxWords=24, MinWords=10, ShortWord=2, HighlightAll=FALSE'
+    )
+
+    def index(self, cursor, ids):
+        tables = _tables()
+        cursor.execute(f'DELETE FROM {tables["index"]} WHERE product_id = ANY(%s)', [list(ids)])
+        cursor.execute(
+            f'INSERT INTO {tables["index"]} (product_id, document) '
+            f'SELECT p.id, '
+            f'setweight(to_tsvector(%s, COALESCE(p.name, \'\')), \'A\') || '
+            f'setweight(to_tsvector(%s, COALESCE(b.name, \'\') || \' \' || COALESCE(c.name, \'\')), \'B\') || '
+            f'setweight(to_tsvector(%s, COALESCE(p.description, \'\')), \'C\') '
+            f'FROM {tables["product"]} p '
+            f'LEFT JOIN {tables["brand"]} b ON b.id = p.brand_id '
+            f'LEFT JOIN {tables["category"]} c ON c.id = p.category_id '
+            f'WHERE p.is_active AND p.id = ANY(%s)',
+            [self.config, self.config, self.config, list(ids)],
+        )
+
+    def clear(self, cursor):
+        cursor.execute(f'TRUNCATE {SEARCH_TABLE}')
+
+    def optimize(self, cursor):
+        cursor.execute(f'ANALYZE {SEARCH_TABLE}')
+
+    def match(self, terms):
+        return ' & '.join(f'{term}:*' for term in terms)
+
+    def count(self, cursor, terms):
+        cursor.execute(
+            f'SELECT COUNT(*) FROM {SEARCH_TABLE} WHERE document @@ to_tsquery(%s, %s)',
+            [self.config, self.match(terms)],
+        )
+        return cursor.fetchone()[0]
+
+    def search(self, cursor, terms, offset, limit):
+        tables = _tables()
+        cursor.execute(
+            f'SELECT s.product_id, ts_rank_cd(s.document, q, 32) AS rank, '
+            f'ts_headline(%s, p.name, q, %s), ts_headline(%s, p.description, q, %s) '
+            f'FROM {tables["index"]} s JOIN {tables["product"]} p ON p.id = s.product_id, '
+            f'to_tsquery(%s, %s) q '
+            f'WHERE s.document @@ q ORDER BY rank DESC, s.product_id DESC LIMIT %s OFFSET %s',
+            [self.config, self.headline_options, self.config, self.headline_options,
+             self.config, self.match(terms), limit, offset],
+        )
+        return cursor.fetchall()
+
+
+BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def get_backend(using=None):
+    """The full-text backend for a database, or None if its vendor has none"""
+    backend_class = BACKENDS.get((connections[using] if using else connection).vendor)
+    return backend_class() if backend_class else None
+
+
+def index_products(ids):
+    """(Re)index products by id; inactive or deleted ones drop out of the index"""
+    backend = get_backend()
+    ids = list(ids)
+    if backend is None or not ids:
+        return
+    with connection.cursor() as cursor:
+        for batch in _chunks(ids, INDEX_BATCH_SIZE):
+            backend.index(cursor, batch)
+    transaction.on_commit(invalidate_search_cache)
+
+
+def _index_batch(batch):
+    # Runs on a worker thread, which gets (and must close) its own connection
+    try:
+        index_products(batch)
+    finally:
+        connection.close()
+    return len(batch)
+
+
+def rebuild_index(batch_size=INDEX_BATCH_SIZE, workers=1, progress=None):
+    """Rebuild the whole search index from the active catalog; returns the count"""
+    backend = get_backend()
+    if backend is None:
+        return 0
+    ids = list(Product.objects.filter(is_active=True).order_by('id').values_list('id', flat=True))
+    batches = list(_chunks(ids, batch_size))
+
+    def report(indexed):
+        if progress:
+            progress(indexed, len(ids))
+
+    indexed = 0
+    if workers > 1 and backend.supports_parallel:
+        # Each worker thread writes its batches over its own connection
+        with connection.cursor() as cursor:
+            backend.clear(cursor)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for done in executor.map(_index_batch, batches):
+                indexed += done
+                report(indexed)
+    else:
+        # A single writer swaps the index contents in one transaction
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                backend.clear(cursor)
+            for batch in batches:
+                index_products(batch)
+                indexed += len(batch)
+                report(indexed)
+
+    with connection.cursor() as cursor:
+        backend.optimize(cursor)
+    transaction.on_commit(invalidate_search_cache)
+    return indexed
+
+
+class SearchResults:
+    """Lazy, sliceable ranked results for a query, usable with Paginator.
+
+    The total and the leading CACHED_RESULTS rows of each normalized query are
+    cached until the index next changes, so popular queries cost no search.
+    """
+
+    def __init__(self, query):
+        self.query = query
+        self.terms = parse_terms(query)
+        self.backend = get_backend()
+        self._cached = None
+
+    def _live_count(self):
+        if self.backend is None:
+            return self._fallback().count()
+        with connection.cursor() as cursor:
+            return self.backend.count(cursor, self.terms)
+
+    def _live_rows(self, offset, limit):
+        # (product id, rank, highlighted name, snippet) in rank order
+        if self.backend is None:
+            ids = self._fallback().values_list('id', flat=True)[offset:offset + limit]
+            return [(product_id, None, '', '') for product_id in ids]
+        with connection.cursor() as cursor:
+            return [tuple(row) for row in self.backend.search(cursor, self.terms, offset, limit)]
+
+    def cached_entry(self):
+        if self._cached is None:
+            key = search_cache_key('results', self.terms)
+            entry = cache.get(key)
+            if entry is None:
+                entry = {'total': self._live_count(), 'rows': self._live_rows(0, CACHED_RESULTS)}
+                if cacheable():
+                    cache.set(key, entry, SEARCH_CACHE_TIMEOUT)
+            self._cached = entry
+        return self._cached
+
+    def count(self):
+        if not self.terms:
+            return 0
+        return self.cached_entry()['total']
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            raise TypeError('SearchResults only supports slicing')
+        offset = key.start or 0
+        limit = (key.stop if key.stop is not None else self.count()) - offset
+        if not self.terms or limit <= 0:
+            return []
+        if offset + limit <= CACHED_RESULTS:
+            rows = self.cached_entry()['rows'][offset:offset + limit]
+        else:
+            rows = self._live_rows(offset, limit)
+
+        products = Product.objects.select_related('category', 'brand').in_bulk(
+            [row[0] for row in rows]
+        )
+        results = []
+        for product_id, rank, name_highlight, snippet in rows:
+            product = products.get(product_id)
+            if product is None:
+                continue
+            product.search_rank = rank
+            product.highlighted_name = highlight_html(name_highlight)
+            product.snippet = highlight_html(snippet)
+            results.append(product)
+        return results
+
+    def _fallback(self):
+        # Databases without a full-text backend get an unranked substring match
+        condition = None
+        for term in self.terms:
+            term_condition = (
+                Q(name__icontains=term) | Q(description__icontains=term) |
+                Q(category__name__icontains=term) | Q(brand__name__icontains=term)
+            )
+            condition = term_condition if condition is None else condition & term_condition
+        return Product.objects.filter(condition, is_active=True).select_related(
+            'category', 'brand'
+        ).order_by('-created_at', '-id')
+
+
+def search_products(query):
+    return SearchResults(query)
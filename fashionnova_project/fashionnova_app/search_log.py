@@ -0,0 +1,73 @@
+# fashionnova_app/search_log.py
+import atexit
+import logging
+import threading
+import time
+
+from django.db import DatabaseError
+from django.utils import timezone
+
+from .models import SearchQueryLog
+
+logger = logging.getLogger(__name__)
+
+# The buffer is written out when it holds this many entries or its oldest
+# entry is this old, whichever comes first
+FLUSH_SIZE = 50
+FLUSH_INTERVAL = 30  # seconds
+# Entries kept if the database is unavailable; older ones are dropped
+MAX_BUFFERED = 5000
+
+_buffer = []
+_lock = threading.Lock()
+_oldest = None
+
+
+def log_search(query, normalized_query, hits, latency_ms, corrected_to=''):
+    """Queue one search for the analytics log; written in batches, never per request"""
+    global _oldest
+    entry = SearchQueryLog(
+        query=query[:200],
+        normalized_query=normalized_query[:200],
+        hits=hits,
+        latency_ms=round(latency_ms, 2),
+        corrected_to=(corrected_to or '')[:200],
+        created_at=timezone.now(),
+    )
+    with _lock:
+        _buffer.append(entry)
+        if _oldest is None:
+            _oldest = time.monotonic()
+        due = len(_buffer) >= FLUSH_SIZE or time.monotonic() - _oldest >= FLUSH_INTERVAL
+    if due:
+        flush_search_log()
+
+
+def flush_search_log():
+    """Write every buffered entry in one bulk insert; returns how many were written"""
+    global _oldest
+    with _lock:
+        entries = _buffer[:]
+        _buffer.clear()
+        _oldest = None
+    if not entries:
+        return 0
+    try:
+        SearchQueryLog.objects.bulk_create(entries, batch_size=500)
+    except DatabaseError:
+        logger.exception('Could not write %d search log entries', len(entries))
+        with _lock:
+            # Put them back for the next flush, keeping the newest
+            _buffer[:0] = entries
+            del _buffer[:-MAX_BUFFERED]
+            _oldest = time.monotonic()
+        return 0
+    return len(entries)
+
+
+def pending_entries():
+    with _lock:
+        return len(_buffer)
+
+
+atexit.register(flush_search_log)
@@ -0,0 +1,170 @@
+# fashionnova_app/signals.py
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+
+from .autocomplete import catalog_changed, suggestion_index
+from .cart import invalidate_cart
+from .facets import invalidate_facets
+from .fuzzy import add_terms
+from .media_queue import enqueue_image
+from .notifications import record_product_changes
+from .models import Brand, Cart, Category, Product, ProductImage, Review, Wishlist
+from .ratings import apply_review_delta, move_product_ratings
+from .search import index_products
+from .storage import is_blob
+from .wishlist import invalidate_wishlist
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_changed(sender, instance, signal, **kwargs):
+    """Keep derived catalog data in step with Product rows"""
+    invalidate_facets()
+    index_products([instance.pk])
+    deleted = signal is post_delete
+    if not deleted and instance.is_active:
+        add_terms([instance.name])
+    transaction.on_commit(partial(
+        catalog_changed, partial(suggestion_index.update_product, instance, deleted), [('product', instance.pk)],
+    ))
+
+
+@receiver(post_init, sender=Product)
+def remember_price_and_stock(sender, instance, **kwargs):
+    """Note the loaded price and stock, so a save can tell what changed"""
+    instance._loaded_price = instance.__dict__.get('final_price') if instance.pk else None
+    instance._loaded_stock = instance.__dict__.get('stock') if instance.pk else None
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, created, **kwargs):
+    """Queue price drops and restocks for wishlist digests (notify_wishlists)"""
+    if not created:
+        record_product_changes(instance, instance._loaded_price, instance._loaded_stock)
+    instance._loaded_price = instance.final_price
+    instance._loaded_stock = instance.stock
+
+
+@receiver(post_init, sender=Product)
+def remember_rating_owners(sender, instance, **kwargs):
+    """Note the loaded brand and seller, so a move can carry the product's ratings"""
+    # Fields deferred at load are left out; a save doesn't write them
+    instance._counted_owners = {
+        field: instance.__dict__[field] for field in ('brand_id', 'seller_id') if field in instance.__dict__
+    }
+
+
+@receiver(post_save, sender=Product)
+def product_owners_saved(sender, instance, created, **kwargs):
+    owners = instance._counted_owners
+    if not created:
+        move_product_ratings(
+            instance, owners.get('brand_id', instance.brand_id), owners.get('seller_id', instance.seller_id),
+        )
+    instance._counted_owners = {'brand_id': instance.brand_id, 'seller_id': instance.seller_id}
+
+
+@receiver(post_init, sender=Product)
+@receiver(post_init, sender=ProductImage)
+def remember_stored_image(sender, instance, **kwargs):
+    """Note the stored image name, so a replaced one can release its blob"""
+    image = instance.__dict__.get('image')
+    instance._stored_image = getattr(image, 'name', image) or ''
+
+
+def release_image(storage, name):
+    """Drop one reference to a content-addressed blob once the change commits"""
+    # Legacy names may be shared by several rows, so only blobs are counted
+    if is_blob(name) and getattr(storage, 'content_addressed', False):
+        transaction.on_commit(partial(storage.delete, name))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ProductImage)
+def product_image_saved(sender, instance, update_fields=None, **kwargs):
+    """Queue a new or replaced image for the media worker (process_media)"""
+    if update_fields is not None and 'image' not in update_fields:
+        return
+    if instance._stored_image != (instance.image.name or ''):
+        release_image(instance.image.storage, instance._stored_image)
+        instance._stored_image = instance.image.name or ''
+    enqueue_image(instance)
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=ProductImage)
+def product_image_deleted(sender, instance, **kwargs):
+    release_image(instance.image.storage, instance._stored_image)
+
+
+@receiver(post_save, sender=Brand)
+@receiver(post_save, sender=Category)
+def catalog_label_changed(sender, instance, created, **kwargs):
+    """Brand and category names are indexed with their products"""
+    if not created:
+        index_products(instance.products.values_list('id', flat=True))
+    add_terms([instance.name])
+    kind = 'brand' if sender is Brand else 'category'
+    transaction.on_commit(partial(
+        catalog_changed, partial(suggestion_index.update_label, kind, instance), [(kind, instance.pk)],
+    ))
+
+
+@receiver(pre_delete, sender=Brand)
+@receiver(pre_delete, sender=Category)
+def remember_labelled_products(sender, instance, **kwargs):
+    # Products are detached (SET_NULL) before post_delete, so collect them now
+    instance._indexed_product_ids = list(instance.products.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Brand)
+@receiver(post_delete, sender=Category)
+def catalog_label_deleted(sender, instance, **kwargs):
+    index_products(getattr(instance, '_indexed_product_ids', []))
+    kind = 'brand' if sender is Brand else 'category'
+    transaction.on_commit(partial(
+        catalog_changed, partial(suggestion_index.update_label, kind, instance, deleted=True), [(kind, instance.pk)],
+    ))
+
+
+@receiver(post_init, sender=Review)
+def remember_review_rating(sender, instance, **kwargs):
+    """Note what a loaded review counted for, so edits can apply a delta"""
+    instance._counted_product_id = instance.__dict__.get('product_id')
+    instance._counted_rating = instance.__dict__.get('rating')
+
+
+@receiver(post_save, sender=Review)
+def review_saved(sender, instance, created, **kwargs):
+    old_rating = instance._counted_rating
+    if created:
+        apply_review_delta(instance.product_id, 1, instance.rating, {instance.rating: 1})
+    elif instance.product_id != instance._counted_product_id:
+        apply_review_delta(instance._counted_product_id, -1, -(old_rating or 0), {old_rating: -1})
+        apply_review_delta(instance.product_id, 1, instance.rating, {instance.rating: 1})
+    else:
+        star_deltas = {} if old_rating == instance.rating else {old_rating: -1, instance.rating: 1}
+        apply_review_delta(instance.product_id, 0, instance.rating - (old_rating or 0), star_deltas)
+    instance._counted_product_id = instance.product_id
+    instance._counted_rating = instance.rating
+
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance, **kwargs):
+    rating = instance._counted_rating
+    apply_review_delta(instance._counted_product_id, -1, -(rating or 0), {rating: -1})
+
+
+@receiver(post_save, sender=Cart)
+@receiver(post_delete, sender=Cart)
+def cart_changed(sender, instance, **kwargs):
+    invalidate_cart(instance.user_id)
+
+
+@receiver(post_save, sender=Wishlist)
+@receiver(post_delete, sender=Wishlist)
+def wishlist_changed(sender, instance, **kwargs):
+    invalidate_wishlist(instance.user_id)
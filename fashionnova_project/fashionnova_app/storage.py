@@ -0,0 +1,100 @@
+# fashionnova_app/storage.py
+import hashlib
+import os
+
+from django.core.files.storage import FileSystemStorage, storages
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .images import DERIVATIVE_ROOT
+
+BLOB_ROOT = 'blobs'
+# STORAGES alias of the content-addressed store
+PRODUCT_IMAGE_STORAGE = 'product_images'
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def file_digest(content):
+    """SHA-256 hex digest and size of a File, read in chunks"""
+    digest = hashlib.sha256()
+    size = 0
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+        size += len(chunk)
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    return digest.hexdigest(), size
+
+
+def blob_name(digest, original_name):
+    """Content-addressed path of an upload; the extension is kept for content types"""
+    extension = os.path.splitext(original_name)[1].lower()
+    return f'{BLOB_ROOT}/{digest[:2]}/{digest[2:4]}/{digest}{extension}'
+
+
+def is_blob(name):
+    return name.startswith(f'{BLOB_ROOT}/')
+
+
+def is_immutable(name):
+    """True for blobs and their derivatives, whose bytes never change under a name"""
+    return is_blob(name) or name.startswith(f'{DERIVATIVE_ROOT}/{BLOB_ROOT}/')
+
+
+def product_image_storage():
+    """Storage of Product.image and ProductImage.image, the fields whose blobs are released"""
+    return storages[PRODUCT_IMAGE_STORAGE]
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Media storage that keeps each distinct upload once, under its SHA-256.
+
+    Saving the same bytes twice returns the same name and adds a reference to
+    its MediaBlob row; delete() drops a reference and only removes the file
+    (and its derivatives) with the last one. Derivatives are written under
+    their blob's path as-is, since they are already content-addressed.
+    """
+    content_addressed = True
+
+    def _save(self, name, content):
+        if name.startswith(f'{DERIVATIVE_ROOT}/'):
+            return super()._save(name, content)
+        digest, size = file_digest(content)
+        name = blob_name(digest, name)
+        if not self.exists(name):
+            # A concurrent writer of the same blob makes this return a suffixed
+            # name, which is still a correct (if duplicate) file
+            name = super()._save(name, content)
+        self.add_references(name, digest, size)
+        return name
+
+    def add_references(self, name, digest, size, count=1):
+        from .models import MediaBlob
+        if MediaBlob.objects.filter(name=name).update(references=F('references') + count):
+            return
+        try:
+            with transaction.atomic():
+                MediaBlob.objects.create(name=name, sha256=digest, size=size, references=count)
+        except IntegrityError:
+            MediaBlob.objects.filter(name=name).update(references=F('references') + count)
+
+    def delete(self, name):
+        if not is_blob(name):
+            return super().delete(name)
+        from .models import MediaBlob
+        with transaction.atomic():
+            MediaBlob.objects.filter(name=name, references__gt=0).update(references=F('references') - 1)
+            if MediaBlob.objects.filter(name=name, references__gt=0).exists():
+                return
+            MediaBlob.objects.filter(name=name).delete()
+        super().delete(name)
+        self.delete_derivatives(name)
+
+    def delete_derivatives(self, name):
+        directory = f'{DERIVATIVE_ROOT}/{os.path.splitext(name)[0]}'
+        if not self.exists(directory):
+            return
+        for file_name in self.listdir(directory)[1]:
+            super().delete(f'{directory}/{file_name}')
@@ -0,0 +1,12 @@
+# fashionnova_app/templatetags/assets.py
+from django import template
+
+from fashionnova_app.assets import vendor_url
+
+register = template.Library()
+
+
+@register.simple_tag
+def vendor_static(name):
+    """URL of a pinned front-end library (see assets.VENDOR_ASSETS)"""
+    return vendor_url(name)
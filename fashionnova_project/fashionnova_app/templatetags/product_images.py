@@ -0,0 +1,58 @@
+# fashionnova_app/templatetags/product_images.py
+from django import template
+from django.forms.utils import flatatt
+from django.templatetags.static import static
+from django.utils.html import format_html
+
+from fashionnova_app.images import display_size, has_current_variants, srcset, variant_url
+from fashionnova_app.media_queue import is_pending
+
+register = template.Library()
+
+PLACEHOLDER_IMAGE = 'fashionnova_app/Images/momj.jpeg'
+
+# Rendered width of each derivative in the layouts that use it
+SIZES = {
+    'thumb': '80px',
+    'card': '(max-width: 576px) 50vw, (max-width: 992px) 33vw, 25vw',
+    'detail': '(max-width: 768px) 100vw, 50vw',
+    'zoom': '100vw',
+}
+
+
+@register.simple_tag
+def product_image(instance, size='card', **attrs):
+    """<picture> for a Product or ProductImage with WebP and JPEG srcsets.
+
+    Extra keyword arguments become <img> attributes. Images load lazily unless
+    loading="eager" is passed (use it for the main image above the fold), and
+    processed ones carry their intrinsic width/height and a blurred inline
+    preview so nothing shifts while they arrive. Missing images and those still
+    queued for processing show the placeholder; older images without
+    derivatives fall back to the original upload.
+    """
+    attrs.setdefault('alt', '')
+    attrs.setdefault('loading', 'lazy')
+    attrs.setdefault('decoding', 'async')
+    if not instance or not instance.image:
+        return format_html('<img src="{}"{}>', static(PLACEHOLDER_IMAGE), flatatt(attrs))
+    if is_pending(instance):
+        return format_html('<img src="{}" data-processing="1"{}>', static(PLACEHOLDER_IMAGE), flatatt(attrs))
+    if not has_current_variants(instance):
+        return format_html('<img src="{}"{}>', instance.image.url, flatatt(attrs))
+
+    sizes = attrs.pop('sizes', SIZES.get(size, SIZES['card']))
+    width, height = display_size(instance, size)
+    if 'width' in attrs and 'height' not in attrs:
+        # Keep the aspect ratio of an explicit display width
+        attrs['height'] = max(round(int(attrs['width']) * height / width), 1)
+    attrs.setdefault('width', width)
+    attrs.setdefault('height', height)
+    preview = f"background: url({instance.image_variants['placeholder']}) center / cover no-repeat"
+    attrs['style'] = f"{attrs['style'].rstrip('; ')}; {preview}" if attrs.get('style') else preview
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}"{}></picture>',
+        srcset(instance, 'webp'), sizes,
+        variant_url(instance, size), srcset(instance, 'jpg'), sizes, flatatt(attrs),
+    )
@@ -1,3 +1,1538 @@
-from django.test import TestCase
+import json
+import os
+import re
+import shutil
+import tempfile
+import unittest
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.db import connection
+from django.db.models import F
+from django.core import mail, signing
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.management import CommandError, call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+
+from users.models import SellerProfile
+from .assets import VENDOR_ASSETS, integrity_of, is_vendored, vendor_url
+from .autocomplete import SUGGEST_CHANGE_KEY, SuggestionIndex, get_suggest_version, invalidate_suggestions, suggest
+from .cart import GUEST_CART_COOKIE, GUEST_CART_SALT, add_item, add_items, cart_summary, get_cart
+from .context_processors import cart_count
+from .facets import facet_counts, get_facet_version, normalize_filters
+from .fuzzy import did_you_mean, rebuild_terms, search_with_suggestions, trigrams
+from .images import DERIVATIVE_ROOT
+from .media_queue import MAX_ATTEMPTS, process_pending_media
+from .notifications import BaseNotifier, EmailNotifier, FileNotifier, get_notifier, send_pending_digests
+from .models import (
+    Brand, Cart, Category, MediaBlob, MediaJob, MpesaTransaction, Order, OrderItem, Product, ProductEvent,
+    ProductRecommendation, Review, SearchQueryLog, SearchTerm, SearchTrigram, Wishlist,
+)
+from .pagination import keyset_filter
+from .ratings import rebuild_ratings
+from .recommendations import build_recommendations, recommended_products
+from .search import get_backend, rebuild_index, search_products
+from .search_log import FLUSH_SIZE, flush_search_log, log_search, pending_entries
+from .storage import BLOB_ROOT, IMMUTABLE_CACHE_CONTROL
+from .templatetags.product_images import PLACEHOLDER_IMAGE
+from .views import REVIEWS_PER_PAGE, serve_media
+from .wishlist import transfer_to_cart, wishlist_cache_key, wishlist_count
+
+User = get_user_model()
+
+# A plan line that reads a whole table without any index
+SQLITE_FULL_SCAN = re.compile(r'\bSCAN (?:TABLE )?"?(\w+)"?\s*$')
+
+
+@unittest.skipUnless(connection.vendor in ('sqlite', 'postgresql'), 'EXPLAIN parsing is vendor specific')
+class HotQueryPlanTests(TestCase):
+    """EXPLAIN every hot catalog/order queryset and fail on a full table scan"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='shopper', password='secret')
+        seller_user = User.objects.create_user(username='seller', password='secret', user_type='seller')
+        seller = SellerProfile.objects.create(user=seller_user, store_name='Plan Store')
+        cls.category = Category.objects.create(name='Dresses')
+        other_category = Category.objects.create(name='Shoes')
+        cls.brand = Brand.objects.create(name='Nova')
+        other_brand = Brand.objects.create(name='Other')
+
+        Product.objects.bulk_create([
+            Product(
+                seller=seller,
+                name=f'Product {i}',
+                slug=f'product-{i}',
+                description='Seeded for query plan tests',
+                price=Decimal(500 + i),
+                discount_price=Decimal(400 + i) if i % 3 == 0 else None,
+                category=cls.category if i % 2 else other_category,
+                brand=cls.brand if i % 4 else other_brand,
+                stock=i % 7,
+                is_active=i % 10 != 0,
+            )
+            for i in range(400)
+        ])
+        cls.pivot = Product.objects.order_by('id')[200]
+
+        orders = Order.objects.bulk_create([
+            Order(
+                user=cls.user,
+                order_number=f'ORD-{i}',
+                status=('pending', 'processing', 'delivered')[i % 3],
+                payment_method='mpesa',
+                subtotal=Decimal('1000'),
+                total=Decimal('1200'),
+                shipping_address='Nairobi',
+                phone='254700000000',
+            )
+            for i in range(60)
+        ])
+        MpesaTransaction.objects.bulk_create([
+            MpesaTransaction(
+                order=order,
+                checkout_request_id=f'ws_CO_{order.id}',
+                merchant_request_id=f'MR-{order.id}',
+                phone_number='254700000000',
+                amount=order.total,
+            )
+            for order in orders
+        ])
+
+    def assertNoFullScan(self, queryset):
+        plan = queryset.explain()
+        for line in plan.splitlines():
+            if connection.vendor == 'postgresql':
+                full_scan = 'Seq Scan' in line
+            else:
+                full_scan = SQLITE_FULL_SCAN.search(line) is not None
+            self.assertFalse(full_scan, f'Full table scan in plan:\n{plan}\n\nfor query:\n{queryset.query}')
+
+    def active_products(self):
+        return Product.objects.filter(is_active=True)
+
+    def test_home_featured_products(self):
+        self.assertNoFullScan(self.active_products().order_by('-created_at')[:8])
+
+    def test_home_discounted_products(self):
+        self.assertNoFullScan(
+            self.active_products().filter(discount_price__isnull=False).order_by('-created_at')[:6]
+        )
+
+    def test_listing_newest_first_page(self):
+        self.assertNoFullScan(self.active_products().order_by('-created_at', '-id')[:13])
+
+    def test_listing_newest_cursor_page(self):
+        ordering = ['-created_at', '-id']
+        after = keyset_filter(ordering, [self.pivot.created_at, self.pivot.id])
+        self.assertNoFullScan(self.active_products().filter(after).order_by(*ordering)[:13])
+
+    def test_listing_by_category(self):
+        self.assertNoFullScan(
+            self.active_products().filter(category=self.category).order_by('-created_at', '-id')[:13]
+        )
+
+    def test_listing_by_brand(self):
+        self.assertNoFullScan(
+            self.active_products().filter(brand=self.brand).order_by('-created_at', '-id')[:13]
+        )
+
+    def test_listing_by_price(self):
+        self.assertNoFullScan(self.active_products().order_by('final_price', 'id')[:13])
+        self.assertNoFullScan(self.active_products().order_by('-final_price', '-id')[:13])
+
+    def test_listing_price_range(self):
+        self.assertNoFullScan(
+            self.active_products().filter(
+                final_price__gte=550, final_price__lte=650
+            ).order_by('final_price', 'id')[:13]
+        )
+
+    def test_listing_biggest_discount(self):
+        self.assertNoFullScan(
+            self.active_products().filter(
+                discount_percentage__gt=0
+            ).order_by('-discount_percentage', '-id')[:13]
+        )
+
+    def test_listing_highest_rated(self):
+        self.assertNoFullScan(self.active_products().order_by('-average_rating', '-id')[:13])
+
+    def test_orders_by_status(self):
+        self.assertNoFullScan(
+            Order.objects.filter(user=self.user, status='pending').order_by('-created_at')
+        )
+
+    def test_product_review_page(self):
+        ordering = ['-created_at', '-id']
+        after = keyset_filter(ordering, [self.pivot.created_at, 1])
+        self.assertNoFullScan(Review.objects.filter(product=self.pivot).filter(after).order_by(*ordering)[:11])
+
+    def test_mpesa_callback_lookup(self):
+        self.assertNoFullScan(MpesaTransaction.objects.filter(checkout_request_id='ws_CO_1'))
+
+
+class FacetCountTests(TestCase):
+    """Sidebar facet counts apply every other filter and go stale with no product write"""
+
+    @classmethod
+    def setUpTestData(cls):
+        seller_user = User.objects.create_user(username='seller', password='secret', user_type='seller')
+        seller = SellerProfile.objects.create(user=seller_user, store_name='Facet Store')
+        cls.dresses = Category.objects.create(name='Dresses')
+        cls.shoes = Category.objects.create(name='Shoes')
+        cls.brand = Brand.objects.create(name='Zara')
+        catalog = [
+            ('Red Dress', cls.dresses, cls.brand, 'F', Decimal('800'), None),
+            ('Blue Dress', cls.dresses, None, 'F', Decimal('3000'), Decimal('2400')),
+            ('Loafers', cls.shoes, cls.brand, 'M', Decimal('6000'), None),
+        ]
+        cls.products = [
+            Product.objects.create(
+                seller=seller, name=name, description='', category=category, brand=brand, gender=gender,
+                price=price, discount_price=discount_price, stock=3,
+            )
+            for name, category, brand, gender, price, discount_price in catalog
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_counts(self):
+        counts = facet_counts(normalize_filters({}))
+        self.assertEqual(counts['total'], 3)
+        self.assertEqual(counts['category'], {self.dresses.id: 2, self.shoes.id: 1})
+        self.assertEqual(counts['brand'], {self.brand.id: 2})
+        self.assertEqual(counts['gender'], {'F': 2, 'M': 1})
+        self.assertEqual(counts['discount'], 1)
+        self.assertEqual([bucket['count'] for bucket in counts['price']], [1, 1, 0, 1, 0])
+
+    def test_filter_changes_the_other_counts(self):
+        counts = facet_counts(normalize_filters({'category': str(self.dresses.id)}))
+        self.assertEqual(counts['total'], 2)
+        # A dimension is counted without its own filter, so other categories stay selectable
+        self.assertEqual(counts['category'], {self.dresses.id: 2, self.shoes.id: 1})
+        self.assertEqual(counts['brand'], {self.brand.id: 1})
+        self.assertEqual(counts['gender'], {'F': 2})
+
+        counts = facet_counts(normalize_filters({'max_price': '2500'}))
+        self.assertEqual(counts['total'], 2)
+        self.assertEqual(counts['category'], {self.dresses.id: 2})
+
+    def test_product_save_refreshes_the_counts(self):
+        filters = normalize_filters({})
+        version = get_facet_version()
+        self.assertEqual(facet_counts(filters)['gender'], {'F': 2, 'M': 1})
+        with self.assertNumQueries(0):
+            facet_counts(filters)
+
+        product = self.products[2]
+        product.gender = 'F'
+        product.save()
+        self.assertNotEqual(get_facet_version(), version)
+        self.assertEqual(facet_counts(filters)['gender'], {'F': 3})
+
+
+class StoredPricingTests(TestCase):
+    """final_price and discount_percentage follow every kind of price write"""
+
+    @classmethod
+    def setUpTestData(cls):
+        seller_user = User.objects.create_user(username='seller', password='secret', user_type='seller')
+        cls.seller = SellerProfile.objects.create(user=seller_user, store_name='Pricing Store')
+
+    def setUp(self):
+        self.product = Product.objects.create(
+            seller=self.seller, name='Wrap Dress', description='', price=Decimal('1000'),
+            discount_price=Decimal('750'), stock=1,
+        )
+        # Back-date the row, so a bump of updated_at is visible
+        self.stale = timezone.now() - timedelta(days=1)
+        Product.objects.filter(pk=self.product.pk).update(updated_at=self.stale)
+
+    def assertPricing(self, final_price, discount_percentage):
+        product = Product.objects.get(pk=self.product.pk)
+        self.assertEqual((product.final_price, product.discount_percentage), (final_price, discount_percentage))
+        self.assertGreater(product.updated_at, self.stale)
+
+    def test_save(self):
+        self.product.discount_price = Decimal('900')
+        self.product.save()
+        self.assertPricing(Decimal('900'), Decimal('10'))
+
+    def test_update_price(self):
+        Product.objects.filter(pk=self.product.pk).update(price=Decimal('1500'))
+        self.assertPricing(Decimal('750'), Decimal('50'))
+
+    def test_update_clearing_the_discount(self):
+        Product.objects.filter(pk=self.product.pk).update(discount_price=None)
+        self.assertPricing(Decimal('1000'), Decimal('0'))
+
+    def test_bulk_update_price(self):
+        self.product.price = Decimal('3000')
+        Product.objects.bulk_update([self.product], ['price'])
+        self.assertPricing(Decimal('750'), Decimal('75'))
+
+
+class RatingAggregateTests(TestCase):
+    """Stored rating aggregates follow Review writes and match a full rebuild"""
+
+    @classmethod
+    def setUpTestData(cls):
+        seller_user = User.objects.create_user(username='seller', password='secret', user_type='seller')
+        cls.seller = SellerProfile.objects.create(user=seller_user, store_name='Rated Store')
+        cls.brand = Brand.objects.create(name='Nova')
+        cls.products = [
+            Product.objects.create(
+                seller=cls.seller, brand=cls.brand, name=f'Product {i}', description='Rated',
+                price=Decimal('1000'), stock=5,
+            )
+            for i in range(2)
+        ]
+        cls.users = [User.objects.create_user(username=f'shopper{i}', password='secret') for i in range(3)]
+
+    def assertAggregates(self, instance, average_field, count, total):
+        instance.refresh_from_db()
+        self.assertEqual(instance.review_count, count)
+        self.assertEqual(instance.rating_total, total)
+        self.assertAlmostEqual(getattr(instance, average_field), total / count if count else 0.0)
+
+    def test_create_edit_move_delete(self):
+        first, second = self.products
+        review = Review.objects.create(product=first, user=self.users[0], rating=5, comment='Great')
+        Review.objects.create(product=first, user=self.users[1], rating=2, comment='Meh')
+        self.assertAggregates(first, 'average_rating', 2, 7)
+
+        review = Review.objects.get(pk=review.pk)
+        review.rating = 4
+        review.save()
+        self.assertAggregates(first, 'average_rating', 2, 6)
+
+        review.product = second
+        review.save()
+        self.assertAggregates(first, 'average_rating', 1, 2)
+        self.assertAggregates(second, 'average_rating', 1, 4)
+        self.assertAggregates(self.brand, 'average_rating', 2, 6)
+        self.assertAggregates(self.seller, 'rating', 2, 6)
+
+        review.delete()
+        self.assertAggregates(second, 'average_rating', 0, 0)
+        self.assertAggregates(self.brand, 'average_rating', 1, 2)
+        self.assertAggregates(self.seller, 'rating', 1, 2)
+
+    def test_stale_save_keeps_aggregates(self):
+        product = Product.objects.get(pk=self.products[0].pk)
+        seller = SellerProfile.objects.get(pk=self.seller.pk)
+        brand = Brand.objects.get(pk=self.brand.pk)
+        # Loaded before the review landed, then saved by an unrelated edit
+        Review.objects.create(product=product, user=self.users[0], rating=4, comment='Nice')
+        product.name = 'Renamed'
+        product.save()
+        seller.store_name = 'Renamed Store'
+        seller.save()
+        brand.description = 'Updated'
+        brand.save()
+        self.assertAggregates(product, 'average_rating', 1, 4)
+        self.assertAggregates(seller, 'rating', 1, 4)
+        self.assertAggregates(brand, 'average_rating', 1, 4)
+        self.assertEqual((product.name, seller.store_name, brand.description), ('Renamed', 'Renamed Store', 'Updated'))
+
+    def test_product_moving_brand_or_seller(self):
+        first, second = self.products
+        Review.objects.create(product=first, user=self.users[0], rating=5, comment='Great')
+        Review.objects.create(product=second, user=self.users[1], rating=2, comment='Meh')
+        other_user = User.objects.create_user(username='other', password='secret', user_type='seller')
+        other_seller = SellerProfile.objects.create(user=other_user, store_name='Other Store')
+        other_brand = Brand.objects.create(name='Other')
+
+        product = Product.objects.get(pk=first.pk)
+        product.brand = other_brand
+        product.seller = other_seller
+        product.save()
+        self.assertAggregates(self.brand, 'average_rating', 1, 2)
+        self.assertAggregates(other_brand, 'average_rating', 1, 5)
+        self.assertAggregates(self.seller, 'rating', 1, 2)
+        self.assertAggregates(other_seller, 'rating', 1, 5)
+
+        product.brand = None
+        product.save()
+        self.assertAggregates(other_brand, 'average_rating', 0, 0)
+        self.assertAggregates(other_seller, 'rating', 1, 5)
+
+    def histogram(self, product):
+        product.refresh_from_db()
+        return [count for stars, count, percent in product.rating_histogram]
+
+    def test_histogram_follows_writes(self):
+        first, second = self.products
+        review = Review.objects.create(product=first, user=self.users[0], rating=5, comment='Great')
+        Review.objects.create(product=first, user=self.users[1], rating=2, comment='Meh')
+        self.assertEqual(self.histogram(first), [1, 0, 0, 1, 0])
+
+        review = Review.objects.get(pk=review.pk)
+        review.rating = 4
+        review.save()
+        self.assertEqual(self.histogram(first), [0, 1, 0, 1, 0])
+
+        review.product = second
+        review.save()
+        self.assertEqual(self.histogram(first), [0, 0, 0, 1, 0])
+        self.assertEqual(self.histogram(second), [0, 1, 0, 0, 0])
+
+        review.delete()
+        self.assertEqual(self.histogram(second), [0, 0, 0, 0, 0])
+
+    def test_stale_save_keeps_histogram(self):
+        product = Product.objects.get(pk=self.products[0].pk)
+        review = Review.objects.create(product=product, user=self.users[0], rating=5, comment='Great')
+        product.stock = 4
+        product.save()
+        review.delete()
+        self.assertEqual(self.histogram(product), [0, 0, 0, 0, 0])
+        self.assertEqual(product.stock, 4)
+
+    def test_rebuild_matches_incremental(self):
+        for i, user in enumerate(self.users):
+            Review.objects.create(product=self.products[i % 2], user=user, rating=i + 3, comment='Ok')
+        Product.objects.update(
+            review_count=0, rating_total=0, average_rating=0, rating_3_count=0, rating_4_count=0, rating_5_count=0,
+        )
+        Brand.objects.update(review_count=0, rating_total=0, average_rating=0)
+
+        rebuild_ratings()
+        self.assertAggregates(self.products[0], 'average_rating', 2, 8)
+        self.assertAggregates(self.products[1], 'average_rating', 1, 4)
+        self.assertAggregates(self.brand, 'average_rating', 3, 12)
+        self.assertAggregates(self.seller, 'rating', 3, 12)
+        self.assertEqual(self.histogram(self.products[0]), [1, 0, 1, 0, 0])
+
+
+@unittest.skipIf(get_backend() is None, 'No full-text backend for this database')
+class SearchIndexTests(TestCase):
+    """The full-text index follows catalog writes and ranks name matches first"""
+
+    @classmethod
+    def setUpTestData(cls):
+        seller_user = User.objects.create_user(username='seller', password='secret', user_type='seller')
+        cls.seller = SellerProfile.objects.create(user=seller_user, store_name='Search Store')
+        cls.brand = Brand.objects.create(name='Nova')
+        cls.dress = cls.create_product('Evening Dress', 'Long <b>silk</b> gown')
+        cls.shoe = cls.create_product('Running Shoe', 'Goes well with a summer dress')
+
+    @classmethod
+    def create_product(cls, name, description):
+        return Product.objects.create(
+            seller=cls.seller, brand=cls.brand, name=name, description=description,
+            price=Decimal('1000'), stock=5,
+        )
+
+    def search_ids(self, query):
+        results = search_products(query)
+        return [product.id for product in results[:results.count()]]
+
+    def test_ranked_prefix_search(self):
+        self.assertEqual(self.search_ids('dresses'), [self.dress.id, self.shoe.id])
+        self.assertEqual(self.search_ids('run'), [self.shoe.id])
+        self.assertEqual(self.search_ids('"; DROP TABLE'), [])
+
+    def test_highlights_are_escaped(self):
+        product = search_products('silk')[:1][0]
+        self.assertIn('<mark>silk</mark>', product.snippet)
+        self.assertIn('&lt;b&gt;', product.snippet)
+
+    def test_index_follows_writes(self):
+        self.brand.name = 'Atelier'
+        self.brand.save()
+        self.assertEqual(len(self.search_ids('atelier')), 2)
+
+        self.dress.is_active = False
+        self.dress.save()
+        self.assertEqual(self.search_ids('evening'), [])
+
+        self.shoe.delete()
+        self.assertEqual(self.search_ids('running'), [])
+
+    def test_rebuild(self):
+        self.assertEqual(rebuild_index(batch_size=1), 2)
+        self.assertEqual(len(self.search_ids('nova')), 2)
+
+
+class SuggestTests(TestCase):
+    """Typeahead answers from memory and follows committed catalog changes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        seller_user = User.objects.create_user(username='seller', password='secret', user_type='seller')
+        cls.seller = SellerProfile.objects.create(user=seller_user, store_name='Suggest Store')
+        cls.brand = Brand.objects.create(name='Adidas')
+        cls.product = Product.objects.create(
+            seller=cls.seller, brand=cls.brand, name='Adilette Slides', description='Pool slides',
+            price=Decimal('1000'), stock=5,
+        )
+
+    def setUp(self):
+        # The index lives in process memory, outside each test's transaction
+        invalidate_suggestions()
+
+    def labels(self, query):
+        return [item['label'] for item in suggest(query)]
+
+    def test_prefix_lookup_without_queries(self):
+        self.labels('a')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.labels('adi'), ['Adidas', 'Adilette Slides'])
+            self.assertEqual(self.labels('sli'), ['Adilette Slides'])
+
+    def test_follows_catalog_changes(self):
+        self.labels('a')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = 'Samba Trainers'
+            self.product.save()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.labels('samba'), ['Samba Trainers'])
+            self.assertEqual(self.labels('adi'), ['Adidas'])
+
+    def test_other_processes_replay_changes_without_rebuilding(self):
+        # A second index stands in for another worker process
+        other = SuggestionIndex()
+        other.ensure_fresh()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = 'Samba Trainers'
+            self.product.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.brand.name = 'Puma'
+            self.brand.save()
+        with mock.patch.object(other, 'build') as build:
+            other.ensure_fresh()
+        build.assert_not_called()
+        self.assertEqual([item['label'] for item in other.lookup('samba')], ['Samba Trainers'])
+        self.assertEqual([item['label'] for item in other.lookup('adi')], [])
+        self.assertEqual([item['label'] for item in other.lookup('pum')], ['Puma'])
+
+        seller = User.objects.get(username='seller')
+        self.client.force_login(seller)
+        response = self.client.post(
+            '/seller/update-products-status/',
+            json.dumps({'product_ids': [self.product.pk], 'action': 'deactivate'}),
+            content_type='application/json', HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+        )
+        self.assertTrue(response.json()['success'])
+        with mock.patch.object(other, 'build') as build:
+            other.ensure_fresh()
+        build.assert_not_called()
+        self.assertEqual(other.lookup('samba'), [])
+
+    def test_gap_in_the_change_log_rebuilds(self):
+        other = SuggestionIndex()
+        other.ensure_fresh()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = 'Samba Trainers'
+            self.product.save()
+        cache.delete(f'{SUGGEST_CHANGE_KEY}:{get_suggest_version()}')
+        with mock.patch.object(other, 'build', wraps=other.build) as build:
+            other.ensure_fresh()
+        build.assert_called_once()
+        self.assertEqual([item['label'] for item in other.lookup('samba')], ['Samba Trainers'])
+
+    def test_endpoint(self):
+        response = self.client.get('/search/suggest/', {'q': 'adid'})
+        self.assertEqual(response.json()['suggestions'][0]['url'], '/brands/adidas/')
+
+
+@unittest.skipIf(get_backend() is None, 'No full-text backend for this database')
+class FuzzySearchTests(TestCase):
+    """Misspelled queries fall through to the trigram tier"""
+
+    @classmethod
+    def setUpTestData(cls):
+        seller_user = User.objects.create_user(username='seller', password='secret', user_type='seller')
+        seller = SellerProfile.objects.create(user=seller_user, store_name='Fuzzy Store')
+        brand = Brand.objects.create(name='Gucci')
+        Product.objects.create(
+            seller=seller, brand=brand, name='Leather Loafers', description='Classic',
+            price=Decimal('9000'), stock=2,
+        )
+
+    def test_did_you_mean(self):
+        self.assertEqual(did_you_mean('guci'), 'gucci')
+        self.assertEqual(did_you_mean('gucci lofers'), 'gucci loafers')
+        self.assertIsNone(did_you_mean('gucci'))
+        self.assertIsNone(did_you_mean('lea'))
+        self.assertIsNone(did_you_mean('xyzzy'))
+
+    def test_zero_hits_show_corrected_results(self):
+        results, suggestion, corrected = search_with_suggestions('guci')
+        self.assertEqual((suggestion, corrected, results.count()), ('gucci', True, 1))
+
+        results, suggestion, corrected = search_with_suggestions('guci', fuzzy=False)
+        self.assertEqual((suggestion, corrected, results.count()), (None, False, 0))
+
+    def test_rebuild_terms(self):
+        self.assertEqual(rebuild_terms(), 3)
+        self.assertEqual(did_you_mean('lether'), 'leather')
+
+    def test_save_while_a_word_is_added_concurrently(self):
+        bulk_create = SearchTerm.objects.bulk_create
+
+        def racing_bulk_create(objs, **kwargs):
+            # Another seller's save commits 'velvet' after this one read the vocabulary
+            term = SearchTerm.objects.create(term='velvet', trigram_count=len(trigrams('velvet')))
+            SearchTrigram.objects.bulk_create([SearchTrigram(trigram=trigram, term=term) for trigram in trigrams('velvet')])
+            return bulk_create(objs, **kwargs)
+
+        with mock.patch.object(SearchTerm.objects, 'bulk_create', racing_bulk_create):
+            product = Product.objects.create(
+                seller=Product.objects.get().seller, name='Velvet Blazer', description='',
+                price=Decimal('4000'), stock=1,
+            )
+        self.assertTrue(Product.objects.filter(pk=product.pk).exists())
+        self.assertEqual(SearchTerm.objects.filter(term='velvet').count(), 1)
+        for word in ('velvet', 'blazer'):
+            self.assertEqual(SearchTrigram.objects.filter(term__term=word).count(), len(trigrams(word)))
+
+
+@unittest.skipIf(get_backend() is None, 'No full-text backend for this database')
+class SearchCacheTests(TransactionTestCase):
+    """Committed searches are served from cache until the catalog changes"""
+
+    def setUp(self):
+        cache.clear()
+        seller_user = User.objects.create_user(username='seller', password='secret', user_type='seller')
+        self.seller = SellerProfile.objects.create(user=seller_user, store_name='Cache Store')
+        self.product = Product.objects.create(
+            seller=self.seller, name='Kitenge Dress', description='Wax print', price=Decimal('1500'), stock=3,
+        )
+
+    def page(self, query):
+        results = search_products(query)
+        return results.count(), [product.name for product in results[:12]]
+
+    def test_cached_until_catalog_changes(self):
+        self.assertEqual(self.page('kitenge'), (1, ['Kitenge Dress']))
+        with self.assertNumQueries(1):
+            # Only the products of the cached ids are loaded
+            self.assertEqual(self.page('KITENGE!'), (1, ['Kitenge Dress']))
+
+        self.product.name = 'Kitenge Jumpsuit'
+        self.product.save()
+        self.assertEqual(self.page('kitenge'), (1, ['Kitenge Jumpsuit']))
+
+
+class SearchLogTests(TestCase):
+    """Search log entries are buffered and written in batches"""
+
+    def setUp(self):
+        flush_search_log()
+
+    def tearDown(self):
+        flush_search_log()
+
+    def test_batched_writes(self):
+        for i in range(FLUSH_SIZE - 1):
+            log_search('Dress', 'dress', hits=3, latency_ms=1.5)
+        self.assertEqual(SearchQueryLog.objects.count(), 0)
+        self.assertEqual(pending_entries(), FLUSH_SIZE - 1)
+
+        with self.assertNumQueries(1):
+            log_search('guci', 'guci', hits=0, latency_ms=2.0, corrected_to='gucci')
+        self.assertEqual(SearchQueryLog.objects.count(), FLUSH_SIZE)
+        self.assertEqual(pending_entries(), 0)
+
+    def test_search_view_logs_first_page_only(self):
+        self.client.get('/search/', {'q': 'dress'})
+        self.client.get('/search/', {'q': 'dress', 'page': 2})
+        self.client.get('/search/', {'q': '   '})
+        self.assertEqual(pending_entries(), 1)
+        self.assertEqual(flush_search_log(), 1)
+        self.assertEqual(SearchQueryLog.objects.get().normalized_query, 'dress')
+
+
+    def test_report_shows_the_latest_correction(self):
+        now = timezone.now()
+        SearchQueryLog.objects.bulk_create([
+            SearchQueryLog(query='guci', normalized_query='guci', hits=0, latency_ms=1.0,
+                           corrected_to='gucci', created_at=now - timedelta(hours=2)),
+            SearchQueryLog(query='guci', normalized_query='guci', hits=0, latency_ms=1.0,
+                           corrected_to='gucci bags', created_at=now - timedelta(hours=3)),
+            SearchQueryLog(query='guci', normalized_query='guci', hits=0, latency_ms=1.0,
+                           corrected_to='', created_at=now - timedelta(hours=1)),
+        ])
+        log_search('Dress', 'dress', hits=3, latency_ms=1.5)
+        out = StringIO()
+        with self.assertNumQueries(4):
+            call_command('search_report', stdout=out)
+        self.assertIn('guci  (shown: gucci)', out.getvalue())
+        self.assertEqual(pending_entries(), 1)
+
+class ProductDetailCacheTests(TestCase):
+    """The public product page is a shared cached fragment; user state is separate"""
+
+    @classmethod
+    def setUpTestData(cls):
+        seller_user = User.objects.create_user(username='seller', password='secret', user_type='seller')
+        seller = SellerProfile.objects.create(user=seller_user, store_name='Detail Store')
+        cls.product = Product.objects.create(
+            seller=seller, name='Ankara Dress', description='Bold print', price=Decimal('2500'), stock=4,
+        )
+        cls.shopper = User.objects.create_user(username='shopper', password='secret')
+
+    def setUp(self):
+        cache.clear()
+        self.url = f'/product/{self.product.slug}/'
+
+    def test_warm_anonymous_render_is_one_query(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertContains(response, 'Ankara Dress')
+
+    def test_review_write_refreshes_page(self):
+        self.client.get(self.url)
+        Review.objects.create(product=self.product, user=self.shopper, rating=5, comment='Stunning fabric')
+        self.assertContains(self.client.get(self.url), 'Stunning fabric')
+
+    def test_reviews_are_paged(self):
+        shoppers = User.objects.bulk_create(
+            User(username=f'reviewer{i}', password='secret') for i in range(REVIEWS_PER_PAGE + 3)
+        )
+        for i, shopper in enumerate(shoppers):
+            Review.objects.create(product=self.product, user=shopper, rating=i % 5 + 1, comment=f'Review {i}')
+
+        response = self.client.get(self.url)
+        self.assertEqual(len(response.context['reviews']), REVIEWS_PER_PAGE)
+        self.assertContains(response, 'Show more reviews')
+
+        usernames = []
+        cursor = ''
+        while cursor is not None:
+            with self.assertNumQueries(1):
+                page = self.client.get(f'{self.url}reviews/', {'cursor': cursor}).json()
+            usernames += [review['username'] for review in page['reviews']]
+            cursor = page['next_cursor']
+        self.assertEqual(usernames, [shopper.username for shopper in reversed(shoppers)])
+
+    def test_user_state(self):
+        anonymous = self.client.get(f'{self.url}me/').json()
+        self.assertEqual((anonymous['authenticated'], anonymous['in_cart']), (False, False))
+
+        Cart.objects.create(user=self.shopper, product=self.product, quantity=3)
+        Wishlist.objects.create(user=self.shopper, product=self.product)
+        Review.objects.create(product=self.product, user=self.shopper, rating=4, comment='Nice')
+        self.client.force_login(self.shopper)
+        # Session and user lookups, then the state itself
+        with self.assertNumQueries(3):
+            response = self.client.get(f'{self.url}me/')
+        state = response.json()
+        self.assertEqual(
+            (state['in_wishlist'], state['in_cart'], state['cart_quantity'], state['user_review']['rating']),
+            (True, True, 3, 4),
+        )
+        self.assertIn('private', response['Cache-Control'])
+
+
+class RecommendationTests(TestCase):
+    """Co-purchase neighbours are built in full, then folded in incrementally"""
+
+    @classmethod
+    def setUpTestData(cls):
+        seller_user = User.objects.create_user(username='seller', password='secret', user_type='seller')
+        cls.seller = SellerProfile.objects.create(user=seller_user, store_name='Rec Store')
+        cls.shopper = User.objects.create_user(username='shopper', password='secret')
+        cls.dress, cls.heels, cls.clutch, cls.scarf = (
+            Product.objects.create(seller=cls.seller, name=name, description='', price=Decimal('1000'), stock=5)
+            for name in ('Dress', 'Heels', 'Clutch', 'Scarf')
+        )
+
+    def order(self, *products, status='delivered'):
+        order = Order.objects.create(
+            user=self.shopper, order_number=f'ORD{Order.objects.count() + 1}', status=status,
+            payment_method='mpesa', subtotal=0, total=0, shipping_address='Nairobi', phone='0700000000',
+        )
+        OrderItem.objects.bulk_create(
+            OrderItem(order=order, product=product, quantity=1, price=product.price) for product in products
+        )
+        # Orders only count once they have settled
+        Order.objects.filter(id=order.id).update(created_at=order.created_at - timedelta(minutes=5))
+        return order
+
+    def test_full_then_incremental(self):
+        self.order(self.dress, self.heels)
+        self.order(self.dress, self.heels, self.clutch)
+        self.order(self.dress, self.scarf, status='cancelled')
+        build_recommendations(full=True)
+
+        self.assertEqual(recommended_products([self.dress.id]), [self.heels, self.clutch])
+        self.assertFalse(ProductRecommendation.objects.filter(recommended=self.scarf).exists())
+
+        self.order(self.clutch, self.scarf)
+        self.order(self.clutch, self.scarf)
+        self.assertEqual(build_recommendations(), 2)
+        self.assertEqual(recommended_products([self.clutch.id])[0], self.scarf)
+        self.assertEqual(build_recommendations(), 0)
+
+    def test_product_page_falls_back_to_category(self):
+        response = self.client.get(f'/product/{self.dress.slug}/')
+        self.assertEqual(len(response.context['related_products']), 3)
+
+
+class CartServiceTests(TestCase):
+    """Cart lines and totals come from one query; the summary is cached per user"""
+
+    @classmethod
+    def setUpTestData(cls):
+        seller_user = User.objects.create_user(username='seller', password='secret', user_type='seller')
+        seller = SellerProfile.objects.create(user=seller_user, store_name='Cart Store')
+        cls.shopper = User.objects.create_user(username='shopper', password='secret')
+        cls.products = [
+            Product.objects.create(seller=seller, name=f'Item {i}', description='', price=Decimal(100 * (i + 1)), stock=9)
+            for i in range(5)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_lines_and_totals_in_one_query(self):
+        for quantity, product in enumerate(self.products[:3], start=1):
+            Cart.objects.create(user=self.shopper, product=product, quantity=quantity)
+        with self.assertNumQueries(1):
+            items, summary = get_cart(self.shopper)
+            line_totals = [item.line_total for item in items]
+        self.assertEqual(line_totals, [Decimal('100'), Decimal('400'), Decimal('900')])
+        self.assertEqual(summary, {'count': 3, 'quantity': 6, 'subtotal': Decimal('1400')})
+
+    def test_cart_page_queries_do_not_grow_with_lines(self):
+        self.client.force_login(self.shopper)
+        Cart.objects.create(user=self.shopper, product=self.products[0])
+        wishlist_count(self.shopper)
+        with CaptureQueriesContext(connection) as one_line:
+            self.client.get('/cart/')
+        for product in self.products[1:]:
+            Cart.objects.create(user=self.shopper, product=product)
+        with CaptureQueriesContext(connection) as five_lines:
+            response = self.client.get('/cart/')
+        self.assertEqual(len(five_lines), len(one_line))
+        self.assertEqual(response.context['subtotal'], Decimal('1500'))
+
+    def test_summary_is_cached_until_the_cart_changes(self):
+        Cart.objects.create(user=self.shopper, product=self.products[0], quantity=2)
+        self.assertEqual(cart_summary(self.shopper)['quantity'], 2)
+        with self.assertNumQueries(0):
+            cart_summary(self.shopper)
+
+        line = Cart.objects.create(user=self.shopper, product=self.products[1])
+        self.assertEqual(cart_summary(self.shopper)['count'], 2)
+        line.delete()
+        self.assertEqual(cart_summary(self.shopper), {'count': 1, 'quantity': 2, 'subtotal': Decimal('200')})
+
+    def test_guest_cart_writes_nothing_until_login(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(f'/add-to-cart/{self.products[0].id}/')
+            self.client.get(f'/add-to-cart/{self.products[0].id}/')
+            self.client.get(f'/add-to-cart/{self.products[1].id}/')
+        self.assertTrue(all(query['sql'].startswith('SELECT') for query in queries))
+        self.assertFalse(Cart.objects.exists())
+        response = self.client.get('/cart/')
+        self.assertEqual(response.context['subtotal'], Decimal('400'))
+        self.assertEqual(response.context['cart_count'], 2)
+
+        Cart.objects.create(user=self.shopper, product=self.products[1], quantity=3)
+        response = self.client.post('/users/login/', {'username': 'shopper', 'password': 'secret'})
+        self.assertEqual(response.cookies['guest_cart'].value, '')
+        self.assertEqual(
+            dict(Cart.objects.filter(user=self.shopper).values_list('product_id', 'quantity')),
+            {self.products[0].id: 2, self.products[1].id: 4},
+        )
+        self.assertEqual(cart_summary(self.shopper)['quantity'], 6)
+
+    def test_adds_increment_in_the_database(self):
+        add_item(self.shopper, self.products[0].id)
+        # A stale in-memory line cannot overwrite the second add
+        Cart.objects.get(user=self.shopper)
+        with self.assertNumQueries(1):
+            add_item(self.shopper, self.products[0].id)
+        self.assertEqual(Cart.objects.get(user=self.shopper).quantity, 2)
+
+    def test_batch_add_is_one_statement(self):
+        add_item(self.shopper, self.products[0].id, 8)
+        with self.assertNumQueries(1):
+            add_items(self.shopper, {product.id: 2 for product in self.products}, cap_to_stock=True)
+        quantities = dict(Cart.objects.filter(user=self.shopper).values_list('product_id', 'quantity'))
+        self.assertEqual(quantities, {product.id: 9 if product is self.products[0] else 2 for product in self.products})
+        self.assertEqual(cart_summary(self.shopper)['count'], 5)
+
+    def test_move_selected_and_reorder(self):
+        self.client.force_login(self.shopper)
+        ajax = {'content_type': 'application/json', 'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+        wishes = [Wishlist.objects.create(user=self.shopper, product=product) for product in self.products[:3]]
+        response = self.client.post(
+            '/move-selected-to-cart/', json.dumps({'wishlist_ids': [wish.id for wish in wishes]}), **ajax
+        )
+        self.assertEqual((response.json()['moved_count'], response.json()['cart_count']), (3, 3))
+        self.assertFalse(Wishlist.objects.exists())
+
+        response = self.client.post('/add-reorder-to-cart/', json.dumps({'items': [
+            {'product_id': self.products[0].id, 'quantity': 20},
+            {'product_id': self.products[3].id, 'quantity': 2},
+            {'product_id': 'x'},
+        ]}), **ajax).json()
+        self.assertEqual(response['added_count'], 2)
+        self.assertEqual(len(response['errors']), 3)
+        self.assertEqual(Cart.objects.get(user=self.shopper, product=self.products[0]).quantity, 9)
+
+    def test_batch_endpoint(self):
+        self.client.force_login(self.shopper)
+        add_items(self.shopper, {self.products[0].id: 1, self.products[1].id: 1})
+        operations = [
+            {'op': 'set', 'product_id': self.products[0].id, 'quantity': 3},
+            {'op': 'increment', 'product_id': self.products[0].id, 'quantity': 2},
+            {'op': 'remove', 'product_id': self.products[1].id},
+            {'op': 'increment', 'product_id': self.products[2].id, 'quantity': 20},
+        ]
+        # Session, user, stock, then the writes and the returned cart
+        with self.assertNumQueries(10):
+            response = self.client.post('/cart/batch/', {'operations': operations}, content_type='application/json')
+        data = response.json()
+        self.assertEqual(
+            [(line['product_id'], line['quantity']) for line in data['lines']],
+            [(self.products[0].id, 5), (self.products[2].id, 9)],
+        )
+        self.assertEqual((data['count'], Decimal(data['subtotal'])), (2, Decimal('3200')))
+        self.assertEqual(data['errors'], [f'Only 9 units available for product {self.products[2].id}'])
+        self.assertEqual(cart_summary(self.shopper)['quantity'], 14)
+
+        bad = self.client.post('/cart/batch/', {'operations': [{'op': 'explode'}]}, content_type='application/json')
+        self.assertEqual(bad.status_code, 400)
+
+    def test_guest_batch(self):
+        self.client.get(f'/add-to-cart/{self.products[0].id}/')
+        response = self.client.post('/cart/batch/', {'operations': [
+            {'op': 'increment', 'product_id': self.products[0].id, 'quantity': 4},
+            {'op': 'set', 'product_id': self.products[1].id, 'quantity': 2},
+            {'op': 'increment', 'product_id': self.products[2].id, 'quantity': 12},
+        ]}, content_type='application/json')
+        self.assertEqual(response.json()['quantity'], 16)
+        self.assertEqual(response.json()['errors'], [f'Only 9 units available for product {self.products[2].id}'])
+        self.assertFalse(Cart.objects.exists())
+        self.assertEqual(self.client.get('/cart/').context['cart_count'], 3)
+
+    def test_guest_quantities_are_validated_and_capped(self):
+        first = self.products[0]
+        self.client.get(f'/add-to-cart/{first.id}/')
+        self.assertEqual(self.client.post('/update-cart-quantity/', {'quantity': 2}).status_code, 400)
+        self.assertEqual(self.client.post('/update-cart-quantity/', {'cart_id': 'x'}).status_code, 400)
+        response = self.client.post('/update-cart-quantity/', {'cart_id': first.id, 'quantity': 10 ** 20})
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post('/update-cart-quantity/', {'cart_id': first.id, 'quantity': 50})
+        self.assertEqual(response.json()['errors'], [f'Only 9 units available for product {first.id}'])
+        self.assertEqual(self.client.get('/cart/').context['cart_items'][0].quantity, 9)
+
+    def test_out_of_range_guest_lines_are_dropped_and_merges_capped(self):
+        first, second = self.products[:2]
+        signer = signing.get_cookie_signer(salt=GUEST_CART_COOKIE + GUEST_CART_SALT)
+        self.client.cookies[GUEST_CART_COOKIE] = signer.sign(json.dumps({
+            str(first.id): 500, str(second.id): 10 ** 20, str(10 ** 20): 1,
+        }))
+        response = self.client.post('/users/login/', {'username': 'shopper', 'password': 'secret'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            dict(Cart.objects.filter(user=self.shopper).values_list('product_id', 'quantity')), {first.id: 9},
+        )
+
+    def test_tampered_guest_cookie_is_ignored(self):
+        self.client.cookies['guest_cart'] = '{"1":5}'
+        self.assertEqual(self.client.get('/cart/').context['cart_items'], [])
+
+
+class HeaderCounterTests(TestCase):
+    """Cart and wishlist badges are lazy and served from per-user cache entries"""
+
+    @classmethod
+    def setUpTestData(cls):
+        seller_user = User.objects.create_user(username='seller', password='secret', user_type='seller')
+        seller = SellerProfile.objects.create(user=seller_user, store_name='Badge Store')
+        cls.shopper = User.objects.create_user(username='shopper', password='secret')
+        cls.products = [
+            Product.objects.create(seller=seller, name=f'Badge {i}', description='', price=Decimal('100'), stock=5)
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.shopper)
+
+    def test_counters_only_query_when_read(self):
+        request = RequestFactory().get('/')
+        request.user = self.shopper
+        with self.assertNumQueries(0):
+            context = cart_count(request)
+        with self.assertNumQueries(2):
+            self.assertEqual((context['cart_count'], context['wishlist_count']), (0, 0))
+
+    def test_warm_counters_cost_no_queries(self):
+        add_item(self.shopper, self.products[0].id)
+        Wishlist.objects.create(user=self.shopper, product=self.products[1])
+        with CaptureQueriesContext(connection) as cold:
+            self.client.get('/users/login/')
+        with CaptureQueriesContext(connection) as warm:
+            self.client.get('/users/login/')
+        self.assertEqual(len(cold) - len(warm), 2)
+
+    def test_wishlist_changes_invalidate_the_count(self):
+        # Cold cache: nothing is cached until the first read
+        with self.captureOnCommitCallbacks(execute=True):
+            wishes = [Wishlist.objects.create(user=self.shopper, product=product) for product in self.products]
+        self.assertEqual(wishlist_count(self.shopper), 3)
+        with self.assertNumQueries(0):
+            self.assertEqual(wishlist_count(self.shopper), 3)
+
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            wishes[0].delete()
+            # A cold read racing the delete caches the count it saw
+            cache.set(wishlist_cache_key(self.shopper.pk), 3)
+        self.assertEqual(wishlist_count(self.shopper), 2)
+
+
+class WishlistPageTests(TestCase):
+    """Wishlist stats come from one aggregate and the page's query count is fixed"""
+
+    @classmethod
+    def setUpTestData(cls):
+        seller_user = User.objects.create_user(username='seller', password='secret', user_type='seller')
+        seller = SellerProfile.objects.create(user=seller_user, store_name='Wish Store')
+        cls.shopper = User.objects.create_user(username='shopper', password='secret')
+        cls.dresses = Category.objects.create(name='Dresses')
+        cls.products = Product.objects.bulk_create([
+            Product(
+                seller=seller, name=f'Wish {i}', slug=f'wish-{i}', description='', price=Decimal(100 + i),
+                final_price=Decimal(100 + i), stock=i % 2, category=cls.dresses,
+            )
+            for i in range(60)
+        ])
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.shopper)
+
+    def wish(self, products):
+        Wishlist.objects.bulk_create(Wishlist(user=self.shopper, product=product) for product in products)
+
+    def test_stats(self):
+        self.wish(self.products[:4])
+        response = self.client.get('/wishlist/')
+        context = response.context
+        self.assertEqual(
+            (context['total_items'], context['in_stock_count'], context['out_of_stock_count']), (4, 2, 2)
+        )
+        self.assertEqual(
+            (context['min_price'], context['max_price'], context['total_value']),
+            (Decimal('100'), Decimal('103'), Decimal('406')),
+        )
+        self.assertEqual(context['categories'], [{'category_id': self.dresses.id, 'name': 'Dresses', 'count': 4}])
+        wished = {product.id for product in self.products[:4]}
+        self.assertEqual(len(context['recommendations']), 6)
+        self.assertFalse(wished & {product.id for product in context['recommendations']})
+
+    def test_query_count_does_not_grow(self):
+        self.wish(self.products[:3])
+        self.client.get('/wishlist/')
+        with CaptureQueriesContext(connection) as small:
+            self.client.get('/wishlist/')
+        self.wish(self.products[3:50])
+        with CaptureQueriesContext(connection) as large:
+            self.client.get('/wishlist/')
+        self.assertEqual(len(large), len(small))
+
+    def test_transfer_to_cart_is_set_based(self):
+        self.wish(self.products[:2])
+        ids = list(Wishlist.objects.order_by('id').values_list('id', flat=True))
+        with CaptureQueriesContext(connection) as small:
+            transfer_to_cart(self.shopper, ids)
+        self.wish(self.products[2:])
+        ids = list(Wishlist.objects.order_by('id').values_list('id', flat=True))
+        with CaptureQueriesContext(connection) as large:
+            results = transfer_to_cart(self.shopper, ids + [0, 'x', '\u00b2', True, -1, 10 ** 20])
+        self.assertEqual(len(large), len(small))
+
+        statuses = [result['status'] for result in results]
+        # Odd-numbered products are in stock; Wish 1 was moved in the first call
+        self.assertEqual(statuses[:4], ['unavailable', 'unavailable', 'moved', 'unavailable'])
+        self.assertEqual(results[-6:], [
+            {'wishlist_id': 0, 'status': 'not_found'},
+            {'wishlist_id': 'x', 'status': 'not_found'},
+            {'wishlist_id': '\u00b2', 'status': 'not_found'},
+            {'wishlist_id': True, 'status': 'not_found'},
+            {'wishlist_id': -1, 'status': 'not_found'},
+            {'wishlist_id': 10 ** 20, 'status': 'not_found'},
+        ])
+        self.assertEqual(Cart.objects.filter(user=self.shopper).count(), 30)
+        self.assertEqual(Wishlist.objects.filter(user=self.shopper).count(), 30)
+
+    def test_empty_wishlist_uses_shared_caches(self):
+        self.client.get('/wishlist/')
+        with CaptureQueriesContext(connection) as warm:
+            response = self.client.get('/wishlist/')
+        self.assertContains(response, 'Dresses')
+        # Session, user, the stats aggregate and the recommended products
+        self.assertEqual(len(warm), 4)
+
+
+class WishlistNotificationTests(TestCase):
+    """Price drops and restocks go through the outbox into per-shopper digests"""
+
+    @classmethod
+    def setUpTestData(cls):
+        seller_user = User.objects.create_user(username='seller', password='secret', user_type='seller')
+        seller = SellerProfile.objects.create(user=seller_user, store_name='Outbox Store')
+        cls.shoppers = [
+            User.objects.create_user(username=f'fan{i}', password='secret', email=f'fan{i}@example.com')
+            for i in range(3)
+        ]
+        cls.gown = Product.objects.create(seller=seller, name='Gown', description='', price=Decimal('5000'), stock=2)
+        cls.boots = Product.objects.create(seller=seller, name='Boots', description='', price=Decimal('3000'), stock=0)
+        for shopper in cls.shoppers:
+            Wishlist.objects.create(user=shopper, product=cls.gown)
+        Wishlist.objects.create(user=cls.shoppers[0], product=cls.boots)
+
+    def test_save_records_only_transitions(self):
+        gown = Product.objects.get(pk=self.gown.pk)
+        gown.description = 'Silk'
+        gown.save()
+        self.assertFalse(ProductEvent.objects.exists())
+
+        gown.discount_price = Decimal('4000')
+        gown.save()
+        boots = Product.objects.get(pk=self.boots.pk)
+        boots.stock = 5
+        boots.save()
+        self.assertEqual(
+            list(ProductEvent.objects.order_by('id').values_list('kind', 'old_price', 'new_price')),
+            [('price_drop', Decimal('5000'), Decimal('4000')), ('back_in_stock', None, None)],
+        )
+
+    def test_bulk_writes_record_transitions(self):
+        Product.objects.filter(pk=self.gown.pk).update(price=Decimal('4500'))
+        Product.objects.filter(pk=self.boots.pk).update(stock=F('stock') + 4)
+        Product.objects.filter(pk=self.boots.pk).update(stock=F('stock') - 1)
+        self.assertEqual(
+            list(ProductEvent.objects.order_by('id').values_list('product_id', 'kind', 'old_price', 'new_price')),
+            [(self.gown.pk, 'price_drop', Decimal('5000'), Decimal('4500')), (self.boots.pk, 'back_in_stock', None, None)],
+        )
+
+        ProductEvent.objects.all().delete()
+        gown, boots = Product.objects.get(pk=self.gown.pk), Product.objects.get(pk=self.boots.pk)
+        gown.discount_price = Decimal('4000')
+        boots.stock = 0
+        Product.objects.bulk_update([gown, boots], ['discount_price', 'stock'])
+        self.assertEqual(
+            list(ProductEvent.objects.values_list('product_id', 'kind', 'old_price', 'new_price')),
+            [(self.gown.pk, 'price_drop', Decimal('4500'), Decimal('4000'))],
+        )
+
+    def test_notifiers_must_implement_send(self):
+        class Incomplete(BaseNotifier):
+            pass
+
+        with self.assertRaises(TypeError):
+            Incomplete()
+        self.assertEqual(EmailNotifier().send_digests([]), 0)
+
+    def test_digests_are_sent_and_outbox_drained(self):
+        gown = Product.objects.get(pk=self.gown.pk)
+        gown.discount_price = Decimal('4500')
+        gown.save()
+        gown.discount_price = Decimal('4000')
+        gown.save()
+        boots = Product.objects.get(pk=self.boots.pk)
+        boots.stock = 1
+        boots.save()
+
+        self.assertEqual(send_pending_digests(get_notifier('fashionnova_app.notifications.EmailNotifier')), (3, 3))
+        self.assertFalse(ProductEvent.objects.exists())
+        first = next(message for message in mail.outbox if message.to == ['fan0@example.com'])
+        self.assertIn('Gown is now Ksh 4000.00 (was Ksh 5000.00)', first.body)
+        self.assertIn('Boots is back in stock', first.body)
+        self.assertNotIn('Boots', mail.outbox[-1].body)
+
+    def test_file_notifier_and_stale_events(self):
+        boots = Product.objects.get(pk=self.boots.pk)
+        boots.stock = 3
+        boots.save()
+        # Sold out again before the worker ran, so there is nothing to say
+        Product.objects.filter(pk=boots.pk).update(stock=0)
+        gown = Product.objects.get(pk=self.gown.pk)
+        gown.discount_price = Decimal('4200')
+        gown.save()
+
+        path = os.path.join(tempfile.mkdtemp(), 'digests.jsonl')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path), ignore_errors=True)
+        self.assertEqual(send_pending_digests(FileNotifier(path)), (2, 3))
+        with open(path) as handle:
+            digests = [json.loads(line) for line in handle]
+        self.assertEqual({item['kind'] for digest in digests for item in digest['items']}, {'price_drop'})
+
+    def test_worker_command(self):
+        gown = Product.objects.get(pk=self.gown.pk)
+        gown.discount_price = Decimal('4800')
+        gown.save()
+        out = StringIO()
+        with override_settings(WISHLIST_NOTIFIER_BACKEND='fashionnova_app.notifications.EmailNotifier'):
+            call_command('notify_wishlists', once=True, stdout=out)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertIn('1 events and 3 digests', out.getvalue())
+
+
+def make_upload(name='photo.jpg', size=(1200, 900), image_format='JPEG'):
+    buffer = BytesIO()
+    Image.new('RGB', size, (200, 40, 90)).save(buffer, image_format)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type=f'image/{image_format.lower()}')
+
+
+class TemporaryMediaMixin:
+    """Point MEDIA_ROOT at a scratch directory for the whole test class"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.settings_override = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.settings_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+
+class CollectedStaticMixin:
+    """Serve collectstatic output through the production storage for the whole test class.
+
+    The manifest storage raises for any static name it has no entry for, so
+    pages are checked the way they render with DEBUG off.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.static_root = tempfile.mkdtemp()
+        cls.static_override = override_settings(STATIC_ROOT=cls.static_root, STORAGES={
+            **settings.STORAGES,
+            'staticfiles': {'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage'},
+        })
+        cls.static_override.enable()
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.static_override.disable()
+        shutil.rmtree(cls.static_root, ignore_errors=True)
+        super().tearDownClass()
+
+
+class PlaceholderImageTests(CollectedStaticMixin, TemporaryMediaMixin, TestCase):
+    """Products without a processed image show the placeholder from the manifest"""
+
+    def test_listing_with_a_pending_image(self):
+        seller_user = User.objects.create_user(username='seller', password='secret', user_type='seller')
+        seller = SellerProfile.objects.create(user=seller_user, store_name='Pending Store')
+        Product.objects.create(
+            seller=seller, name='Queued Dress', description='', price=Decimal('900'), stock=1, image=make_upload(),
+        )
+        response = self.client.get('/products/')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'data-processing="1"')
+        self.assertContains(response, staticfiles_storage.url(PLACEHOLDER_IMAGE))
+        self.assertNotContains(response, '/static/fashionnova_app/Images/momj.jpeg"')
+
+
+class ManifestStaticPageTests(CollectedStaticMixin, TestCase):
+    """Every {% static %} name on the public pages is in the collected manifest"""
+
+    @classmethod
+    def setUpTestData(cls):
+        seller_user = User.objects.create_user(username='seller', password='secret', user_type='seller')
+        seller = SellerProfile.objects.create(user=seller_user, store_name='Smoke Store')
+        category = Category.objects.create(name='Dresses')
+        cls.brand = Brand.objects.create(name='Nova')
+        # No image, so each page takes its placeholder branch
+        cls.product = Product.objects.create(
+            seller=seller, category=category, brand=cls.brand, name='Plain Dress', description='',
+            price=Decimal('900'), stock=2,
+        )
+
+    def test_public_pages(self):
+        pages = [
+            '/', '/products/', '/categories/', '/about/', '/search/?q=dress', '/users/login/',
+            f'/product/{self.product.slug}/', f'/brands/{self.brand.slug}/',
+        ]
+        # The search page buffers a log entry; write it while the test database exists
+        self.addCleanup(flush_search_log)
+        for page in pages:
+            with self.subTest(page=page):
+                self.assertEqual(self.client.get(page).status_code, 200)
+
+    def test_brand_page_counts_without_the_total(self):
+        response = self.client.get(f'/brands/{self.brand.slug}/', {'count': '0'})
+        self.assertIsNone(response.context['products'].count)
+        self.assertContains(response, '<h4 class="mb-0">1</h4>', html=True)
+        self.assertNotContains(response, 'None')
+
+
+class ImageDerivativeTests(TemporaryMediaMixin, TestCase):
+    """Uploads get resized WebP/JPEG derivatives, rendered through product_image"""
+
+    @classmethod
+    def setUpTestData(cls):
+        seller_user = User.objects.create_user(username='seller', password='secret', user_type='seller')
+        cls.seller = SellerProfile.objects.create(user=seller_user, store_name='Photo Store')
+
+    def render(self, product, size):
+        template = Template("{% load product_images %}{% product_image product size alt=product.name %}")
+        return template.render(Context({'product': product, 'size': size}))
+
+    def test_upload_makes_derivatives(self):
+        product = Product.objects.create(
+            seller=self.seller, name='Linen Shirt', description='', price=Decimal('900'), image=make_upload(),
+        )
+        # Nothing is resized in the request; pages show a placeholder meanwhile
+        self.assertIn('data-processing', self.render(product, 'card'))
+        self.assertEqual(process_pending_media(), 1)
+        product.refresh_from_db()
+        # 1600 is wider than the original, so 1200 stands in for zoom
+        self.assertEqual(product.image_variants['widths'], {'thumb': 160, 'card': 400, 'detail': 800, 'zoom': 1200})
+        stem = product.image.name.rsplit('.', 1)[0]
+        with default_storage.open(f'{DERIVATIVE_ROOT}/{stem}/card.webp') as derivative:
+            self.assertEqual(Image.open(derivative).size, (400, 300))
+
+        self.assertEqual((product.image_variants['width'], product.image_variants['height']), (1200, 900))
+        self.assertTrue(product.image_variants['placeholder'].startswith('data:image/jpeg;base64,'))
+
+        html = self.render(product, 'thumb')
+        self.assertIn('type="image/webp"', html)
+        self.assertIn(f'{DERIVATIVE_ROOT}/{stem}/thumb.jpg"', html)
+        self.assertIn('800w', html)
+        # Reserved space, lazy loading and an inline preview for the thumbnail
+        self.assertIn('width="160"', html)
+        self.assertIn('height="120"', html)
+        self.assertIn('loading="lazy"', html)
+        self.assertIn('url(data:image/jpeg;base64,', html)
+
+    def test_replaced_image_is_reprocessed(self):
+        product = Product.objects.create(
+            seller=self.seller, name='Tee', description='', price=Decimal('500'), image=make_upload(size=(300, 300)),
+        )
+        process_pending_media()
+        product.image = make_upload('tee.png', size=(600, 400), image_format='PNG')
+        product.save()
+        self.assertEqual(MediaJob.objects.filter(status='pending').count(), 1)
+        process_pending_media()
+        product.refresh_from_db()
+        self.assertEqual(product.image_variants['source'], product.image.name)
+        self.assertEqual(product.image_variants['widths'], {'thumb': 160, 'card': 400, 'detail': 600})
+
+    def test_backfill_command(self):
+        product = Product.objects.create(
+            seller=self.seller, name='Skirt', description='', price=Decimal('700'), image=make_upload(),
+        )
+        Product.objects.filter(pk=product.pk).update(image_variants={})
+        call_command('build_image_derivatives', workers=2, stdout=StringIO())
+        product.refresh_from_db()
+        self.assertEqual(product.image_variants['source'], product.image.name)
+
+    def test_backfill_skips_decompression_bombs(self):
+        small = Product.objects.create(
+            seller=self.seller, name='Scarf', description='', price=Decimal('300'), image=make_upload(size=(200, 200)),
+        )
+        huge = Product.objects.create(
+            seller=self.seller, name='Poster', description='', price=Decimal('300'), image=make_upload(),
+        )
+        Product.objects.update(image_variants={})
+        err = StringIO()
+        # Forked workers inherit the lowered limit, so the 1200x900 upload counts as a bomb
+        with mock.patch.object(Image, 'MAX_IMAGE_PIXELS', 300 * 300):
+            call_command('build_image_derivatives', workers=1, stdout=StringIO(), stderr=err)
+        small.refresh_from_db()
+        huge.refresh_from_db()
+        self.assertEqual(small.image_variants['source'], small.image.name)
+        self.assertEqual(huge.image_variants, {})
+        self.assertIn(huge.image.name, err.getvalue())
+
+    def test_worker_command(self):
+        product = Product.objects.create(
+            seller=self.seller, name='Blazer', description='', price=Decimal('3000'), image=make_upload(),
+        )
+        call_command('process_media', workers=2, once=True, stdout=StringIO())
+        product.refresh_from_db()
+        self.assertEqual(product.image_variants['source'], product.image.name)
+        self.assertEqual(MediaJob.objects.get().status, 'done')
+
+    def test_unreadable_upload_fails_after_retries(self):
+        broken = SimpleUploadedFile('broken.jpg', b'not an image', content_type='image/jpeg')
+        product = Product(seller=self.seller, name='Broken', description='', price=Decimal('100'))
+        product.image.save('broken.jpg', broken, save=False)
+        product.save()
+        with self.assertLogs('fashionnova_app.media_queue', 'WARNING'):
+            self.assertEqual(process_pending_media(), 0)
+        job = MediaJob.objects.get()
+        self.assertEqual((job.status, job.attempts), ('failed', MAX_ATTEMPTS))
+        # Given up on, so the original is shown rather than the placeholder
+        product.refresh_from_db()
+        self.assertEqual(product.image_variants, {})
+        self.assertIn(f'src="{product.image.url}"', self.render(product, 'card'))
+
+    def test_stale_save_keeps_processed_variants(self):
+        product = Product.objects.create(
+            seller=self.seller, name='Coat', description='', price=Decimal('5000'), image=make_upload(),
+        )
+        stale = Product.objects.get(pk=product.pk)
+        process_pending_media()
+        stale.stock = 3
+        stale.save()
+        product.refresh_from_db()
+        self.assertEqual(product.image_variants['source'], product.image.name)
+        self.assertEqual(product.stock, 3)
+
+
+class ContentAddressedStorageTests(TemporaryMediaMixin, TestCase):
+    """Identical uploads share one reference-counted blob"""
+
+    @classmethod
+    def setUpTestData(cls):
+        seller_user = User.objects.create_user(username='seller', password='secret', user_type='seller')
+        cls.seller = SellerProfile.objects.create(user=seller_user, store_name='Blob Store')
+
+    def create(self, name, upload):
+        return Product.objects.create(seller=self.seller, name=name, description='', price=Decimal('100'), image=upload)
+
+    def test_same_bytes_stored_once(self):
+        upload = make_upload()
+        first = self.create('First', upload)
+        upload.seek(0)
+        second = self.create('Second', SimpleUploadedFile('other-name.jpg', upload.read()))
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertTrue(first.image.name.startswith(f'{BLOB_ROOT}/'))
+        self.assertEqual(MediaBlob.objects.get().references, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(default_storage.exists(second.image.name))
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(default_storage.exists(second.image.name))
+        self.assertFalse(MediaBlob.objects.exists())
+
+    def test_blobs_served_immutable(self):
+        product = self.create('Served', make_upload())
+        brand = Brand.objects.create(name='Logo Brand', logo=make_upload('logo.jpg'))
+        # Test runs have DEBUG off, as in production
+        response = self.client.get(product.image.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], IMMUTABLE_CACHE_CONTROL)
+        self.assertEqual(self.client.get(brand.logo.url).status_code, 404)
+        with override_settings(DEBUG=True):
+            response = serve_media(RequestFactory().get('/'), brand.logo.name)
+        self.assertNotIn('Cache-Control', response)
+
+    def test_only_product_images_are_content_addressed(self):
+        brand = Brand.objects.create(name='Logo Brand', logo=make_upload('logo.jpg'))
+        self.assertTrue(brand.logo.name.startswith('brands/logo'))
+        self.assertFalse(MediaBlob.objects.exists())
+        self.create('Blob', make_upload())
+        self.assertEqual(MediaBlob.objects.get().references, 1)
+
+    def test_dedupe_command(self):
+        content = make_upload().read()
+        for name in ('products/dress.jpeg', 'products/dress_AbC123.jpeg'):
+            path = f'{self.media_root}/{name}'
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as handle:
+                handle.write(content)
+        first = self.create('Legacy', None)
+        second = self.create('Legacy copy', None)
+        Product.objects.filter(pk=first.pk).update(image='products/dress.jpeg')
+        Product.objects.filter(pk=second.pk).update(image='products/dress_AbC123.jpeg')
+
+        call_command('dedupe_media', stdout=StringIO())
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(MediaBlob.objects.get(name=first.image.name).references, 2)
+        self.assertFalse(os.path.exists(f'{self.media_root}/products/dress.jpeg'))
+        self.assertEqual(MediaJob.objects.filter(status='pending').count(), 2)
+
+
+class VendorAssetTests(TestCase):
+    """Pinned libraries are served locally, with preload hints, once vendored"""
+
+    def setUp(self):
+        is_vendored.cache_clear()
+        self.addCleanup(is_vendored.cache_clear)
+
+    def test_cdn_until_vendored(self):
+        self.assertTrue(vendor_url('jquery').startswith(VENDOR_ASSETS['jquery']['base_url']))
+
+    def test_vendored_copy_is_local_and_preloaded(self):
+        static_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, static_dir, ignore_errors=True)
+        path = os.path.join(static_dir, 'vendor', VENDOR_ASSETS['bootstrap_css']['files'][0][1])
+        os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as handle:
+            handle.write('body{}')
+
+        with override_settings(STATICFILES_DIRS=[static_dir]):
+            self.assertEqual(vendor_url('bootstrap_css'), '/static/vendor/bootstrap/5.1.3/css/bootstrap.min.css')
+            response = self.client.get('/users/login/')
+        self.assertEqual(
+            response['Link'], '</static/vendor/bootstrap/5.1.3/css/bootstrap.min.css>; rel=preload; as=style'
+        )
+        self.assertContains(response, 'href="/static/vendor/bootstrap/5.1.3/css/bootstrap.min.css"')
+
+    def run_vendor_assets(self, content):
+        """vendor_assets for jquery, pinned to b'ok', with the CDN returning content"""
+        assets = {'jquery': dict(VENDOR_ASSETS['jquery'], integrity={'jquery-3.6.0.min.js': integrity_of(b'ok')})}
+        command = 'fashionnova_app.management.commands.vendor_assets'
+        with mock.patch(f'{command}.STATIC_DIR', self.static_dir), mock.patch(f'{command}.VENDOR_ASSETS', assets), \
+                mock.patch(f'{command}.requests.get', return_value=mock.Mock(content=content)):
+            call_command('vendor_assets', stdout=StringIO())
+
+    def test_download_matching_its_pin_is_written(self):
+        self.static_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.static_dir, ignore_errors=True)
+        self.run_vendor_assets(b'ok')
+        with open(os.path.join(self.static_dir, 'vendor', 'jquery', '3.6.0', 'jquery.min.js'), 'rb') as handle:
+            self.assertEqual(handle.read(), b'ok')
+
+    def test_check_lists_libraries_left_on_the_cdn(self):
+        static_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, static_dir, ignore_errors=True)
+        path = os.path.join(static_dir, 'vendor', VENDOR_ASSETS['jquery']['files'][0][1])
+        os.makedirs(os.path.dirname(path))
+        open(path, 'w').close()
+        out = StringIO()
+        command = 'fashionnova_app.management.commands.vendor_assets'
+        with mock.patch(f'{command}.STATIC_DIR', static_dir), mock.patch(f'{command}.requests.get') as get:
+            with self.assertRaisesMessage(CommandError, 'Not vendored: bootstrap_css, bootstrap_js, fontawesome_css'):
+                call_command('vendor_assets', check=True, stdout=out)
+        get.assert_not_called()
+        self.assertIn('jquery: vendored', out.getvalue())
+        self.assertIn('fontawesome_css: served from', out.getvalue())
+
+    def test_download_not_matching_its_pin_is_refused(self):
+        self.static_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.static_dir, ignore_errors=True)
+        with self.assertRaisesMessage(CommandError, 'does not match its pinned digest'):
+            self.run_vendor_assets(b'tampered')
+        self.assertEqual(os.listdir(self.static_dir), [])
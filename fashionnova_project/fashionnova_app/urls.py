@@ -7,6 +7,8 @@ urlpatterns = [
     path('', views.home, name='home'),
     path('products/', views.products, name='products'),
     path('product/<slug:slug>/', views.product_detail, name='product_detail'),
+    path('product/<slug:slug>/me/', views.product_user_state, name='product_user_state'),
+    path('product/<slug:slug>/reviews/', views.product_reviews, name='product_reviews'),
     path('categories/', views.categories, name='categories'),
 
     # Brands
@@ -15,9 +17,11 @@ urlpatterns = [
 
     path('about/', views.about_view, name='about'),
     path('search/', views.search, name='search'),
+    path('search/suggest/', views.search_suggest, name='search_suggest'),
 
     # Cart URLs
     path('cart/', views.cart, name='cart'),
+    path('cart/batch/', views.cart_batch, name='cart_batch'),
     path('add-to-cart/<int:product_id>/', views.add_to_cart, name='add_to_cart'),
     path('remove-from-cart/<int:cart_id>/', views.remove_from_cart, name='remove_from_cart'),
     path('update-cart-quantity/', views.update_cart_quantity, name='update_cart_quantity'),
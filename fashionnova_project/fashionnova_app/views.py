@@ -4,24 +4,118 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.db.models import Q, Avg, Count
 from django.core.paginator import Paginator
-from django.http import HttpResponse, JsonResponse
+from django.http import Http404, HttpResponse, JsonResponse
+from django.views.decorators.cache import never_cache
 from django.views.decorators.csrf import csrf_exempt
+from django.views.static import serve
 from django.contrib import messages
+from django.db import transaction
 import json
 import requests
 import time  # Add this import
+from time import perf_counter
+from functools import partial
 from django.conf import settings
 from .models import *
 from .forms import *
 from django.contrib.auth.decorators import login_required, user_passes_test
-from django.db.models import Sum, Count, Avg, Q
+from django.db.models import Sum, Count, Avg, Q, F, Exists, OuterRef, Subquery
 from datetime import datetime, timedelta
 from django.utils import timezone  
+from django.utils.functional import SimpleLazyObject
+from django.utils.html import escape
 from users.models import SellerProfile
 from .mpesa_utils import lipa_na_mpesa_online
+from .pagination import cursor_paginate
+from .facets import facet_counts, invalidate_facets, normalize_filters
+from .search import index_products, parse_terms
+from .fuzzy import search_with_suggestions
+from .search_log import log_search
+from .autocomplete import catalog_changed, suggest, suggestion_index
+from .recommendations import recommended_products, with_fallback
+from .wishlist import (
+    popular_categories, transfer_to_cart, wishlist_categories, wishlist_recommendations, wishlist_stats,
+)
+from .cart import (
+    MAX_INTEGER, add_guest_line, add_item, add_items, apply_guest_operations, apply_operations, cart_summary,
+    get_cart, get_guest_cart, guest_cart, save_guest_cart,
+)
+from .storage import IMMUTABLE_CACHE_CONTROL, is_immutable
 
+# Keyset orderings for the catalog listings; each ends in a unique column so
+# cursor pagination has a total order to resume from.
+PRODUCT_SORT_ORDERINGS = {
+    'newest': ('-created_at', '-id'),
+    'price_low': ('final_price', 'id'),
+    'price_high': ('-final_price', '-id'),
+    'discount': ('-discount_percentage', '-id'),
+    'rating': ('-average_rating', '-id'),
+}
+PRODUCTS_PER_PAGE = 12
+PRODUCT_DETAIL_CACHE_TIMEOUT = 600  # seconds
+REVIEWS_PER_PAGE = 10
+REVIEW_ORDERING = ('-created_at', '-id')
 
 
+def paginate_products(request, products_list, sort='newest'):
+    """Cursor-paginate a product queryset on the ordering for `sort`"""
+    ordering = PRODUCT_SORT_ORDERINGS.get(sort, PRODUCT_SORT_ORDERINGS['newest'])
+    return cursor_paginate(
+        products_list,
+        ordering,
+        cursor=request.GET.get('cursor'),
+        per_page=PRODUCTS_PER_PAGE,
+        with_count=request.GET.get('count') != '0',
+    )
+
+
+def catalog_sidebar_context(request):
+    """Categories, brands and their facet counts for the listing sidebar"""
+    facets = facet_counts(normalize_filters(request.GET))
+    categories = list(Category.objects.filter(is_active=True).order_by('name'))
+    brands = list(Brand.objects.filter(is_active=True).order_by('name'))
+    for category in categories:
+        category.product_count = facets['category'].get(category.id, 0)
+    for brand in brands:
+        brand.product_count = facets['brand'].get(brand.id, 0)
+    return {
+        'categories': categories,
+        'brands': brands,
+        'facets': facets,
+        'gender_choices': [
+            (code, label, facets['gender'].get(code, 0))
+            for code, label in Product.GENDER_CHOICES
+        ],
+    }
+
+
+def products_page_json(products_page):
+    """JSON variant of a cursor-paginated product listing"""
+    return JsonResponse({
+        'products': [
+            {
+                'id': product.id,
+                'name': product.name,
+                'slug': product.slug,
+                'price': str(product.price),
+                'discount_price': str(product.discount_price) if product.discount_price else None,
+                'final_price': str(product.final_price),
+                'discount_percentage': str(product.discount_percentage),
+                'average_rating': product.average_rating,
+                'review_count': product.review_count,
+                'image': product.image.url if product.image else None,
+                'category': product.category.name if product.category else None,
+                'brand': product.brand.name if product.brand else None,
+            }
+            for product in products_page
+        ],
+        'next': products_page.next_cursor,
+        'previous': products_page.previous_cursor,
+        'start_index': products_page.start_index(),
+        'end_index': products_page.end_index(),
+        'count': products_page.count,
+    })
+
 
 def home(request):
     featured_products = Product.objects.filter(is_active=True).order_by('-created_at')[:8]
@@ -58,107 +152,168 @@ def products(request):
         if gender:
             products_list = products_list.filter(gender=gender)
         if min_price:
-            products_list = products_list.filter(price__gte=min_price)
+            products_list = products_list.filter(final_price__gte=min_price)
         if max_price:
-            products_list = products_list.filter(price__lte=max_price)
+            products_list = products_list.filter(final_price__lte=max_price)
         if discount_only:
-            products_list = products_list.filter(discount_price__isnull=False)
+            products_list = products_list.filter(discount_percentage__gt=0)
     
     # Sorting
     sort = request.GET.get('sort', 'newest')
-    if sort == 'price_low':
-        products_list = products_list.order_by('price')
-    elif sort == 'price_high':
-        products_list = products_list.order_by('-price')
-    elif sort == 'discount':
-        products_list = products_list.filter(discount_price__isnull=False).order_by('-discount_price')
-    else:  # newest
-        products_list = products_list.order_by('-created_at')
+    if sort == 'discount':
+        products_list = products_list.filter(discount_percentage__gt=0)
     
     # Pagination
-    paginator = Paginator(products_list, 12)
-    page = request.GET.get('page')
-    products_page = paginator.get_page(page)
+    products_list = products_list.select_related('category', 'brand')
+    products_page = paginate_products(request, products_list, sort)
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return products_page_json(products_page)
     
     context = {
         'products': products_page,
         'form': form,
         'sort': sort,
     }
+    context.update(catalog_sidebar_context(request))
     return render(request, 'products.html', context)
 
 def product_detail(request, slug):
-    product = get_object_or_404(Product, slug=slug, is_active=True)
-    reviews = product.reviews.all().order_by('-created_at')
-    
-    # Check if user has reviewed
-    user_review = None
-    if request.user.is_authenticated:
-        try:
-            user_review = Review.objects.get(product=product, user=request.user)
-        except Review.DoesNotExist:
-            pass
-    
-    # Related products
-    related_products = Product.objects.filter(
-        category=product.category,
-        is_active=True
-    ).exclude(id=product.id)[:4]
+    product = get_object_or_404(
+        Product.objects.select_related('category', 'brand', 'seller'), slug=slug, is_active=True
+    )
     
-    # Check wishlist
-    in_wishlist = False
-    if request.user.is_authenticated:
-        in_wishlist = Wishlist.objects.filter(user=request.user, product=product).exists()
-    
-    # Check cart
-    in_cart = False
-    cart_quantity = 0
-    if request.user.is_authenticated:
-        try:
-            cart_item = Cart.objects.get(user=request.user, product=product)
-            in_cart = True
-            cart_quantity = cart_item.quantity
-        except Cart.DoesNotExist:
-            pass
+    # The page body is a fragment cached per product and updated_at, so these
+    # querysets only run on a cache miss. Per-user state (wishlist, cart, own
+    # review) comes from product_user_state instead.
+    # Only the first page of reviews is rendered; the rest load from product_reviews
+    reviews = SimpleLazyObject(lambda: cursor_paginate(
+        product.reviews.select_related('user'), REVIEW_ORDERING, per_page=REVIEWS_PER_PAGE, with_count=False,
+    ))
+    
+    # Customers also bought, topped up from the same category; lazy so a
+    # cached page never runs it
+    related_products = SimpleLazyObject(lambda: with_fallback(
+        recommended_products([product.id], limit=4),
+        Product.objects.filter(
+            category=product.category, is_active=True
+        ).exclude(id=product.id).order_by('-created_at', '-id'),
+        limit=4,
+    ))
     
     context = {
         'product': product,
         'reviews': reviews,
-        'user_review': user_review,
         'related_products': related_products,
-        'in_wishlist': in_wishlist,
-        'in_cart': in_cart,
-        'cart_quantity': cart_quantity,
+        'cache_timeout': PRODUCT_DETAIL_CACHE_TIMEOUT,
     }
     return render(request, 'product_detail.html', context)
 
-@login_required
+def product_reviews(request, slug):
+    """One cursor page of a product's reviews as JSON, newest first"""
+    page = cursor_paginate(
+        Review.objects.filter(product__slug=slug, product__is_active=True).select_related('user'),
+        REVIEW_ORDERING,
+        cursor=request.GET.get('cursor'),
+        per_page=REVIEWS_PER_PAGE,
+        with_count=False,
+    )
+    return JsonResponse({
+        'reviews': [
+            {
+                'id': review.id,
+                'username': review.user.username,
+                'rating': review.rating,
+                'comment': review.comment,
+                'created_at': review.created_at.strftime('%b %d, %Y'),
+            }
+            for review in page
+        ],
+        'next_cursor': page.next_cursor,
+    })
+
+@never_cache
+def product_user_state(request, slug):
+    """The signed-in user's wishlist, cart and review state for a product, in one query"""
+    state = {
+        'authenticated': request.user.is_authenticated,
+        'in_wishlist': False,
+        'in_cart': False,
+        'cart_quantity': 0,
+        'user_review': None,
+    }
+    if not request.user.is_authenticated:
+        return JsonResponse(state)
+    
+    own_review = Review.objects.filter(product=OuterRef('pk'), user=request.user)
+    row = Product.objects.filter(slug=slug, is_active=True).annotate(
+        user_in_wishlist=Exists(Wishlist.objects.filter(product=OuterRef('pk'), user=request.user)),
+        user_cart_quantity=Subquery(
+            Cart.objects.filter(product=OuterRef('pk'), user=request.user).values('quantity')[:1]
+        ),
+        user_review_id=Subquery(own_review.values('id')[:1]),
+        user_review_rating=Subquery(own_review.values('rating')[:1]),
+        user_review_comment=Subquery(own_review.values('comment')[:1]),
+    ).values(
+        'user_in_wishlist', 'user_cart_quantity',
+        'user_review_id', 'user_review_rating', 'user_review_comment',
+    ).first()
+    if row is None:
+        return JsonResponse({'success': False, 'message': 'Product not found'}, status=404)
+    
+    state['in_wishlist'] = bool(row['user_in_wishlist'])
+    state['in_cart'] = row['user_cart_quantity'] is not None
+    state['cart_quantity'] = row['user_cart_quantity'] or 0
+    if row['user_review_id'] is not None:
+        state['user_review'] = {
+            'id': row['user_review_id'],
+            'rating': row['user_review_rating'],
+            'comment': row['user_review_comment'],
+        }
+    return JsonResponse(state)
+
 def add_to_cart(request, product_id):
     product = get_object_or_404(Product, id=product_id)
-    cart_item, created = Cart.objects.get_or_create(
-        user=request.user,
-        product=product,
-        defaults={'quantity': 1}
-    )
-    if not created:
-        cart_item.quantity += 1
-        cart_item.save()
+    if not request.user.is_authenticated:
+        if add_guest_line(request, product.id, stock=product.stock):
+            messages.success(request, f'{product.name} added to cart!')
+        else:
+            messages.warning(request, 'Your cart is full. Sign in to add more items.')
+        return save_guest_cart(request, redirect('cart'))
+    add_item(request.user, product.id)
     
     messages.success(request, f'{product.name} added to cart!')
     return redirect('cart')
 
-@login_required
 def remove_from_cart(request, cart_id):
+    if not request.user.is_authenticated:
+        # Guest lines are keyed by product id
+        guest_cart(request).pop(cart_id, None)
+        messages.success(request, 'Item removed from cart!')
+        return save_guest_cart(request, redirect('cart'))
     cart_item = get_object_or_404(Cart, id=cart_id, user=request.user)
     cart_item.delete()
     messages.success(request, 'Item removed from cart!')
     return redirect('cart')
 
-@login_required
 def update_cart_quantity(request):
     if request.method == 'POST':
-        cart_id = request.POST.get('cart_id')
-        quantity = int(request.POST.get('quantity', 1))
+        try:
+            cart_id = int(request.POST['cart_id'])
+            quantity = int(request.POST.get('quantity', 1))
+        except (KeyError, ValueError):
+            return JsonResponse({'success': False, 'message': 'Invalid cart item or quantity'}, status=400)
+        if quantity > MAX_INTEGER:
+            return JsonResponse({'success': False, 'message': 'Invalid cart item or quantity'}, status=400)
+        
+        if not request.user.is_authenticated:
+            # Guest lines are keyed by product id; quantities are capped at stock
+            errors = []
+            if cart_id in guest_cart(request):
+                operation = 'set' if quantity > 0 else 'remove'
+                errors = apply_guest_operations(
+                    request, [{'op': operation, 'product_id': cart_id, 'quantity': max(quantity, 0)}],
+                )
+            return save_guest_cart(request, JsonResponse({'success': True, 'errors': errors}))
         
         cart_item = get_object_or_404(Cart, id=cart_id, user=request.user)
         if quantity > 0:
@@ -170,20 +325,63 @@ def update_cart_quantity(request):
         return JsonResponse({'success': True})
     return JsonResponse({'success': False})
 
-@login_required
+def cart_batch(request):
+    """Apply a list of set/increment/remove operations and return the new cart.
+
+    Lets the cart page send one debounced request for several edits instead
+    of one update_cart_quantity call per change.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'message': 'Invalid request'}, status=405)
+    try:
+        operations = json.loads(request.body).get('operations')
+        if request.user.is_authenticated:
+            errors = apply_operations(request.user, operations)
+            cart_items, summary = get_cart(request.user)
+        else:
+            errors = apply_guest_operations(request, operations)
+            cart_items, summary = get_guest_cart(request)
+    except (AttributeError, ValueError) as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+    
+    response = JsonResponse({
+        'success': True,
+        'lines': [
+            {
+                'id': item.id,
+                'product_id': item.product_id,
+                'quantity': item.quantity,
+                'line_total': str(item.line_total),
+            }
+            for item in cart_items
+        ],
+        'count': summary['count'],
+        'quantity': summary['quantity'],
+        'subtotal': str(summary['subtotal']),
+        'errors': errors,
+    })
+    return save_guest_cart(request, response) if not request.user.is_authenticated else response
+
 def cart(request):
-    cart_items = Cart.objects.filter(user=request.user)
+    if request.user.is_authenticated:
+        cart_items, summary = get_cart(request.user)
+    else:
+        cart_items, summary = get_guest_cart(request)
     
     # Calculate totals
-    subtotal = sum(item.get_total_price() for item in cart_items)
-    shipping_fee = 200 if cart_items.exists() else 0  # Example flat rate
+    subtotal = summary['subtotal']
+    shipping_fee = 200 if cart_items else 0  # Example flat rate
     total = subtotal + shipping_fee
     
+    # Customers also bought, for everything in the cart
+    also_bought = recommended_products([item.product_id for item in cart_items], limit=4)
+    
     context = {
         'cart_items': cart_items,
         'subtotal': subtotal,
         'shipping_fee': shipping_fee,
         'total': total,
+        'also_bought': also_bought,
     }
     return render(request, 'cart.html', context)
 
@@ -260,12 +458,12 @@ def checkout(request):
 
 @login_required
 def checkout(request):
-    cart_items = Cart.objects.filter(user=request.user)
-    if not cart_items.exists():
+    cart_items, summary = get_cart(request.user)
+    if not cart_items:
         messages.warning(request, 'Your cart is empty!')
         return redirect('cart')
     
-    subtotal = sum(item.get_total_price() for item in cart_items)
+    subtotal = summary['subtotal']
     shipping_fee = 200
     total = subtotal + shipping_fee
     
@@ -286,27 +484,30 @@ def checkout(request):
             )
             
             # Create order items
-            for cart_item in cart_items:
-                OrderItem.objects.create(
+            OrderItem.objects.bulk_create([
+                OrderItem(
                     order=order,
                     product=cart_item.product,
                     quantity=cart_item.quantity,
-                    price=cart_item.product.get_final_price()
+                    price=cart_item.product.final_price
                 )
-            # Clear cart
-            cart_items.delete()
+                for cart_item in cart_items
+            ])
+            # Clear cart; only the lines that were ordered, not any added since
+            ordered_lines = Cart.objects.filter(pk__in=[cart_item.pk for cart_item in cart_items])
+            ordered_lines.delete()
             if form.cleaned_data['payment_method'] == 'mpesa':
                 return process_mpesa_payment(request, order.id)
             else:
                 # Clear cart
-                cart_items.delete()
+                ordered_lines.delete()
                 messages.success(request, "Order placed successfully!")
                 return redirect('order_detail', order_id=order.id)
     
             
             # ONLY delete cart for non-MPesa payments
             if form.cleaned_data['payment_method'] != 'mpesa':
-                cart_items.delete()
+                ordered_lines.delete()
                 messages.success(request, "Order placed successfully!")
                 return redirect('order_detail', order_id=order.id)
             else:
@@ -467,7 +668,7 @@ def add_product(request):
 def products_view(request):
     """View to display all products - shows published products"""
     # Get all active products (including newly published ones)
-    products_list = Product.objects.filter(is_active=True).order_by('-created_at')
+    products_list = Product.objects.filter(is_active=True)
     
     # Apply filters
     category_id = request.GET.get('category')
@@ -486,34 +687,21 @@ def products_view(request):
     min_price = request.GET.get('min_price')
     max_price = request.GET.get('max_price')
     if min_price:
-        products_list = products_list.filter(price__gte=min_price)
+        products_list = products_list.filter(final_price__gte=min_price)
     if max_price:
-        products_list = products_list.filter(price__lte=max_price)
+        products_list = products_list.filter(final_price__lte=max_price)
     
     # Discount filter
     if request.GET.get('discount_only'):
-        products_list = products_list.filter(discount_price__isnull=False)
+        products_list = products_list.filter(discount_percentage__gt=0)
     
     # Sorting
     sort_by = request.GET.get('sort', 'newest')
-    if sort_by == 'price_low':
-        products_list = products_list.order_by('price')
-    elif sort_by == 'price_high':
-        products_list = products_list.order_by('-price')
-    elif sort_by == 'discount':
-        products_list = products_list.filter(discount_price__isnull=False).order_by('-discount_price')
-    elif sort_by == 'rating':
-        products_list = products_list.order_by('-average_rating')
-    else:  # newest
-        products_list = products_list.order_by('-created_at')
-    
-    # Get categories and brands for filters
-    categories = Category.objects.filter(is_active=True).order_by('name')
-    brands = Brand.objects.filter(is_active=True).order_by('name')
+    if sort_by == 'discount':
+        products_list = products_list.filter(discount_percentage__gt=0)
     
-    # Count products per category
-    for category in categories:
-        category.product_count = Product.objects.filter(category=category, is_active=True).count()
+    # Categories, brands and facet counts for the sidebar
+    sidebar = catalog_sidebar_context(request)
     
     # Selected category for breadcrumb
     selected_category = None
@@ -524,17 +712,17 @@ def products_view(request):
             pass
     
     # Pagination
-    paginator = Paginator(products_list, 12)  # 12 products per page
-    page_number = request.GET.get('page')
-    products = paginator.get_page(page_number)
+    products_list = products_list.select_related('category', 'brand')
+    products = paginate_products(request, products_list, sort_by)
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return products_page_json(products)
     
     context = {
         'products': products,
-        'categories': categories,
-        'brands': brands,
         'selected_category': selected_category,
         'sort': sort_by,
     }
+    context.update(sidebar)
     
     return render(request, 'products.html', context)
 def categories(request):
@@ -549,19 +737,72 @@ def about(request):
     return render(request, 'about.html')
 
 def search(request):
-    query = request.GET.get('q', '')
-    products = Product.objects.filter(
-        Q(name__icontains=query) | 
-        Q(description__icontains=query) |
-        Q(category__name__icontains=query) |
-        Q(brand__name__icontains=query)
-    ).filter(is_active=True)
+    query = request.GET.get('q', '').strip()
+    started = perf_counter()
+    
+    # Ranked full-text results, fetched one page at a time, with a
+    # "did you mean" respelling when they come up short
+    exact = bool(request.GET.get('exact'))
+    results, suggestion, corrected = search_with_suggestions(query, fuzzy=not exact)
+    paginator = Paginator(results, PRODUCTS_PER_PAGE)
+    products = paginator.get_page(request.GET.get('page'))
+    
+    # Analytics: one entry per search, not per page turned
+    if results.terms and request.GET.get('page') in (None, '', '1'):
+        log_search(
+            query,
+            ' '.join(parse_terms(query)),
+            hits=0 if corrected else paginator.count,
+            latency_ms=(perf_counter() - started) * 1000,
+            corrected_to=suggestion if corrected else '',
+        )
+    
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return JsonResponse({
+            'query': query,
+            'did_you_mean': suggestion,
+            'showing_results_for': suggestion if corrected else None,
+            'total': paginator.count,
+            'page': products.number,
+            'num_pages': paginator.num_pages,
+            'products': [
+                {
+                    'id': product.id,
+                    'name': product.name,
+                    'slug': product.slug,
+                    'highlighted_name': getattr(product, 'highlighted_name', '') or escape(product.name),
+                    'snippet': getattr(product, 'snippet', ''),
+                    'final_price': str(product.final_price),
+                    'image': product.image.url if product.image else None,
+                    'category': product.category.name if product.category else None,
+                    'brand': product.brand.name if product.brand else None,
+                }
+                for product in products
+            ],
+        })
     
     context = {
         'products': products,
         'query': query,
+        'total_results': paginator.count,
+        'did_you_mean': suggestion,
+        'corrected': corrected,
+        'exact': exact,
     }
     return render(request, 'search.html', context)
+
+def search_suggest(request):
+    """Typeahead suggestions for the navbar search box, served from memory"""
+    query = request.GET.get('q', '')
+    suggestions = suggest(query) if len(query) <= 100 else []
+    return JsonResponse({
+        'query': query,
+        'suggestions': [
+            {'kind': item['kind'], 'label': item['label'], 'url': item['url']}
+            for item in suggestions
+        ],
+    })
+
 def about_view(request):
     """About page view"""
     context = {
@@ -573,8 +814,7 @@ def brands_view(request):
     """Brands page view"""
     # Get all brands
     brands = Brand.objects.filter(is_active=True).annotate(
-        product_count=Count('product', filter=Q(product__is_active=True)),
-        average_rating=Avg('product__average_rating')
+        product_count=Count('products', filter=Q(products__is_active=True))
     ).order_by('name')
     
     # Group brands by first letter
@@ -623,12 +863,12 @@ def brand_products_view(request, slug):
     products = Product.objects.filter(
         brand=brand,
         is_active=True
-    ).order_by('-created_at')
+    ).select_related('category', 'brand')
     
     # Pagination
-    paginator = Paginator(products, 12)
-    page = request.GET.get('page')
-    products_page = paginator.get_page(page)
+    products_page = paginate_products(request, products)
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return products_page_json(products_page)
     
     context = {
         'brand': brand,
@@ -761,58 +1001,24 @@ def wishlist_view(request):
     """User's wishlist page"""
     wishlist_items = Wishlist.objects.filter(user=request.user).select_related(
         'product', 'product__category', 'product__brand'
-    ).order_by('-added_at')
+    ).order_by('-added_at', '-id')
     
-    # Calculate statistics
-    total_items = wishlist_items.count()
-    in_stock_count = wishlist_items.filter(product__stock__gt=0).count()
-    out_of_stock_count = total_items - in_stock_count
-    in_stock_percentage = (in_stock_count / total_items * 100) if total_items > 0 else 0
-    out_of_stock_percentage = 100 - in_stock_percentage
-    
-    # Calculate price range
-    prices = [item.product.get_final_price() for item in wishlist_items]
-    min_price = min(prices) if prices else 0
-    max_price = max(prices) if prices else 0
-    total_value = sum(prices)
-    
-    # Get categories with counts
-    from django.db.models import Count
-    categories = Category.objects.filter(
-        product__wishlist__user=request.user
-    ).annotate(
-        count=Count('product__wishlist')
-    ).distinct()[:8]
-    
-    # Get popular categories for empty state
-    popular_categories = Category.objects.annotate(
-        product_count=Count('product', filter=Q(product__is_active=True))
-    ).filter(product_count__gt=0).order_by('-product_count')[:8]
-    
-    # Get recommendations (products from same categories)
-    if wishlist_items.exists():
-        category_ids = wishlist_items.values_list('product__category_id', flat=True).distinct()
-        recommendations = Product.objects.filter(
-            category_id__in=category_ids,
-            is_active=True
-        ).exclude(
-            id__in=wishlist_items.values_list('product_id', flat=True)
-        )[:6]
-    else:
-        recommendations = Product.objects.filter(is_active=True).order_by('?')[:6]
+    # Counts and prices in one aggregate; the items themselves are read once
+    stats = wishlist_stats(request.user)
+    wishlist_items = list(wishlist_items) if stats['total_items'] else []
+    categories = wishlist_categories(request.user) if wishlist_items else []
+    
+    # Co-purchases of recent items, topped up from the shared pool
+    recommendations = wishlist_recommendations(
+        wishlist_items, category_ids={category['category_id'] for category in categories}, limit=6
+    )
     
     context = {
         'wishlist_items': wishlist_items,
-        'total_items': total_items,
-        'in_stock_count': in_stock_count,
-        'out_of_stock_count': out_of_stock_count,
-        'in_stock_percentage': round(in_stock_percentage, 1),
-        'out_of_stock_percentage': round(out_of_stock_percentage, 1),
-        'min_price': min_price,
-        'max_price': max_price,
-        'total_value': total_value,
+        **stats,
         'categories': categories,
-        'popular_categories': popular_categories,
+        # Only the empty state shows these
+        'popular_categories': SimpleLazyObject(popular_categories),
         'recommendations': recommendations,
     }
     return render(request, 'wishlist.html', context)
@@ -932,21 +1138,12 @@ def move_to_cart_view(request, wishlist_id):
     if request.method == 'POST':
         wishlist_item = get_object_or_404(Wishlist, id=wishlist_id, user=request.user)
         
-        # Add to cart
-        cart_item, created = Cart.objects.get_or_create(
-            user=request.user,
-            product=wishlist_item.product,
-            defaults={'quantity': 1}
-        )
-        
-        if not created:
-            cart_item.quantity += 1
-            cart_item.save()
-        
-        # Remove from wishlist
-        wishlist_item.delete()
+        # Add to cart and remove from wishlist together
+        with transaction.atomic():
+            add_item(request.user, wishlist_item.product_id)
+            wishlist_item.delete()
         
-        cart_count = Cart.objects.filter(user=request.user).count()
+        cart_count = cart_summary(request.user)['count']
         
         return JsonResponse({
             'success': True,
@@ -999,37 +1196,18 @@ def move_selected_to_cart_view(request):
             data = json.loads(request.body)
             wishlist_ids = data.get('wishlist_ids', [])
             
-            moved_count = 0
+            # A handful of queries however many items are selected
+            results = transfer_to_cart(request.user, wishlist_ids)
+            moved_count = sum(result['status'] == 'moved' for result in results)
             
-            for wishlist_id in wishlist_ids:
-                try:
-                    wishlist_item = Wishlist.objects.get(id=wishlist_id, user=request.user)
-                    
-                    # Add to cart or update quantity
-                    cart_item, created = Cart.objects.get_or_create(
-                        user=request.user,
-                        product=wishlist_item.product,
-                        defaults={'quantity': 1}
-                    )
-                    
-                    if not created:
-                        cart_item.quantity += 1
-                        cart_item.save()
-                    
-                    # Remove from wishlist
-                    wishlist_item.delete()
-                    moved_count += 1
-                    
-                except Wishlist.DoesNotExist:
-                    continue
-            
-            cart_count = Cart.objects.filter(user=request.user).count()
+            cart_count = cart_summary(request.user)['count']
             
             return JsonResponse({
                 'success': True,
                 'message': f'{moved_count} item(s) moved to cart',
                 'moved_count': moved_count,
-                'cart_count': cart_count
+                'cart_count': cart_count,
+                'results': results,
             })
             
         except json.JSONDecodeError:
@@ -1294,51 +1472,49 @@ def add_reorder_to_cart_view(request):
             data = json.loads(request.body)
             items = data.get('items', [])
             
-            added_count = 0
             errors = []
             
+            # Products and what is already in the cart, in one query
+            product_ids = [str(item_data.get('product_id')) for item_data in items]
+            products = Product.objects.filter(
+                id__in=[int(product_id) for product_id in product_ids if product_id.isdigit()], is_active=True
+            ).annotate(
+                in_cart=Subquery(
+                    Cart.objects.filter(user=request.user, product=OuterRef('pk')).values('quantity')[:1]
+                )
+            ).in_bulk()
+            quantities = {}
+            
             for item_data in items:
+                product_id = item_data.get('product_id')
+                product = products.get(int(product_id)) if str(product_id).isdigit() else None
+                if product is None:
+                    errors.append(f"Product not found")
+                    continue
                 try:
-                    product_id = item_data.get('product_id')
                     quantity = int(item_data.get('quantity', 1))
-                    
-                    product = Product.objects.get(id=product_id, is_active=True)
-                    
-                    # Check stock availability
-                    if product.stock <= 0:
-                        errors.append(f"{product.name} is out of stock")
-                        continue
-                    
-                    if quantity > product.stock:
-                        errors.append(f"Only {product.stock} units available for {product.name}")
-                        quantity = product.stock
-                    
-                    # Add to cart
-                    cart_item, created = Cart.objects.get_or_create(
-                        user=request.user,
-                        product=product,
-                        defaults={'quantity': quantity}
-                    )
-                    
-                    if not created:
-                        new_quantity = cart_item.quantity + quantity
-                        if new_quantity > product.stock:
-                            errors.append(f"Maximum stock reached for {product.name}")
-                            cart_item.quantity = product.stock
-                        else:
-                            cart_item.quantity = new_quantity
-                        cart_item.save()
-                    
-                    added_count += 1
-                    
-                except Product.DoesNotExist:
-                    errors.append(f"Product not found")
-                except ValueError:
+                except (TypeError, ValueError):
                     errors.append(f"Invalid quantity for product {product_id}")
-                except Exception as e:
-                    errors.append(f"Error adding product {product_id}: {str(e)}")
+                    continue
+                
+                # Check stock availability
+                if product.stock <= 0:
+                    errors.append(f"{product.name} is out of stock")
+                    continue
+                
+                if quantity > product.stock:
+                    errors.append(f"Only {product.stock} units available for {product.name}")
+                    quantity = product.stock
+                
+                if (product.in_cart or 0) + quantities.get(product.id, 0) + quantity > product.stock:
+                    errors.append(f"Maximum stock reached for {product.name}")
+                quantities[product.id] = min(quantities.get(product.id, 0) + quantity, product.stock)
+            
+            # Add every line in one statement; the database caps the totals at stock
+            add_items(request.user, quantities, cap_to_stock=True)
+            added_count = len(quantities)
             
-            cart_count = Cart.objects.filter(user=request.user).count()
+            cart_count = cart_summary(request.user)['count']
             
             response_data = {
                 'success': added_count > 0,
@@ -1627,6 +1803,13 @@ def update_products_status_view(request):
             else:
                 return JsonResponse({'success': False, 'message': 'Invalid action'})
             
+            # QuerySet.update() skips post_save, so refresh derived catalog data here
+            invalidate_facets()
+            product_ids = list(products.values_list('id', flat=True))
+            index_products(product_ids)
+            changes = [('product', product_id) for product_id in product_ids]
+            catalog_changed(partial(suggestion_index.reload, changes), changes)
+            
             return JsonResponse({
                 'success': True,
                 'updated_count': updated_count,
@@ -2175,23 +2358,15 @@ def seller_dashboard_view(request):
 
 def brands_view(request):
     try:
-        # Get all active brands with basic info
-        brands = Brand.objects.filter(is_active=True).select_related().order_by('name')
+        # Get all active brands with their product counts in one query; ratings
+        # are read from the aggregates kept up to date by ratings.py
+        brands = Brand.objects.filter(is_active=True).annotate(
+            active_product_count=Count('products', filter=Q(products__is_active=True))
+        ).order_by('name')
         
         # Prepare brand data with statistics
         brand_list = []
         for brand in brands:
-            product_count = brand.products.filter(is_active=True).count()
-            
-            # Calculate average rating
-            avg_rating = Review.objects.filter(
-                product__brand=brand,
-                product__is_active=True,
-                is_active=True
-            ).aggregate(avg=Avg('rating'))['avg']
-            
-            avg_rating = float(avg_rating) if avg_rating else 0.0
-            
             brand_data = {
                 'id': brand.id,
                 'name': brand.name,
@@ -2199,13 +2374,9 @@ def brands_view(request):
                 'description': brand.description,
                 'logo': brand.logo,
                 'website': brand.website,
-                'product_count': product_count,
-                'average_rating': avg_rating,
-                'total_reviews': Review.objects.filter(
-                    product__brand=brand,
-                    product__is_active=True,
-                    is_active=True
-                ).count()
+                'product_count': brand.active_product_count,
+                'average_rating': brand.average_rating,
+                'total_reviews': brand.review_count,
             }
             brand_list.append(brand_data)
         
@@ -2265,5 +2436,20 @@ def brands_view(request):
         traceback.print_exc()
         return HttpResponse(f"Server error: {str(e)}", status=500)
     
+
+def serve_media(request, path):
+    """Media server; content-addressed files are cached for a year.
+
+    With DEBUG off it only serves those, whose far-future headers let a CDN
+    or proxy cache absorb the traffic; other uploads are left to the web server.
+    """
+    immutable = is_immutable(path)
+    if not immutable and not settings.DEBUG:
+        raise Http404('Not a content-addressed file')
+    response = serve(request, path, document_root=settings.MEDIA_ROOT)
+    if immutable:
+        response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
+    
     
 # Create your views here.
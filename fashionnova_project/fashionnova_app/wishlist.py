@@ -0,0 +1,173 @@
+# fashionnova_app/wishlist.py
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, Q, Sum
+
+from .cart import MAX_INTEGER, add_items
+from .models import Category, Product, Wishlist
+from .recommendations import recommended_products
+
+WISHLIST_CACHE_TIMEOUT = 3600  # seconds
+POPULAR_CATEGORIES_KEY = 'wishlist:popular_categories'
+RECOMMENDATION_POOL_KEY = 'wishlist:recommendation_pool'
+SHARED_CACHE_TIMEOUT = 900  # seconds; both are the same for every shopper
+RECOMMENDATION_POOL_SIZE = 60
+# Only the most recently saved items seed co-purchase recommendations
+RECOMMENDATION_SEED_ITEMS = 20
+
+
+def wishlist_cache_key(user_id):
+    return f'wishlist:count:{user_id}'
+
+
+def wishlist_count(user):
+    """Number of products on a user's wishlist, cached until it changes"""
+    key = wishlist_cache_key(user.pk)
+    count = cache.get(key)
+    if count is None:
+        count = Wishlist.objects.filter(user=user).count()
+        cache.set(key, count, WISHLIST_CACHE_TIMEOUT)
+    return count
+
+
+def invalidate_wishlist(user_id):
+    """Drop a cached count; called on every wishlist change"""
+    cache.delete(wishlist_cache_key(user_id))
+    # Again after commit, so a read racing the write cannot re-cache the old count
+    transaction.on_commit(lambda: cache.delete(wishlist_cache_key(user_id)))
+
+
+def _parse_id(value):
+    """value as a positive row id, or None"""
+    if isinstance(value, bool):
+        return None
+    try:
+        parsed = int(value)
+    except (TypeError, ValueError):
+        return None
+    return parsed if 0 < parsed <= MAX_INTEGER else None
+
+
+def transfer_to_cart(user, wishlist_ids):
+    """Move wishlist rows into the cart as one set-based transfer.
+
+    In one transaction: a select of the selected rows with their products,
+    one upsert into Cart and one delete, however many rows are moved.
+    Returns a result per requested id, in order, with status 'moved',
+    'unavailable' (inactive or out of stock; left on the wishlist) or
+    'not_found', which is also what an id that isn't a number gets.
+    """
+    # (id as given, parsed id or None), in order; repeats of a parsed id are dropped
+    parsed, seen = [], set()
+    for raw_id in wishlist_ids:
+        wishlist_id = _parse_id(raw_id)
+        if wishlist_id is None or wishlist_id not in seen:
+            parsed.append((raw_id, wishlist_id))
+            seen.add(wishlist_id)
+    requested = [wishlist_id for _, wishlist_id in parsed if wishlist_id is not None]
+    with transaction.atomic():
+        rows = {
+            wishlist_id: (product_id, is_active and stock > 0)
+            for wishlist_id, product_id, is_active, stock in Wishlist.objects.select_for_update(of=('self',))
+            .filter(user=user, id__in=requested)
+            .values_list('id', 'product_id', 'product__is_active', 'product__stock')
+        }
+        moved = {wishlist_id: product_id for wishlist_id, (product_id, available) in rows.items() if available}
+        add_items(user, {product_id: 1 for product_id in moved.values()}, cap_to_stock=True)
+        if moved:
+            Wishlist.objects.filter(id__in=moved).delete()
+
+    results = []
+    for raw_id, wishlist_id in parsed:
+        if wishlist_id is None:
+            results.append({'wishlist_id': raw_id, 'status': 'not_found'})
+            continue
+        product_id, available = rows.get(wishlist_id, (None, False))
+        if product_id is None:
+            status = 'not_found'
+        else:
+            status = 'moved' if available else 'unavailable'
+        results.append({'wishlist_id': wishlist_id, 'product_id': product_id, 'status': status})
+    return results
+
+
+def wishlist_stats(user):
+    """Counts and price range of a wishlist in one conditional aggregation"""
+    stats = Wishlist.objects.filter(user=user).aggregate(
+        total_items=Count('id'),
+        in_stock_count=Count('id', filter=Q(product__stock__gt=0)),
+        min_price=Min('product__final_price'),
+        max_price=Max('product__final_price'),
+        total_value=Sum('product__final_price'),
+    )
+    total = stats['total_items']
+    in_stock_percentage = round(stats['in_stock_count'] / total * 100, 1) if total else 0
+    stats.update(
+        out_of_stock_count=total - stats['in_stock_count'],
+        in_stock_percentage=in_stock_percentage,
+        out_of_stock_percentage=round(100 - in_stock_percentage, 1),
+        min_price=stats['min_price'] or 0,
+        max_price=stats['max_price'] or 0,
+        total_value=stats['total_value'] or 0,
+    )
+    return stats
+
+
+def wishlist_categories(user, limit=8):
+    """[{'category_id', 'name', 'count'}] of the categories on a wishlist, largest first"""
+    return list(
+        Wishlist.objects.filter(user=user, product__category__isnull=False)
+        .values(category_id=F('product__category_id'), name=F('product__category__name'))
+        .annotate(count=Count('id'))
+        .order_by('-count', 'name')[:limit]
+    )
+
+
+def _popular_categories():
+    return list(
+        Category.objects.annotate(product_count=Count('products', filter=Q(products__is_active=True)))
+        .filter(product_count__gt=0).order_by('-product_count')[:8]
+    )
+
+
+def popular_categories():
+    """Categories with the most active products, shared by every empty wishlist page"""
+    return cache.get_or_set(POPULAR_CATEGORIES_KEY, _popular_categories, SHARED_CACHE_TIMEOUT)
+
+
+def _recommendation_pool():
+    return list(
+        Product.objects.filter(is_active=True, stock__gt=0)
+        .order_by('-review_count', '-average_rating', '-created_at', '-id')
+        .values_list('id', 'category_id')[:RECOMMENDATION_POOL_SIZE]
+    )
+
+
+def recommendation_pool():
+    """[(product id, category id)] of well-reviewed products in stock, cached for everyone"""
+    return cache.get_or_set(RECOMMENDATION_POOL_KEY, _recommendation_pool, SHARED_CACHE_TIMEOUT)
+
+
+def wishlist_recommendations(wishlist_items, category_ids=(), limit=6):
+    """Products to suggest beside a wishlist, in at most two queries.
+
+    Co-purchase neighbours of the most recently saved items come first; the
+    rest is topped up from the shared pool, preferring the wishlist's own
+    categories. Nothing already on the wishlist is suggested.
+    """
+    saved = {item.product_id for item in wishlist_items}
+    seeds = [item.product_id for item in wishlist_items[:RECOMMENDATION_SEED_ITEMS]]
+    recommendations = [
+        # Over-fetch, since older saved items may be among the neighbours
+        product for product in recommended_products(seeds, limit=limit * 2)
+        if product.id not in saved
+    ][:limit]
+    if len(recommendations) >= limit:
+        return recommendations
+
+    seen = saved | {product.id for product in recommendations}
+    candidates = [(product_id, category_id) for product_id, category_id in recommendation_pool() if product_id not in seen]
+    candidates.sort(key=lambda candidate: candidate[1] not in category_ids)
+    extra_ids = [product_id for product_id, _ in candidates[:limit - len(recommendations)]]
+    extra = Product.objects.filter(id__in=extra_ids, is_active=True).select_related('category', 'brand').in_bulk()
+    return recommendations + [extra[product_id] for product_id in extra_ids if product_id in extra]
@@ -48,12 +48,15 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Serves collected static files with far-future headers for hashed names
+    'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'fashionnova_app.middleware.PreloadMiddleware',
 ]
 
 ROOT_URLCONF = 'fashionnova_project.urls'
@@ -132,11 +135,37 @@ STATICFILES_DIRS = [
 
 
 #STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
-#STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Uploads are stored once per distinct content (see fashionnova_app/storage.py)
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    # Product.image and ProductImage.image only; their blobs are reference
+    # counted by the signals that release replaced and deleted images
+    'product_images': {
+        'BACKEND': 'fashionnova_app.storage.ContentAddressedStorage',
+    },
+    # collectstatic writes content-hashed names plus .gz/.br copies, which
+    # WhiteNoise serves as immutable. Development serves the sources as-is.
+    'staticfiles': {
+        'BACKEND': (
+            'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+            else 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+        ),
+    },
+}
+
+# Where `manage.py notify_wishlists` sends price-drop/back-in-stock digests:
+# ConsoleNotifier, FileNotifier (JSON lines) or EmailNotifier in
+# fashionnova_app/notifications.py
+WISHLIST_NOTIFIER_BACKEND = 'fashionnova_app.notifications.ConsoleNotifier'
+WISHLIST_NOTIFIER_FILE_PATH = os.path.join(BASE_DIR, 'wishlist_notifications.jsonl')
+
 CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
 CRISPY_TEMPLATE_PACK = "bootstrap5"
 
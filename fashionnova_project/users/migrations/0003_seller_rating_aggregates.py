@@ -0,0 +1,23 @@
+# Generated by Django 5.0.2 on 2026-10-18 07:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_alter_customuser_address_alter_customuser_phone_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sellerprofile',
+            name='rating_total',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='sellerprofile',
+            name='review_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+    ]
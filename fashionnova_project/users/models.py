@@ -3,6 +3,8 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
+from fashionnova_app.model_mixins import MaintainedFieldsMixin
+
 class CustomUser(AbstractUser):
     USER_TYPES = (
         ('customer', 'Customer'),
@@ -18,12 +20,18 @@ class CustomUser(AbstractUser):
     def __str__(self):
         return self.username
 
-class SellerProfile(models.Model):
+class SellerProfile(MaintainedFieldsMixin, models.Model):
     user = models.OneToOneField(CustomUser, on_delete=models.CASCADE)
     store_name = models.CharField(max_length=100)
     business_registration = models.CharField(max_length=50, blank=True, null=True)
     description = models.TextField(blank=True, null=True)
     rating = models.FloatField(default=0.0)
+    # Rolled up from reviews of the seller's products; rating is their average
+    review_count = models.IntegerField(default=0, editable=False)
+    rating_total = models.IntegerField(default=0, editable=False)
+    
+    # Only fashionnova_app/ratings.py writes these, with F() expressions
+    maintained_fields = ('rating', 'review_count', 'rating_total')
     
     def __str__(self):
         return self.store_name
\ No newline at end of file
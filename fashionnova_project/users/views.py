@@ -7,6 +7,7 @@ from django.contrib import messages
 from django.views.generic import View
 from .forms import UserRegisterForm, UserLoginForm, UserUpdateForm
 from .models import SellerProfile
+from fashionnova_app.cart import merge_guest_cart, save_guest_cart
 
 def register_view(request):
     if request.method == 'POST':
@@ -29,16 +30,18 @@ def register_view(request):
                     description=''
                 )
             
-            # Login user
+            # Login user and keep what they put in their cart as a guest
             login(request, user)
+            merge_guest_cart(request, user)
             
             # Show success message
             if user.user_type == 'seller':
                 messages.success(request, f'Your seller account has been created! Welcome to FashionNova!')
-                return redirect('seller_dashboard')
+                response = redirect('seller_dashboard')
             else:
                 messages.success(request, f'Your account has been created! Welcome to FashionNova!')
-                return redirect('home')
+                response = redirect('home')
+            return save_guest_cart(request, response)
     else:
         form = UserRegisterForm()
     
@@ -55,13 +58,15 @@ def login_view(request):
             
             if user is not None:
                 login(request, user)
+                merge_guest_cart(request, user)
                 messages.success(request, f'Welcome back, {username}!')
                 
                 # Redirect based on user type
                 if user.user_type == 'seller':
-                    return redirect('seller_dashboard')
+                    response = redirect('seller_dashboard')
                 else:
-                    return redirect('home')
+                    response = redirect('home')
+                return save_guest_cart(request, response)
             else:
                 messages.error(request, 'Invalid username or password.')
     else: